@@ -71,13 +71,39 @@ var dateList = sortedDates[sortedDates.length - 1]; // Get the last (most recent
 
 var latestAssetId = folderPath + '/' + dateList;
 
+// Deltas exported after the latest base table: same COD_SUBC rows, only the new month columns
+var deltasFolder = folderPath + 'Deltas';
+var deltaNames = [];
+try {
+  deltaNames = ee.data.listAssets(deltasFolder).assets.map(getName)
+    .filter(function(name) { return sortDates(name) > sortDates(dateList); })
+    .sort(function(a, b) { return sortDates(a) - sortDates(b); });
+} catch (e) {
+  deltaNames = [];  // No delta folder yet
+}
+
+// Present base + deltas as one table: copy each delta's date columns by COD_SUBC
+var joinDelta = function(table, deltaName) {
+  var delta   = ee.FeatureCollection(deltasFolder + '/' + deltaName);
+  var columns = delta.first().propertyNames().filter(ee.Filter.stringStartsWith('item', '20'));
+  var joined  = ee.Join.saveFirst({matchKey: 'delta', outer: true}).apply(
+    table, delta, ee.Filter.equals({leftField: 'COD_SUBC', rightField: 'COD_SUBC'}));
+  return ee.FeatureCollection(joined.map(function(f) {
+    var match = f.get('delta');
+    var clean = f.select(f.propertyNames().remove('delta'));
+    return ee.Feature(ee.Algorithms.If(match, clean.copyProperties(ee.Feature(match), columns), clean));
+  }));
+};
+
 // Load the FeatureCollection
-var csv = ee.FeatureCollection(latestAssetId);
+var csv = deltaNames.reduce(joinDelta, ee.FeatureCollection(latestAssetId));
 exports.matrixSubBasinTransposed = csv;
 
 // Single server call: fetch all date-like property names as a client-side array
+// (mean columns 'YYYY-MM' only; extra statistics are stored as 'YYYY-MM_<stat>')
 var filteredProperties = csv.first().propertyNames()
   .filter(ee.Filter.stringStartsWith('item', '20'))
+  .filter(ee.Filter.stringContains('item', '_').not())
   .distinct().sort();
 var listDatesArray = filteredProperties.getInfo();
 
@@ -0,0 +1,341 @@
+"""
+In-process fake of the `ee` module for benchmarks.
+
+Server-side objects are lazy graph nodes (enough to build the same graphs as the
+real API and measure their size); every round-trip goes through Backend.rpc(),
+which sleeps a configurable latency and counts the call. getInfo() evaluates the
+small subset of list/dictionary operations the planning step needs.
+"""
+
+import itertools
+import sys
+import time
+import types
+
+
+class Backend:
+    """Simulated Earth Engine state: folders, tables, ACLs and tasks."""
+
+    def __init__(self, latencia=0.02, latencias=None, duracion_cola=0.2, duracion_corrida=0.5,
+                 fraccion_publica=0.9):
+        self.latencia = latencia
+        self.latencias = latencias or {}
+        self.duracion_cola = duracion_cola
+        self.duracion_corrida = duracion_corrida
+        self.fraccion_publica = fraccion_publica
+
+        self.carpetas = {}      # folder -> [asset names]
+        self.columnas = {}      # table id -> [property names]
+        self.propiedades = {}   # table id -> {property: value} of its first feature
+        self.acl_publica = {}   # asset id -> bool
+        self.tareas = {}        # task id -> {'inicio', 'descripcion', 'assetId'}
+        self.llamadas = {}      # rpc name -> count
+        self.nodos = 0
+        self.exportaciones = []
+        self.errores_pendientes = []  # error messages for the next started tasks (see fallar_tareas)
+        self._ids = itertools.count(1)
+
+    # ---------------------------------------------------------------- scenario
+    def agregar_carpeta(self, folder, nombres, tipo='IMAGE', columnas=None, propiedades=None):
+        self.carpetas.setdefault(folder, [])
+        for i, nombre in enumerate(nombres):
+            asset_id = f"{folder}/{nombre}"
+            self.carpetas[folder].append(nombre)
+            self.acl_publica[asset_id] = (i % 100) < self.fraccion_publica * 100
+            if columnas is not None:
+                self.columnas[asset_id] = list(columnas)
+            if propiedades is not None:
+                self.propiedades[asset_id] = dict(propiedades)
+
+    def fallar_tareas(self, mensaje, veces=1):
+        """The next `veces` started tasks end FAILED with error_message `mensaje`."""
+        self.errores_pendientes.extend([mensaje] * veces)
+
+    # -------------------------------------------------------------------- rpc
+    def rpc(self, nombre):
+        self.llamadas[nombre] = self.llamadas.get(nombre, 0) + 1
+        time.sleep(self.latencias.get(nombre, self.latencia))
+
+    def total_rpc(self):
+        return sum(self.llamadas.values())
+
+    def reiniciar_contadores(self):
+        self.llamadas = {}
+        self.nodos = 0
+
+    # ---------------------------------------------------------- evaluation
+    def evaluar(self, nodo):
+        self.rpc('computeValue')
+        return self._valor(nodo)
+
+    def _valor(self, x):
+        if isinstance(x, ComputedObject):
+            op, a = x.op, x.args
+            if op in ('List', 'String', 'Number'):
+                return self._valor(a[0])
+            if op == 'Dictionary':
+                return {k: self._valor(v) for k, v in self._valor(a[0]).items()}
+            if op == 'distinct':
+                return list(dict.fromkeys(self._valor(a[0])))
+            if op == 'removeAll':
+                otros = self._valor(a[1])
+                return [v for v in self._valor(a[0]) if v not in otros]
+            if op == 'filter':
+                return self._filtrar(self._valor(a[0]), a[1])
+            if op == 'size':
+                return len(self._valor(a[0]))
+            if op == 'get' and isinstance(a[0], ComputedObject) and a[0].op == 'first':
+                tablas = [h.args[0] for h in recorrer(a[0]) if h.op == 'FeatureCollection'
+                          and h.args and isinstance(h.args[0], str)]
+                return next((self.propiedades[t].get(a[1]) for t in tablas if t in self.propiedades), None)
+            if op == 'propertyNames':
+                return ['system:index', 'COD_SUBC'] + self._columnas_tabla(a[0])
+            return None
+        if isinstance(x, (list, tuple)):
+            return [self._valor(v) for v in x]
+        if isinstance(x, dict):
+            return {k: self._valor(v) for k, v in x.items()}
+        return x
+
+    def _filtrar(self, lista, filtro):
+        if filtro.op == 'Filter.inList':
+            permitidos = self._valor(filtro.args[1])
+            return [v for v in lista if v in permitidos]
+        if filtro.op == 'Filter.stringContains':
+            return [v for v in lista if filtro.args[1] in v]
+        if filtro.op == 'Not':
+            excluidos = self._filtrar(lista, filtro.args[0])
+            return [v for v in lista if v not in excluidos]
+        return lista
+
+    def _columnas_tabla(self, nodo):
+        """Union of the columns of every stored table reachable from the node."""
+        columnas = []
+        for hoja in recorrer(nodo):
+            if hoja.op == 'FeatureCollection' and hoja.args and isinstance(hoja.args[0], str):
+                for c in self.columnas.get(hoja.args[0], []):
+                    if c not in columnas:
+                        columnas.append(c)
+        return columnas
+
+    # ------------------------------------------------------------- ee.data
+    def list_assets(self, params):
+        self.rpc('listAssets')
+        if isinstance(params, str):
+            params = {'parent': params}
+        folder = params['parent']
+        if folder not in self.carpetas:
+            raise Exception(f"Asset '{folder}' not found.")
+        nombres = self.carpetas[folder]
+        inicio = int(params.get('pageToken') or 0)
+        tamano = params.get('pageSize') or len(nombres) or 1
+        pagina = nombres[inicio:inicio + tamano]
+        respuesta = {'assets': [{
+            'type': 'TABLE' if f"{folder}/{n}" in self.columnas else 'IMAGE',
+            'name': f"{folder}/{n}",
+            'id': f"{folder}/{n}",
+            'updateTime': f"2020-01-01T00:00:{i % 60:02d}.{i:06d}Z",
+        } for i, n in enumerate(pagina, start=inicio)]}
+        if inicio + tamano < len(nombres):
+            respuesta['nextPageToken'] = str(inicio + tamano)
+        return respuesta
+
+    def get_asset(self, asset_id):
+        self.rpc('getAsset')
+        folder, nombre = asset_id.rsplit('/', 1)
+        if nombre not in self.carpetas.get(folder, []):
+            raise Exception(f"Asset '{asset_id}' not found.")
+        return {'id': asset_id, 'name': asset_id}
+
+    def get_asset_acl(self, asset_id):
+        self.rpc('getAssetAcl')
+        return {'owners': ['user:owner@example.com'], 'all_users_can_read': self.acl_publica.get(asset_id, False)}
+
+    def set_asset_acl(self, asset_id, acl):
+        self.rpc('setAssetAcl')
+        self.acl_publica[asset_id] = bool(acl.get('all_users_can_read'))
+
+    def create_asset(self, value, path=None, *args, **kwargs):
+        self.rpc('createAsset')
+        self.carpetas.setdefault(path, [])
+        return {'id': path}
+
+    def estado_tarea(self, task_id):
+        tarea = self.tareas.get(task_id)
+        if tarea is None:
+            return {'id': task_id, 'state': 'UNKNOWN'}
+        transcurrido = time.time() - tarea['inicio']
+        if transcurrido < self.duracion_cola:
+            state = 'READY'
+        elif transcurrido < self.duracion_cola + self.duracion_corrida:
+            state = 'RUNNING'
+        elif tarea.get('error'):
+            return {'id': task_id, 'state': 'FAILED', 'description': tarea['descripcion'],
+                    'error_message': tarea['error']}
+        else:
+            state = 'COMPLETED'
+            # Like a finished export, the asset now shows up in its folder
+            if tarea['assetId']:
+                folder, nombre = tarea['assetId'].rsplit('/', 1)
+                if nombre not in self.carpetas.setdefault(folder, []):
+                    self.carpetas[folder].append(nombre)
+        return {'id': task_id, 'state': state, 'description': tarea['descripcion']}
+
+    def get_task_status(self, task_ids):
+        self.rpc('getTaskStatus')
+        if isinstance(task_ids, str):
+            task_ids = [task_ids]
+        return [self.estado_tarea(t) for t in task_ids]
+
+    def iniciar_tarea(self, descripcion, asset_id=None):
+        self.rpc('startTableExport')
+        task_id = f"FAKE{next(self._ids):08d}"
+        self.tareas[task_id] = {'inicio': time.time(), 'descripcion': descripcion, 'assetId': asset_id,
+                                'error': self.errores_pendientes.pop(0) if self.errores_pendientes else None}
+        return task_id
+
+
+_backend = None
+
+
+def recorrer(nodo):
+    """Every ComputedObject reachable from nodo (each visited once)."""
+    vistos = set()
+    pila = [nodo]
+    while pila:
+        x = pila.pop()
+        if isinstance(x, ComputedObject):
+            if id(x) in vistos:
+                continue
+            vistos.add(id(x))
+            yield x
+            pila.extend(x.args)
+            pila.extend(x.kwargs.values())
+        elif isinstance(x, (list, tuple)):
+            pila.extend(x)
+        elif isinstance(x, dict):
+            pila.extend(x.values())
+
+
+def tamano_grafo(nodo):
+    """(node count, depth) of the graph rooted at nodo."""
+    nodos = sum(1 for _ in recorrer(nodo))
+    profundidad = {}
+
+    def prof(x):
+        if isinstance(x, ComputedObject):
+            if id(x) not in profundidad:
+                profundidad[id(x)] = 0  # cycle guard
+                hijos = list(x.args) + list(x.kwargs.values())
+                profundidad[id(x)] = 1 + max((prof(h) for h in hijos), default=0)
+            return profundidad[id(x)]
+        if isinstance(x, (list, tuple)):
+            return max((prof(h) for h in x), default=0)
+        if isinstance(x, dict):
+            return max((prof(h) for h in x.values()), default=0)
+        return 0
+
+    limite = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limite, 100000))
+    try:
+        return nodos, prof(nodo)
+    finally:
+        sys.setrecursionlimit(limite)
+
+
+class ComputedObject:
+    """Lazy server-side value: any method call returns a new node."""
+
+    def __init__(self, op, args=(), kwargs=None):
+        self.op = op
+        self.args = tuple(args)
+        self.kwargs = kwargs or {}
+        if _backend is not None:
+            _backend.nodos += 1
+
+    def __getattr__(self, nombre):
+        if nombre.startswith('__'):
+            raise AttributeError(nombre)
+
+        def metodo(*args, **kwargs):
+            if nombre == 'map' and args and callable(args[0]):
+                # Like the real client, trace the callback once with a placeholder
+                cuerpo = args[0](ComputedObject('argumento'))
+                return ComputedObject('map', (self, cuerpo), kwargs)
+            return ComputedObject(nombre, (self,) + args, kwargs)
+        return metodo
+
+    def getInfo(self):
+        return _backend.evaluar(self)
+
+
+class _Tipo:
+    """ee.Image, ee.FeatureCollection, ...: callable constructor with static members."""
+
+    def __init__(self, nombre):
+        self._nombre = nombre
+
+    def __call__(self, *args, **kwargs):
+        return ComputedObject(self._nombre, args, kwargs)
+
+    def __getattr__(self, nombre):
+        if nombre.startswith('__'):
+            raise AttributeError(nombre)
+
+        def estatico(*args, **kwargs):
+            return ComputedObject(f"{self._nombre}.{nombre}", args, kwargs)
+        return estatico
+
+
+class FakeTask:
+    def __init__(self, collection, description, assetId=None, **kwargs):
+        self.collection = collection
+        self.description = description
+        self.asset_id = assetId
+        self.id = None
+        _backend.exportaciones.append(self)
+
+    def start(self):
+        self.id = _backend.iniciar_tarea(self.description, self.asset_id)
+
+    def status(self):
+        return _backend.get_task_status([self.id])[0]
+
+
+def usar(backend):
+    """Points the installed fake at another backend (a fresh scenario)."""
+    global _backend
+    _backend = backend
+
+
+def instalar(backend):
+    """Registers the fake as `ee` in sys.modules, bound to backend."""
+    usar(backend)
+
+    ee = types.ModuleType('ee')
+    ee.ComputedObject = ComputedObject
+    for nombre in ['Image', 'ImageCollection', 'Feature', 'FeatureCollection', 'Filter', 'List',
+                   'Dictionary', 'String', 'Number', 'Reducer', 'Join', 'Algorithms', 'Geometry']:
+        setattr(ee, nombre, _Tipo(nombre))
+    ee.Initialize = lambda *a, **k: None
+    ee.ServiceAccountCredentials = lambda *a, **k: None
+
+    # ee.data entry points always go to the current backend (see usar())
+    data = types.ModuleType('ee.data')
+    data.listAssets = lambda *a, **k: _backend.list_assets(*a, **k)
+    data.getAsset = lambda *a, **k: _backend.get_asset(*a, **k)
+    data.getAssetAcl = lambda *a, **k: _backend.get_asset_acl(*a, **k)
+    data.setAssetAcl = lambda *a, **k: _backend.set_asset_acl(*a, **k)
+    data.createAsset = lambda *a, **k: _backend.create_asset(*a, **k)
+    data.getTaskStatus = lambda *a, **k: _backend.get_task_status(*a, **k)
+    data.computeValue = lambda nodo: _backend.evaluar(nodo)
+    ee.data = data
+
+    batch = types.ModuleType('ee.batch')
+    batch.Export = types.SimpleNamespace(table=types.SimpleNamespace(toAsset=FakeTask))
+    ee.batch = batch
+
+    sys.modules['ee'] = ee
+    sys.modules['ee.data'] = data
+    sys.modules['ee.batch'] = batch
+    return ee
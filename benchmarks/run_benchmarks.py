@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Pipeline benchmarks against a latency-simulating fake Earth Engine.
+
+Measures wall time, round-trip count and peak Python memory for each stage
+(procesar_humedad_suelo, make_assets_public_in_folder, wait_for_task_completion),
+plus the size of the exported graph for the processing stages, and compares them
+with baseline.json.
+
+Usage:
+    python benchmarks/run_benchmarks.py                      # compare with baseline
+    python benchmarks/run_benchmarks.py --update-baseline    # record a new baseline
+    python benchmarks/run_benchmarks.py --latencia 0.05 --hs 500 --csvs 60
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, AQUI)
+sys.path.insert(0, os.path.join(AQUI, '..', 'src'))
+
+import fake_ee  # noqa: E402
+
+BASELINE = os.path.join(AQUI, 'baseline.json')
+
+FOLDER_HS = 'projects/ee-corfobbppciren2023/assets/HS'
+FOLDER_METRICS = 'projects/ee-corfobbppciren2023/assets/MetricsHSTransposed'
+FOLDER_CLIMATOLOGIA = f"{FOLDER_METRICS}Climatologia"
+FOLDER_GEOMETRIAS = 'projects/ee-corfobbppciren2023/assets/Geometrias'
+
+
+def meses(n, desde=(1990, 1)):
+    """n fechas consecutivas (year, month)."""
+    year, month = desde
+    for _ in range(n):
+        yield year, month
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+
+def escenario(args, faltantes):
+    """Backend with args.hs monthly images, args.csvs metrics tables and `faltantes` unprocessed months."""
+    backend = fake_ee.Backend(
+        latencia=args.latencia,
+        duracion_cola=args.duracion_cola,
+        duracion_corrida=args.duracion_corrida,
+        fraccion_publica=args.fraccion_publica,
+    )
+    fechas = list(meses(args.hs))
+    backend.agregar_carpeta(FOLDER_HS, [f"SM{y}Valparaiso_GCOM_mes{m}" for y, m in fechas])
+    procesadas = [f"{y}-{m}" for y, m in fechas[:len(fechas) - faltantes]]
+    tablas = [f"{y}_{m}" for y, m in fechas[len(fechas) - faltantes - args.csvs:len(fechas) - faltantes]]
+    backend.agregar_carpeta(FOLDER_METRICS, tablas, tipo='TABLE', columnas=procesadas)
+    backend.agregar_carpeta(FOLDER_GEOMETRIAS, ['SubcuencasValparaiso'], tipo='TABLE')
+    # Climatology already holding every processed month (steady state)
+    backend.agregar_carpeta(FOLDER_CLIMATOLOGIA, [tablas[-1]], tipo='TABLE',
+                            propiedades={'fechas_acumuladas': ','.join(procesadas)})
+    return backend
+
+
+@contextlib.contextmanager
+def medir(backend, resultados, nombre, verbose):
+    """Wall time, RPC count and peak traced memory of the block."""
+    backend.reiniciar_contadores()
+    salida = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    try:
+        with salida:
+            yield
+    finally:
+        wall = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        resultados[nombre] = {
+            'wall_s': round(wall, 3),
+            'rpc': backend.total_rpc(),
+            'rpc_por_metodo': dict(sorted(backend.llamadas.items())),
+            'pico_kb': round(pico / 1024, 1),
+        }
+
+
+def correr(args):
+    backend = escenario(args, faltantes=1)
+    fake_ee.instalar(backend)
+
+    import ajustes_zonales
+    import asset_catalog
+    import hs_update
+    import publish_asset
+    import result_cache
+    import run_journal
+    import task_monitor
+
+    # Keep local state out of the benchmark
+    tmp = tempfile.mkdtemp(prefix='hs_bench_')
+    publish_asset.RUTA_WATERMARK = os.path.join(tmp, 'watermark.json')
+    run_journal.configurar(os.path.join(tmp, 'run_journal.json'))
+    result_cache.configurar(os.path.join(tmp, 'result_cache.sqlite'))
+    ajustes_zonales.configurar(os.path.join(tmp, 'zonal_settings.json'))
+    publish_asset.LLAMADAS_POR_SEGUNDO = args.llamadas_por_segundo
+    asset_catalog.configurar(ttl_segundos=3600)
+
+    # Scale the monitor's polling to the simulated task durations
+    escala = args.duracion_cola / task_monitor.INTERVALO_EN_COLA
+    task_monitor.INTERVALO_EN_COLA *= escala
+    task_monitor.INTERVALO_RUNNING *= escala
+    task_monitor.INTERVALO_RECIEN_INICIADA *= escala
+    task_monitor.RECIEN_INICIADA *= escala
+
+    resultados = {}
+
+    def procesar(nombre, faltantes, modo_meses, cache_lleno=False, climatologia=False):
+        backend_etapa = escenario(args, faltantes)
+        fake_ee.usar(backend_etapa)
+        asset_catalog.configurar()
+        hs_update.MODO_MESES = modo_meses
+        hs_update.CLIMATOLOGIA = climatologia
+        result_cache.configurar(os.path.join(tmp, f'{nombre}.sqlite'))
+        if cache_lleno:
+            # Every missing month already computed by an earlier run
+            plan = hs_update.planificar_procesamiento()
+            fechas_assets = [(hs_update.fecha_desde_asset(a), a) for a in map(hs_update.build_asset_id_from_date, plan.faltantes)]
+            for clave in hs_update.resultados_en_cache(fechas_assets)[3].values():
+                result_cache.guardar(clave, {cod: {'mean': 0.25} for cod in hs_update.SUBCUENCA_NOMBRES})
+            asset_catalog.configurar()
+        with medir(backend_etapa, resultados, nombre, args.verbose):
+            resultado = hs_update.procesar_humedad_suelo()
+        resultados[nombre]['estado'] = resultado['status']
+        tarea = backend_etapa.exportaciones[-1] if backend_etapa.exportaciones else None
+        if tarea is not None:
+            nodos, profundidad = fake_ee.tamano_grafo(tarea.collection)
+            resultados[nombre].update({'nodos_grafo_export': nodos, 'profundidad_grafo_export': profundidad})
+        return backend_etapa, tarea
+
+    procesar('procesar_humedad_suelo', 1, 'apilado')
+    procesar('procesar_humedad_suelo_12_meses_apilado', 12, 'apilado')
+    procesar('procesar_humedad_suelo_12_meses_en_cache', 12, 'apilado', cache_lleno=True)
+    procesar('procesar_humedad_suelo_climatologia', 1, 'apilado', climatologia=True)
+    backend_etapa, tarea = procesar('procesar_humedad_suelo_12_meses_encadenado', 12, 'encadenado')
+    hs_update.MODO_MESES = 'apilado'
+
+    asset_catalog.configurar()
+    with medir(backend_etapa, resultados, 'make_assets_public_in_folder', args.verbose):
+        publish_asset.make_assets_public_in_folder(FOLDER_HS, full=True)
+
+    tarea = tarea or fake_ee.FakeTask(None, 'benchmark')
+    tarea.start()
+    with medir(backend_etapa, resultados, 'wait_for_task_completion', args.verbose):
+        hs_update.wait_for_task_completion(tarea, check_interval=args.duracion_corrida, max_wait=60)
+
+    return resultados
+
+
+def comparar(resultados, baseline, umbral_tiempo, umbral_rpc, umbral_nodos=0.0):
+    """Lista de regresiones respecto del baseline."""
+    regresiones = []
+    for etapa, actual in resultados.items():
+        base = baseline.get(etapa)
+        if base is None:
+            continue
+        if actual['rpc'] > base['rpc'] * (1 + umbral_rpc):
+            regresiones.append(f"{etapa}: rpc {base['rpc']} -> {actual['rpc']}")
+        if actual['wall_s'] > base['wall_s'] * (1 + umbral_tiempo):
+            regresiones.append(f"{etapa}: wall {base['wall_s']}s -> {actual['wall_s']}s")
+        # Export graph size: every node is serialized and evaluated server-side on each run
+        if 'nodos_grafo_export' in base and 'nodos_grafo_export' in actual \
+                and actual['nodos_grafo_export'] > base['nodos_grafo_export'] * (1 + umbral_nodos):
+            regresiones.append(
+                f"{etapa}: export graph {base['nodos_grafo_export']} -> {actual['nodos_grafo_export']} nodes")
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='HS pipeline benchmarks (fake Earth Engine)')
+    parser.add_argument('--latencia', type=float, default=0.02, help='seconds per simulated RPC')
+    parser.add_argument('--hs', type=int, default=500, help='images in the HS folder')
+    parser.add_argument('--csvs', type=int, default=60, help='tables in MetricsHSTransposed')
+    parser.add_argument('--fraccion-publica', type=float, default=0.9, help='share of assets already public')
+    parser.add_argument('--duracion-cola', type=float, default=0.2, help='simulated READY time (s)')
+    parser.add_argument('--duracion-corrida', type=float, default=0.5, help='simulated RUNNING time (s)')
+    parser.add_argument('--llamadas-por-segundo', type=float, default=500, help='publish rate limit')
+    parser.add_argument('--umbral-tiempo', type=float, default=0.5, help='allowed wall time increase (fraction)')
+    parser.add_argument('--umbral-rpc', type=float, default=0.0, help='allowed round-trip increase (fraction)')
+    parser.add_argument('--umbral-nodos', type=float, default=0.0,
+                        help='allowed export graph node count increase (fraction)')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help='show pipeline output')
+    args = parser.parse_args(argv)
+
+    resultados = correr(args)
+    print(json.dumps(resultados, indent=2))
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(resultados, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regresiones = comparar(resultados, baseline, args.umbral_tiempo, args.umbral_rpc, args.umbral_nodos)
+    for r in regresiones:
+        print(f"❌ {r}")
+    if not regresiones:
+        print("✅ No regressions against baseline")
+    return 1 if regresiones else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
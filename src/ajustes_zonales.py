@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Per-zone settings for the zonal reductions
+Each subbasin (and the extra zone, see zonal_stats.zona_extra) has a level on an escalation ladder of
+cheaper reduceRegions configurations: higher tileScale first (same result, less
+memory per tile), then a coarser scale. Zones that hit "User memory limit
+exceeded" / "Too many pixels" are probed one by one and moved up only as far as
+needed; the level that worked is recorded in a local JSON file so later runs
+start from it instead of failing again.
+
+Settings file: {region: {COD_SUBC: {'nivel', 'tileScale', 'factorEscala', 'actualizado', 'motivo'}}}
+Note: Earth Engine must be initialized BEFORE calling sondear()
+"""
+
+import datetime
+import json
+import os
+import threading
+
+import ee
+
+import ee_session
+
+RUTA_AJUSTES = os.getenv('HS_ZONAL_SETTINGS', 'zonal_settings.json')
+
+# Escalation ladder; level 0 is the plain reduction. factorEscala multiplies the
+# reduction scale (native grid or zonal_stats.ESCALA), so it changes the values.
+NIVELES = [
+    {'tileScale': 1, 'factorEscala': 1},
+    {'tileScale': 2, 'factorEscala': 1},
+    {'tileScale': 4, 'factorEscala': 1},
+    {'tileScale': 8, 'factorEscala': 1},
+    {'tileScale': 16, 'factorEscala': 1},
+    {'tileScale': 16, 'factorEscala': 2},
+    {'tileScale': 16, 'factorEscala': 4},
+]
+
+# Fragments of the messages of reductions that ran out of memory or pixels
+_ERRORES_DE_MEMORIA = (
+    'memory limit exceeded', 'out of memory', 'too many pixels', 'too many concurrent aggregations',
+)
+
+_lock = threading.RLock()
+_ajustes = None
+
+
+def configurar(ruta=None):
+    """Cambia el archivo de ajustes y descarta lo cargado en memoria."""
+    global RUTA_AJUSTES, _ajustes
+    with _lock:
+        if ruta is not None:
+            RUTA_AJUSTES = ruta
+        _ajustes = None
+
+
+def es_error_de_memoria(error) -> bool:
+    """True si el error (o el error_message de una tarea) es de memoria o de exceso de píxeles."""
+    msg = str(error or '').lower()
+    return any(fragmento in msg for fragmento in _ERRORES_DE_MEMORIA)
+
+
+def _cargar():
+    global _ajustes
+    if _ajustes is None:
+        _ajustes = {}
+        if os.path.exists(RUTA_AJUSTES):
+            try:
+                with open(RUTA_AJUSTES) as f:
+                    _ajustes = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Could not read zonal settings {RUTA_AJUSTES}: {e}")
+    return _ajustes
+
+
+def _guardar():
+    temporal = f"{RUTA_AJUSTES}.tmp"
+    try:
+        with open(temporal, 'w') as f:
+            json.dump(_ajustes, f, indent=1, sort_keys=True)
+        os.replace(temporal, RUTA_AJUSTES)
+    except OSError as e:
+        print(f"⚠️ Could not write zonal settings {RUTA_AJUSTES}: {e}")
+
+
+def niveles(region, codigos):
+    """{COD_SUBC: nivel} de los códigos (0 si la zona no tiene ajuste registrado)."""
+    with _lock:
+        registrados = _cargar().get(region, {})
+        return {cod: registrados.get(cod, {}).get('nivel', 0) for cod in codigos}
+
+
+def sin_sondear(region, codigos):
+    """Códigos sin ajuste registrado (nunca sondeados ni escalados)."""
+    with _lock:
+        registrados = _cargar().get(region, {})
+        return [cod for cod in codigos if cod not in registrados]
+
+
+def registrar(region, cod, nivel, motivo=''):
+    with _lock:
+        _cargar().setdefault(region, {})[cod] = dict(
+            NIVELES[nivel], nivel=nivel, motivo=motivo, actualizado=datetime.datetime.now().isoformat()
+        )
+        _guardar()
+
+
+def parametros(nivel, escala):
+    """Argumentos de reduceRegion(s) del nivel sobre los de escala (zonal_stats.parametros_escala)."""
+    ajuste = NIVELES[nivel]
+    argumentos = dict(escala, tileScale=ajuste['tileScale'])
+    if ajuste['factorEscala'] != 1:
+        argumentos['scale'] = ee.Number(escala['scale']).multiply(ajuste['factorEscala'])
+    return argumentos
+
+
+def agrupar(niveles_por_codigo):
+    """{nivel: [COD_SUBC]} para reducir juntas las zonas con el mismo ajuste."""
+    grupos = {}
+    for cod, nivel in niveles_por_codigo.items():
+        grupos.setdefault(nivel, []).append(cod)
+    return grupos
+
+
+def factores_escala(niveles_por_codigo):
+    """{COD_SUBC: factorEscala} de las zonas con escala más gruesa (las que cambian los valores)."""
+    return {
+        cod: NIVELES[nivel]['factorEscala']
+        for cod, nivel in sorted(niveles_por_codigo.items()) if NIVELES[nivel]['factorEscala'] != 1
+    }
+
+
+def sondear(region, imagen, zonas, codigos, reductor, escala, max_pixels=1e13):
+    """
+    Preflight: un reduceRegion por zona (getInfo) desde su nivel actual, subiendo de nivel
+    mientras falle por memoria o píxeles. Registra el nivel que funcionó para cada zona.
+    Retorna {COD_SUBC: nivel} de las zonas que subieron de nivel.
+    """
+    actuales = niveles(region, codigos)
+    nuevas = set(sin_sondear(region, codigos))
+    escaladas = {}
+    for cod in codigos:
+        nivel = actuales[cod]
+        geometria = ee.FeatureCollection(zonas).filter(ee.Filter.eq('COD_SUBC', cod)).geometry()
+        while True:
+            try:
+                ee_session.llamar(imagen.reduceRegion(
+                    reducer=reductor, geometry=geometria, maxPixels=max_pixels, **parametros(nivel, escala)
+                ).getInfo)
+                break
+            except Exception as e:
+                if not es_error_de_memoria(e):
+                    raise
+                if nivel == len(NIVELES) - 1:
+                    print(f"❌ Zone {cod} still fails at the last level ({NIVELES[nivel]}): {e}")
+                    break
+                nivel += 1
+                print(f"🪜 Zone {cod}: {e}; trying {NIVELES[nivel]}")
+        if nivel != actuales[cod]:
+            escaladas[cod] = nivel
+        # Zones that passed at their level are recorded too, so later runs skip their preflight
+        if nivel != actuales[cod] or cod in nuevas:
+            registrar(region, cod, nivel, motivo='preflight')
+    if escaladas:
+        print(f"🪜 [{region}] Zones escalated: {escaladas}")
+    return escaladas
+
+
+def escalar(region, codigos, motivo=''):
+    """Sube un nivel todas las zonas dadas (cuando el sondeo no aisló a ninguna). Retorna las escaladas."""
+    escaladas = {}
+    for cod, nivel in niveles(region, codigos).items():
+        if nivel < len(NIVELES) - 1:
+            escaladas[cod] = nivel + 1
+            registrar(region, cod, nivel + 1, motivo=motivo)
+    if escaladas:
+        print(f"🪜 [{region}] Zones escalated one level: {escaladas}")
+    return escaladas
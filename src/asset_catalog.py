@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Asset Catalog
+Lists each Earth Engine folder once per run and answers existence checks,
+name resolution and suffix allocation from memory.
+Listings follow listAssets page tokens (TAMANO_PAGINA assets per page), fetching
+the next page in the background while the caller works through the current one.
+Note: Earth Engine must be initialized BEFORE calling functions in this module
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import ee
+
+import ee_session
+
+# Optional on-disk copy of the listings (JSON), reused while younger than TTL_SEGUNDOS
+RUTA_CACHE = os.getenv('HS_ASSET_CATALOG')
+TTL_SEGUNDOS = 6 * 3600
+
+# Assets per listAssets page
+TAMANO_PAGINA = int(os.getenv('HS_ASSET_PAGE_SIZE', '1000'))
+
+# folder -> {'listado_en': epoch seconds, 'assets': [{'id', 'name', 'type', 'updateTime'}]}
+_catalogo = {}
+_cache_cargado = False
+# Regions run in threads (update_dashboard); guards _catalogo and the cache file
+_lock = threading.RLock()
+
+
+def configurar(ruta_cache=None, ttl_segundos=None):
+    """Cambia la ruta del cache en disco y/o el TTL; descarta lo que haya en memoria."""
+    global RUTA_CACHE, TTL_SEGUNDOS, _cache_cargado
+    if ruta_cache is not None:
+        RUTA_CACHE = ruta_cache
+    if ttl_segundos is not None:
+        TTL_SEGUNDOS = ttl_segundos
+    _catalogo.clear()
+    _cache_cargado = False
+
+
+def _cargar_cache():
+    global _cache_cargado
+    with _lock:
+        if _cache_cargado:
+            return
+        _cache_cargado = True
+        if not RUTA_CACHE or not os.path.exists(RUTA_CACHE):
+            return
+        try:
+            with open(RUTA_CACHE) as f:
+                guardado = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read asset catalog cache {RUTA_CACHE}: {e}")
+            return
+        ahora = time.time()
+        for folder, entrada in guardado.items():
+            if ahora - entrada.get('listado_en', 0) < TTL_SEGUNDOS:
+                _catalogo.setdefault(folder, entrada)
+
+
+def _guardar_cache():
+    if not RUTA_CACHE:
+        return
+    try:
+        with _lock, open(RUTA_CACHE, 'w') as f:
+            json.dump(_catalogo, f, indent=1)
+    except OSError as e:
+        print(f"⚠️ Could not write asset catalog cache {RUTA_CACHE}: {e}")
+
+
+def _resumen(asset):
+    return {
+        'id': asset.get('id') or asset.get('name'),
+        'name': asset.get('name') or asset.get('id'),
+        'type': asset.get('type'),
+        'updateTime': asset.get('updateTime'),
+    }
+
+
+def paginas(folder, tamano_pagina=None, prefetch=True):
+    """
+    Páginas de listAssets de la carpeta, siguiendo nextPageToken hasta la última.
+    Con prefetch la página siguiente se pide en otro hilo mientras se consume la actual.
+    """
+    tamano_pagina = tamano_pagina or TAMANO_PAGINA
+
+    def pedir(token):
+        params = {'parent': folder, 'pageSize': tamano_pagina}
+        if token:
+            params['pageToken'] = token
+        return ee_session.llamar(ee.data.listAssets, params)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        respuesta = pedir(None)
+        while True:
+            token = respuesta.get('nextPageToken')
+            siguiente = None
+            if token and prefetch:
+                # Same context as the caller, so the rpc_profile stage still applies
+                siguiente = pool.submit(contextvars.copy_context().run, pedir, token)
+            yield respuesta.get('assets', [])
+            if not token:
+                return
+            respuesta = siguiente.result() if siguiente else pedir(token)
+
+
+def iterar_assets(folder, tamano_pagina=None, prefetch=True):
+    """Assets de la carpeta uno a uno ({'id', 'name', 'type', 'updateTime'}), directo desde listAssets."""
+    for pagina in paginas(folder, tamano_pagina, prefetch):
+        for asset in pagina:
+            yield _resumen(asset)
+
+
+def _vigente(entrada):
+    return entrada is not None and time.time() - entrada['listado_en'] < TTL_SEGUNDOS
+
+
+def iterar(folder, refrescar=False):
+    """
+    Assets de la carpeta uno a uno: del catálogo si el listado sigue vigente; si no,
+    página por página desde listAssets, y el listado completo queda en el catálogo.
+    """
+    _cargar_cache()
+    entrada = _catalogo.get(folder)
+    if not refrescar and _vigente(entrada):
+        yield from list(entrada['assets'])
+        return
+
+    listado_en = time.time()
+    assets = []
+    for asset in iterar_assets(folder):
+        assets.append(asset)
+        yield asset
+    with _lock:
+        _catalogo[folder] = {'listado_en': listado_en, 'assets': assets}
+        _guardar_cache()
+
+
+def listar(folder, refrescar=False):
+    """Assets de una carpeta; un solo listado por carpeta mientras el TTL siga vigente."""
+    _cargar_cache()
+    entrada = _catalogo.get(folder)
+    if refrescar or not _vigente(entrada):
+        for _ in iterar(folder, refrescar=True):
+            pass
+        entrada = _catalogo[folder]
+    return entrada['assets']
+
+
+def iterar_nombres(folder):
+    """Último segmento del id de cada asset de la carpeta, uno a uno."""
+    for asset in iterar(folder):
+        yield asset['id'].split('/')[-1]
+
+
+def nombres(folder):
+    """Último segmento del id de cada asset de la carpeta."""
+    return [asset['id'].split('/')[-1] for asset in listar(folder)]
+
+
+def existe(asset_id):
+    """True si el asset aparece en el listado de su carpeta."""
+    folder, nombre = asset_id.rsplit('/', 1)
+    return nombre in nombres(folder)
+
+
+def primer_existente(candidatos):
+    """Primer asset id de la lista que existe, o None."""
+    for asset_id in candidatos:
+        if existe(asset_id):
+            return asset_id
+    return None
+
+
+def nombre_unico(base_asset_name):
+    """
+    base_asset_name si está libre; si no, el primer base_1, base_2, ... libre.
+    Retorna (asset_name, suffix) con suffix=1 cuando no hizo falta sufijo,
+    igual que el loop original de hs_update.
+    """
+    asset_name = base_asset_name
+    suffix = 1
+    while existe(asset_name):
+        print(f"Asset exists: {asset_name}, trying with suffix _{suffix}")
+        asset_name = f"{base_asset_name}_{suffix}"
+        suffix += 1
+    print(f"Asset name is available: {asset_name}")
+    return asset_name, suffix
+
+
+def registrar(asset_id, asset_type='TABLE'):
+    """Agrega un asset recién exportado al catálogo para que el resto de la ejecución lo vea."""
+    folder = asset_id.rsplit('/', 1)[0]
+    with _lock:
+        if existe(asset_id):
+            return
+        _catalogo[folder]['assets'].append({
+            'id': asset_id,
+            'name': asset_id,
+            'type': asset_type,
+            'updateTime': None,
+        })
+        _guardar_cache()
+
+
+def olvidar(asset_id):
+    """Quita un asset del catálogo (p. ej. una exportación que falló y nunca lo creó)."""
+    folder = asset_id.rsplit('/', 1)[0]
+    with _lock:
+        entrada = _catalogo.get(folder)
+        if entrada is None:
+            return
+        entrada['assets'] = [a for a in entrada['assets'] if a['id'] != asset_id]
+        _guardar_cache()
+
+
+def asegurar_carpeta(folder):
+    """Crea la carpeta si no existe (p. ej. la primera vez que se exporta a ella)."""
+    try:
+        listar(folder)
+    except Exception as e:
+        msg = str(e).lower()
+        if 'not found' not in msg and 'does not exist' not in msg and '404' not in msg:
+            raise
+        ee.data.createAsset({'type': 'FOLDER'}, folder)
+        with _lock:
+            _catalogo[folder] = {'listado_en': time.time(), 'assets': []}
+            _guardar_cache()
+        print(f"📂 Created folder {folder}")
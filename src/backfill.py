@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Historical Backfill for the transposed metrics table
+Splits a date range into shards (e.g. one year each), exports every shard as its
+own geometry-free table while keeping at most N tasks in flight, and merges the
+shard outputs with the latest base table into one new transposed base table.
+Shards reduce each zone with its ajustes_zonales setting; a shard that fails for
+memory escalates the zones that fail on its months and is exported again.
+Note: Earth Engine must be initialized BEFORE calling functions in this module
+
+Usage:
+    python backfill.py 2015-1 2024-12
+    python backfill.py 2015-1 2024-12 --meses-por-fragmento 12 --max-tareas 4
+"""
+
+import ee
+
+import ajustes_zonales
+import asset_catalog
+import geometrias
+import hs_update
+import metrics_deltas
+import task_monitor
+import zonal_stats
+
+MESES_POR_FRAGMENTO = 12
+# Earth Engine caps concurrent batch tasks per user; stay well below it
+MAX_TAREAS_EN_VUELO = 4
+MAX_WAIT = 6 * 3600
+
+FOLDER_FRAGMENTOS = f"{hs_update.FOLDER_METRICS}Backfill"
+
+
+def clave_fecha(fecha):
+    """(year, month) de 'YYYY-M', 'YYYY-MM' o 'YYYY-_MM'."""
+    year, month = str(fecha).split('-')
+    return int(year), int(month.replace('_', ''))
+
+
+def fechas_en_rango(desde, hasta, folder_hs=hs_update.FOLDER_HS):
+    """Fechas 'YYYY-M' con imagen en folder_hs entre desde y hasta (inclusive), ordenadas."""
+    inicio, fin = clave_fecha(desde), clave_fecha(hasta)
+    fechas = set()
+    for nombre in asset_catalog.nombres(folder_hs):
+        fecha = hs_update.fecha_desde_asset(nombre)
+        if fecha is not None and inicio <= clave_fecha(fecha) <= fin:
+            fechas.add(fecha)
+    return sorted(fechas, key=clave_fecha)
+
+
+def fragmentar(fechas, meses_por_fragmento=MESES_POR_FRAGMENTO):
+    """Fechas ordenadas en grupos consecutivos de a lo más meses_por_fragmento."""
+    return [fechas[i:i + meses_por_fragmento] for i in range(0, len(fechas), meses_por_fragmento)]
+
+
+def nombre_fragmento(fechas):
+    """'2015_1_2015_12' para un fragmento de 2015-1 a 2015-12."""
+    return f"{fechas[0]}_{fechas[-1]}".replace('-', '_')
+
+
+def fechas_y_assets(fechas):
+    """(fecha, asset_id) de la imagen de cada fecha del fragmento."""
+    fechas_assets = []
+    for fecha in fechas:
+        asset_id = hs_update.build_asset_id_from_date(fecha)
+        fechas_assets.append((hs_update.fecha_desde_asset(asset_id), asset_id))
+    return fechas_assets
+
+
+def tabla_fragmento(fechas, filas, subcuencas_filtradas):
+    """
+    Columnas de las fechas (y estadísticas) del fragmento sobre las filas COD_SUBC: los meses
+    en result_cache se copian de ahí y el resto sale de un solo reduceRegions por nivel de zona.
+    Retorna (tabla, {fecha: clave} de los meses reducidos en EE).
+    """
+    region = hs_update.REGION_POR_DEFECTO
+    valores, columnas, pendientes, claves = hs_update.resultados_en_cache(
+        fechas_y_assets(fechas), estadisticas=hs_update.ESTADISTICAS
+    )
+    tabla = filas
+    if columnas:
+        tabla = zonal_stats.unir_valores_locales(tabla, valores, columnas)
+    if pendientes:
+        # Same per-zone settings as the cache keys (their factores_escala)
+        niveles = ajustes_zonales.niveles(region.nombre, hs_update.codigos_zonas(region))
+        tabla = zonal_stats.promedios_apilados(pendientes, subcuencas_filtradas, tabla, hs_update.ESTADISTICAS,
+                                               niveles)
+    return tabla, claves
+
+
+def escalar_por_memoria(fechas, subcuencas_filtradas):
+    """
+    Tras un fragmento que falló por memoria: sondea las zonas sobre sus meses y sube de nivel
+    las que fallan (todas un nivel si ninguna falla por separado). True si alguna subió.
+    """
+    region = hs_update.REGION_POR_DEFECTO
+    codigos = hs_update.codigos_zonas(region)
+    escaladas = zonal_stats.sondear_apilados(region.nombre, fechas_y_assets(fechas), subcuencas_filtradas,
+                                             codigos, hs_update.ESTADISTICAS)
+    if not escaladas:
+        escaladas = ajustes_zonales.escalar(region.nombre, codigos, motivo='backfill shard failed for memory')
+    return bool(escaladas)
+
+
+def exportar_fragmentos(fragmentos, filas, folder=FOLDER_FRAGMENTOS,
+                        max_en_vuelo=MAX_TAREAS_EN_VUELO, max_wait=MAX_WAIT):
+    """
+    Un Export.table.toAsset por fragmento, con a lo más max_en_vuelo tareas a la vez. Los
+    fragmentos que fallan por memoria se reenvían con las zonas escaladas, hasta
+    hs_update.MAX_REPLANIFICACIONES veces. Retorna {asset_id: status} en el orden de los fragmentos.
+    """
+    subcuencas_filtradas = ee.FeatureCollection(geometrias.fuente(hs_update.REGION_POR_DEFECTO)) \
+        .filter(ee.Filter.inList('COD_SUBC', hs_update.SUBCUENCA_NOMBRES))
+    asset_catalog.asegurar_carpeta(folder)
+
+    # asset_id -> {fecha: clave} of the months each shard reduced in EE
+    claves_cache = {}
+    estados = {}
+    replanificaciones = 0
+    while True:
+        fragmento_de = {}
+        envios = []
+        for fechas in fragmentos:
+            asset_name, _ = asset_catalog.nombre_unico(f"{folder}/{nombre_fragmento(fechas)}")
+            fragmento_de[asset_name] = fechas
+
+            def enviar(fechas=fechas, asset_name=asset_name):
+                tabla, claves_cache[asset_name] = tabla_fragmento(fechas, filas, subcuencas_filtradas)
+                task = ee.batch.Export.table.toAsset(
+                    collection=tabla,
+                    description=f"HS_Backfill_{nombre_fragmento(fechas)}",
+                    assetId=asset_name
+                )
+                task.start()
+                asset_catalog.registrar(asset_name)
+                return task
+
+            envios.append((asset_name, enviar))
+
+        por_memoria = []
+        for asset_id, status in task_monitor.ejecutar_con_cupo(envios, max_en_vuelo=max_en_vuelo,
+                                                               max_wait=max_wait).items():
+            estados[asset_id] = status
+            if status.get('state') == 'COMPLETED':
+                hs_update.guardar_resultados(asset_id, claves_cache.get(asset_id), hs_update.ESTADISTICAS)
+            elif status.get('state') in ('FAILED', 'CANCELLED'):
+                # Registered when it started but never created; a resubmission takes the name again
+                asset_catalog.olvidar(asset_id)
+                if ajustes_zonales.es_error_de_memoria(status.get('error_message')):
+                    por_memoria.append(fragmento_de[asset_id])
+
+        if not por_memoria or replanificaciones >= hs_update.MAX_REPLANIFICACIONES:
+            return estados
+        # Every shard is probed: zone settings are shared, but each shard has its own months
+        if not any([escalar_por_memoria(fechas, subcuencas_filtradas) for fechas in por_memoria]):
+            print("❌ Every zone is already at the last escalation level")
+            return estados
+        replanificaciones += 1
+        print(f"🔁 Re-planning {len(por_memoria)} shard(s) with the escalated zones")
+        fragmentos = por_memoria
+
+
+def fusionar_fragmentos(fragmento_ids, ultima_fecha, esperar=True):
+    """
+    Tabla base + deltas pendientes + fragmentos (con geometrías) como nueva tabla base
+    en FOLDER_METRICS. Las columnas de los fragmentos reemplazan a las existentes.
+    """
+    folder_metrics = hs_update.FOLDER_METRICS
+    base_id = hs_update.get_latest_csv_id(folder_metrics)
+    deltas = metrics_deltas.deltas_pendientes(base_id, hs_update.FOLDER_METRICS_DELTAS)
+
+    csv = ee.FeatureCollection(base_id)
+    tabla = metrics_deltas.tabla_con_deltas(hs_update.tabla_sin_geometria(csv), deltas + list(fragmento_ids))
+    datos_para_exportar = hs_update.reparar_geometrias(tabla, hs_update.fuente_geometrias(csv))
+
+    # Named after the newest month it holds, like a compaction
+    nombres = [base_id.split('/')[-1]] + [d.split('/')[-1] for d in deltas] + [ultima_fecha.replace('-', '_')]
+    year, month = max(metrics_deltas.clave_asset_metricas(n) for n in nombres)
+    asset_name, _ = asset_catalog.nombre_unico(f'{folder_metrics}/{year}_{month}')
+
+    task = ee.batch.Export.table.toAsset(
+        collection=datos_para_exportar,
+        description=f"HS_Backfill_Merge_{year}_{month}",
+        assetId=asset_name
+    )
+    task.start()
+    asset_catalog.registrar(asset_name)
+    print(f'Tarea de fusión creada: {asset_name} ({len(fragmento_ids)} fragmentos, {len(deltas)} deltas)')
+
+    resultado = {'assetPath': asset_name, 'exportTask': task}
+    if esperar:
+        resultado['taskCompleted'] = hs_update.wait_for_task_completion(task, check_interval=15, max_wait=1800)
+        if resultado['taskCompleted']:
+            hs_update.make_asset_public(asset_name)
+    return resultado
+
+
+def backfill(desde, hasta, meses_por_fragmento=MESES_POR_FRAGMENTO,
+             max_en_vuelo=MAX_TAREAS_EN_VUELO, esperar=True):
+    """
+    Recalcula todas las fechas entre desde y hasta en fragmentos paralelos
+    y los fusiona en una nueva tabla base.
+    """
+    fechas = fechas_en_rango(desde, hasta)
+    if not fechas:
+        print(f'No hay imágenes entre {desde} y {hasta}.')
+        return {'status': 'NO_PROCESSING_NEEDED', 'fechasProcesadas': []}
+
+    fragmentos = fragmentar(fechas, meses_por_fragmento)
+    print(f'Backfill {fechas[0]} .. {fechas[-1]}: {len(fechas)} fechas en {len(fragmentos)} fragmentos')
+
+    # Row skeleton (COD_SUBC only) taken from the latest base table
+    filas = metrics_deltas.tabla_delta(hs_update.get_latest_csv_id(hs_update.FOLDER_METRICS))
+    estados = exportar_fragmentos(fragmentos, filas, max_en_vuelo=max_en_vuelo)
+
+    fallidos = [asset_id for asset_id, status in estados.items() if status.get('state') != 'COMPLETED']
+    if fallidos:
+        print(f'❌ {len(fallidos)} fragmento(s) sin completar, no se fusionó: {fallidos}')
+        return {'status': 'ERROR', 'fragmentos': estados, 'fechasProcesadas': []}
+
+    resultado = fusionar_fragmentos(list(estados), fechas[-1], esperar=esperar)
+    resultado.update({'status': 'COMPLETED', 'fragmentos': estados, 'fechasProcesadas': fechas})
+    return resultado
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Rebuild a date range of the transposed metrics table')
+    parser.add_argument('desde', help="first month, e.g. '2015-1'")
+    parser.add_argument('hasta', help="last month, e.g. '2024-12'")
+    parser.add_argument('--meses-por-fragmento', type=int, default=MESES_POR_FRAGMENTO,
+                        help='months per export task')
+    parser.add_argument('--max-tareas', type=int, default=MAX_TAREAS_EN_VUELO,
+                        help='maximum export tasks in flight')
+    parser.add_argument('--no-esperar', action='store_true',
+                        help="don't wait for the merge task")
+    args = parser.parse_args(argv)
+
+    import update_dashboard
+
+    update_dashboard.initialize_earth_engine()
+    resultado = backfill(args.desde, args.hasta, args.meses_por_fragmento, args.max_tareas,
+                         esperar=not args.no_esperar)
+    return 0 if resultado['status'] != 'ERROR' else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Static Chart Data for the dashboard
+Writes one small gzip-compressed JSON file per subbasin (date index + values at
+float32 precision) from the latest transposed metrics table and its deltas, so a
+page can fetch only the series it draws instead of reading every monthly column
+and every geometry of MetricsHSTransposed through Earth Engine.
+
+Layout (per region):
+    <dir>/<Region>/index.json          subbasins, dates, source tables
+    <dir>/<Region>/<COD_SUBC>.json.gz  {"cod", "nombre", "fechas", "valores"}
+    <dir>/<Region>/promedio.json.gz    mean of all rows per date (regional average line)
+Note: Earth Engine must be initialized BEFORE calling functions in this module
+"""
+
+import datetime
+import gzip
+import json
+import os
+import re
+
+import ee
+
+import hs_update
+import metrics_deltas
+
+DIR_SALIDA = os.getenv('HS_CHART_DATA_DIR', 'chart_data')
+
+# 'YYYY-M', 'YYYY-MM' or 'YYYY-_MM' mean columns ('YYYY-MM_<stat>' columns are left out)
+PATRON_COLUMNA = re.compile(r'^(\d{4})-_?(\d{1,2})$')
+
+# float32 keeps ~7 significant digits
+DIGITOS = 7
+
+
+def fecha_columna(columna):
+    """'YYYY-MM' normalizado de una columna de medias, o None si no es una."""
+    match = PATRON_COLUMNA.match(columna)
+    if not match:
+        return None
+    return f"{match.group(1)}-{int(match.group(2)):02d}"
+
+
+def a_float32(valor):
+    """Valor redondeado a precisión float32 (None si falta o no es número)."""
+    if not isinstance(valor, (int, float)) or valor != valor:
+        return None
+    return float(f"{valor:.{DIGITOS}g}")
+
+
+def fuentes(region=None):
+    """Ids de la tabla base y de los deltas que forman la tabla actual de la región."""
+    region = region or hs_update.REGION_POR_DEFECTO
+    base_id = hs_update.get_latest_csv_id(region.folder_metrics)
+    return [base_id] + metrics_deltas.deltas_pendientes(base_id, region.folder_deltas)
+
+
+def leer_tabla(ids):
+    """Propiedades de cada fila de base + deltas, sin geometrías, en un solo getInfo."""
+    tabla = metrics_deltas.tabla_con_deltas(hs_update.tabla_sin_geometria(ee.FeatureCollection(ids[0])), ids[1:])
+    return [feature['properties'] for feature in tabla.getInfo()['features']]
+
+
+def series(filas):
+    """(fechas ordenadas, {COD_SUBC: {'nombre', 'valores'}}) desde las filas de la tabla transpuesta."""
+    columnas = {}
+    for fila in filas:
+        for columna in fila:
+            fecha = fecha_columna(columna)
+            if fecha is not None:
+                columnas.setdefault(fecha, columna)
+    fechas = sorted(columnas)
+
+    por_codigo = {}
+    for fila in filas:
+        cod = fila.get('COD_SUBC')
+        if cod is None:
+            continue
+        por_codigo[str(cod)] = {
+            'nombre': fila.get('NOM_SUBC', str(cod)),
+            'valores': [a_float32(fila.get(columnas[fecha])) for fecha in fechas],
+        }
+    return fechas, por_codigo
+
+
+def promedio(por_codigo, n_fechas):
+    """Media de todas las filas por fecha, como aggregate_mean en ChartSubBassin.js."""
+    medias = []
+    for i in range(n_fechas):
+        valores = [s['valores'][i] for s in por_codigo.values() if s['valores'][i] is not None]
+        medias.append(a_float32(sum(valores) / len(valores)) if valores else None)
+    return medias
+
+
+def _escribir_gz(ruta, datos):
+    # mtime=0: same data, same bytes (no spurious diffs when the files are published)
+    with open(ruta, 'wb') as f, gzip.GzipFile(fileobj=f, mode='wb', mtime=0) as gz:
+        gz.write(json.dumps(datos, separators=(',', ':')).encode('utf-8'))
+
+
+def escribir_graficos(region=None, directorio=None, forzar=False):
+    """
+    Archivos de gráficos de la región en directorio/<nombre>. Si el índice existente ya
+    corresponde a las mismas tablas fuente no vuelve a leer la tabla (salvo forzar).
+    Retorna el índice escrito.
+    """
+    region = region or hs_update.REGION_POR_DEFECTO
+    carpeta = os.path.join(directorio or DIR_SALIDA, region.nombre)
+    ruta_indice = os.path.join(carpeta, 'index.json')
+    ids = fuentes(region)
+
+    if not forzar and os.path.exists(ruta_indice):
+        try:
+            with open(ruta_indice) as f:
+                anterior = json.load(f)
+            if anterior.get('fuentes') == ids:
+                print(f"📈 [{region.nombre}] Chart data already up to date ({len(anterior['subcuencas'])} series)")
+                return anterior
+        except (OSError, ValueError):
+            pass
+
+    fechas, por_codigo = series(leer_tabla(ids))
+    os.makedirs(carpeta, exist_ok=True)
+    for cod, serie in por_codigo.items():
+        _escribir_gz(os.path.join(carpeta, f"{cod}.json.gz"), dict(serie, cod=cod, fechas=fechas))
+    _escribir_gz(os.path.join(carpeta, 'promedio.json.gz'), {
+        'cod': 'promedio', 'nombre': 'Promedio', 'fechas': fechas, 'valores': promedio(por_codigo, len(fechas)),
+    })
+
+    indice = {
+        'region': region.nombre,
+        'generado': datetime.datetime.now().isoformat(),
+        'fuentes': ids,
+        'fechas': fechas,
+        'subcuencas': [{'cod': cod, 'nombre': s['nombre'], 'archivo': f"{cod}.json.gz"} for cod, s in por_codigo.items()],
+    }
+    with open(ruta_indice, 'w') as f:
+        json.dump(indice, f, indent=1, ensure_ascii=False)
+    print(f"📈 [{region.nombre}] Wrote {len(por_codigo)} chart series x {len(fechas)} dates to {carpeta}")
+    return indice
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Per-subbasin climatology for the transposed metrics table
+Running count, mean and M2 per (COD_SUBC, calendar month), kept as a small table in
+<metrics folder>Climatologia next to the metrics output. Each run adds 'YYYY-MM_anom'
+columns (value minus that calendar month's mean in the stored climatology) next to the
+raw means and, once that export completes, folds in only the months the latest
+climatology has not seen, read back from the exported tables (Welford update, O(1) per
+subbasin and month, all server-side), and exports the new state.
+
+Climatology table: one property-only feature per COD_SUBC with n_MM, media_MM and
+m2_MM for MM = 01..12 (variance = m2 / n) and the folded dates in fechas_acumuladas.
+Note: Earth Engine must be initialized BEFORE calling functions in this module
+"""
+
+import ee
+
+import asset_catalog
+import metrics_deltas
+
+SUFIJO_ANOMALIA = '_anom'
+PROPIEDAD_FECHAS = 'fechas_acumuladas'
+# Property holding the joined feature while two tables are combined
+PROPIEDAD_UNIDA = 'unida'
+
+
+def carpeta_climatologia(folder_metrics):
+    """Carpeta de climatologías asociada a una carpeta de tablas base."""
+    return f"{folder_metrics}Climatologia"
+
+
+def ultima_climatologia(folder_climatologia):
+    """Id de la climatología más reciente de la carpeta, o None si aún no hay."""
+    try:
+        nombres = asset_catalog.nombres(folder_climatologia)
+    except Exception as e:
+        print(f"Climatology folder not available ({folder_climatologia}): {e}")
+        return None
+    if not nombres:
+        return None
+    nombres.sort(key=lambda n: (metrics_deltas.clave_asset_metricas(n), n))
+    return f"{folder_climatologia}/{nombres[-1]}"
+
+
+def fechas_acumuladas(climatologia_id):
+    """Fechas ya acumuladas en la climatología, como ee.String separado por comas (para el getInfo del plan)."""
+    return ee.String(ee.FeatureCollection(climatologia_id).first().get(PROPIEDAD_FECHAS))
+
+
+def mes_de_fecha(fecha):
+    """Mes calendario de 'YYYY-M', 'YYYY-MM' o 'YYYY-_MM'."""
+    return int(str(fecha).split('-')[1].replace('_', ''))
+
+
+def propiedades_mes(mes):
+    return f"n_{mes:02d}", f"media_{mes:02d}", f"m2_{mes:02d}"
+
+
+def nombre_climatologia(fechas):
+    """'YYYY_M' del mes más reciente de las fechas (nombre del asset, como las tablas base)."""
+    year, month = max(
+        metrics_deltas.clave_asset_metricas(f.replace('-_', '-').replace('-', '_')) for f in fechas
+    )
+    return f"{year}_{month}"
+
+
+def columna_anomalia(fecha):
+    return f"{fecha}{SUFIJO_ANOMALIA}"
+
+
+def fechas_por_mes(fechas):
+    por_mes = {}
+    for fecha in fechas:
+        por_mes.setdefault(mes_de_fecha(fecha), []).append(fecha)
+    return por_mes
+
+
+def climatologia_vacia(filas):
+    """Estado inicial: una fila por COD_SUBC de filas con n, media y m2 en cero para los 12 meses."""
+    ceros = {p: 0 for mes in range(1, 13) for p in propiedades_mes(mes)}
+    ceros[PROPIEDAD_FECHAS] = ''
+    return ee.FeatureCollection(filas).map(
+        lambda feature: ee.Feature(None, ceros).set('COD_SUBC', feature.get('COD_SUBC'))
+    )
+
+
+def _unir(izquierda, derecha):
+    """Cada feature de izquierda con la de derecha del mismo COD_SUBC en PROPIEDAD_UNIDA (o sin ella)."""
+    join = ee.Join.saveFirst(matchKey=PROPIEDAD_UNIDA, outer=True)
+    filtro = ee.Filter.equals(leftField='COD_SUBC', rightField='COD_SUBC')
+    return join.apply(ee.FeatureCollection(izquierda), ee.FeatureCollection(derecha), filtro)
+
+
+def acumular(climatologia, tabla, fechas, acumuladas):
+    """
+    Climatología con los valores de las columnas fechas de tabla (unidas por COD_SUBC) acumulados.
+    Por mes calendario, el lote de valores nuevos (n_b, media_b, m2_b) se combina con el estado
+    guardado (n_a, media_a, m2_a):
+        delta = media_b - media_a,  n = n_a + n_b
+        media = media_a + delta * n_b / n
+        m2    = m2_a + m2_b + delta^2 * n_a * n_b / n
+    que con un valor por mes es exactamente la actualización de Welford.
+    acumuladas: fechas ya presentes en la climatología (se guardan junto con las nuevas)
+    """
+    por_mes = fechas_por_mes(fechas)
+    todas = ','.join(list(acumuladas) + [f for f in fechas if f not in acumuladas])
+
+    def actualizar(feature):
+        feature = ee.Feature(feature)
+        unida = feature.get(PROPIEDAD_UNIDA)
+        sin_unida = feature.select(feature.propertyNames().remove(PROPIEDAD_UNIDA))
+        valores = ee.Feature(unida).toDictionary()
+
+        nuevos = {}
+        for mes, columnas in por_mes.items():
+            lote = valores.select(columnas, True).values().filter(ee.Filter.notNull(['item']))
+            n_b = lote.size()
+            media_b = ee.Number(ee.Algorithms.If(n_b.gt(0), lote.reduce(ee.Reducer.mean()), 0))
+            m2_b = ee.Number(ee.Algorithms.If(
+                n_b.gt(0), ee.Number(lote.reduce(ee.Reducer.variance())).multiply(n_b), 0
+            ))
+
+            prop_n, prop_media, prop_m2 = propiedades_mes(mes)
+            n_a = ee.Number(feature.get(prop_n))
+            media_a = ee.Number(feature.get(prop_media))
+            m2_a = ee.Number(feature.get(prop_m2))
+
+            n = n_a.add(n_b)
+            # n_b = 0 leaves the state unchanged; max(1) only avoids 0/0 when both are empty
+            divisor = n.max(1)
+            delta = media_b.subtract(media_a)
+            nuevos[prop_n] = n
+            nuevos[prop_media] = media_a.add(delta.multiply(n_b).divide(divisor))
+            nuevos[prop_m2] = m2_a.add(m2_b).add(delta.pow(2).multiply(n_a).multiply(n_b).divide(divisor))
+
+        return ee.Feature(ee.Algorithms.If(
+            unida,
+            sin_unida.set(nuevos).set(PROPIEDAD_FECHAS, todas),
+            sin_unida.set(PROPIEDAD_FECHAS, todas)
+        ))
+
+    return _unir(climatologia, tabla).map(actualizar)
+
+
+def anomalias(tabla, climatologia, fechas):
+    """
+    tabla con una columna 'YYYY-MM_anom' (valor - media del mes calendario) por cada fecha;
+    vacía si la climatología aún no tiene valores de ese mes.
+    """
+    if not fechas:
+        return ee.FeatureCollection(tabla)
+
+    def agregar(feature):
+        feature = ee.Feature(feature)
+        unida = feature.get(PROPIEDAD_UNIDA)
+        sin_unida = feature.select(feature.propertyNames().remove(PROPIEDAD_UNIDA))
+        clima = ee.Feature(unida)
+
+        con_anomalias = sin_unida
+        for fecha in fechas:
+            valor = feature.get(fecha)
+            prop_n, prop_media, _ = propiedades_mes(mes_de_fecha(fecha))
+            anomalia = ee.Algorithms.If(
+                ee.Number(clima.get(prop_n)).eq(0), None, ee.Number(valor).subtract(clima.get(prop_media))
+            )
+            con_anomalias = con_anomalias.set(columna_anomalia(fecha), ee.Algorithms.If(
+                ee.Algorithms.IsEqual(valor, None), None, anomalia
+            ))
+        return ee.Feature(ee.Algorithms.If(unida, con_anomalias, sin_unida))
+
+    return _unir(tabla, climatologia).map(agregar)
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Earth Engine Session
+Owns the credentials, one pooled HTTP transport shared by every thread (kept-alive
+connections instead of a new connection per request) and the retry policy for
+Earth Engine calls: jittered exponential backoff on transient errors (429/quota,
+5xx, dropped connections) with a retry budget shared by the whole run, so a
+degraded service fails the run instead of retrying forever.
+
+Usage:
+    import ee_session
+    ee_session.inicializar()
+    acl = ee_session.llamar(ee.data.getAssetAcl, asset_id)
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+import ee
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from ee._cloud_api_utils import _Http as HttpEE
+except ImportError:  # pooled transport is optional; Earth Engine then uses its default one
+    requests = None
+
+PROYECTO = 'ee-corfobbppciren2023'
+
+# Pooled transport: connections kept per host, sized for the publishing/region threads
+TAMANO_POOL = int(os.getenv('HS_HTTP_POOL', '32'))
+TIMEOUT_HTTP = float(os.getenv('HS_HTTP_TIMEOUT', '300'))
+
+# Retry policy
+MAX_REINTENTOS = 5
+ESPERA_BASE = 1.0
+ESPERA_MAXIMA = 60.0
+# Retries allowed per run, across every call and thread
+PRESUPUESTO_REINTENTOS = int(os.getenv('HS_RETRY_BUDGET', '200'))
+
+# Fragments of the messages of errors worth retrying (throttling, server side, network)
+_ERRORES_TRANSITORIOS = (
+    'quota', 'rate limit', 'too many requests', 'resource_exhausted', 'resource exhausted',
+    'internal error', 'backend error', 'service unavailable', 'temporarily unavailable',
+    'deadline exceeded', 'timed out', 'connection reset', 'connection aborted', 'broken pipe',
+)
+# HTTP status codes as whole numbers (so '0500', a subbasin code, does not match)
+_CODIGOS_TRANSITORIOS = re.compile(r'\b(429|500|502|503|504)\b')
+
+_lock = threading.Lock()
+_reintentos_usados = 0
+_inicializada = False
+_transporte = None
+
+
+class TransporteHttp:
+    """
+    httplib2-style transport (what ee.Initialize(http_transport=...) expects) over one
+    requests.Session with a connection pool, safe to share between threads.
+    Requests go through Earth Engine's own transport on that session, which turns dropped
+    connections and timeouts into the built-in ConnectionError/TimeoutError that
+    googleapiclient's num_retries retries; only the pool size differs from the default.
+    """
+
+    def __init__(self, tamano_pool=None, timeout=None):
+        self.timeout = timeout or TIMEOUT_HTTP
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=tamano_pool or TAMANO_POOL)
+        self.sesion.mount('https://', adaptador)
+        self.sesion.mount('http://', adaptador)
+        self._http = HttpEE(self.sesion, self.timeout)
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        return self._http.request(uri, method=method, body=body, headers=headers,
+                                  redirections=redirections, connection_type=connection_type)
+
+
+def transporte():
+    """Transporte compartido del proceso (None si falta requests o el transporte de Earth Engine)."""
+    global _transporte
+    with _lock:
+        if _transporte is None and requests is not None:
+            _transporte = TransporteHttp()
+        return _transporte
+
+
+def _inicializar_ee(credenciales=None, proyecto=None):
+    kwargs = {'project': proyecto} if proyecto else {}
+    http = transporte()
+    if http is not None:
+        kwargs['http_transport'] = http
+    if credenciales is not None:
+        ee.Initialize(credenciales, **kwargs)
+    else:
+        ee.Initialize(**kwargs)
+
+
+def inicializar():
+    """Initialize Earth Engine once per process, with service account or user credentials"""
+    global _inicializada
+    if _inicializada:
+        return
+    print("\nInitializing Earth Engine...")
+    if transporte() is None:
+        print("⚠️ Pooled HTTP transport not available: using Earth Engine's default one")
+
+    # GitHub Actions: use service account
+    if os.getenv('EE_PRIVATE_KEY'):
+        try:
+            key_data = os.getenv('EE_PRIVATE_KEY')
+            if not key_data:
+                raise ValueError('EE_PRIVATE_KEY is empty')
+
+            # Parse the JSON to get service account info
+            service_account_info = json.loads(key_data)
+
+            # Use ee.ServiceAccountCredentials (correct Python API method)
+            credentials = ee.ServiceAccountCredentials(
+                email=service_account_info['client_email'],
+                key_data=key_data
+            )
+            _inicializar_ee(credentials)
+            _inicializada = True
+            print(f"✓ Initialized with service account: {service_account_info['client_email']}\n")
+            return
+        except json.JSONDecodeError as e:
+            print(f"❌ Failed to parse EE_PRIVATE_KEY as JSON: {e}")
+            sys.exit(1)
+        except Exception as e:
+            print(f"❌ Service account initialization failed: {e}")
+            sys.exit(1)
+
+    # Local development: use default credentials
+    try:
+        _inicializar_ee(proyecto=PROYECTO)
+        _inicializada = True
+        print("✓ Initialized with user credentials\n")
+    except Exception as e:
+        print("❌ Please authenticate first:")
+        print("  python -c \"import ee; ee.Authenticate()\"")
+        print(f"\nError: {e}")
+        sys.exit(1)
+
+
+def es_transitorio(error: Exception) -> bool:
+    """True si vale la pena reintentar el error (throttling, 5xx, conexión caída)."""
+    msg = str(error).lower()
+    return bool(_CODIGOS_TRANSITORIOS.search(msg)) or any(f in msg for f in _ERRORES_TRANSITORIOS)
+
+
+def espera(intento: int) -> float:
+    """Backoff exponencial con jitter: la mitad fija y la otra mitad al azar, con tope ESPERA_MAXIMA."""
+    tope = min(ESPERA_MAXIMA, ESPERA_BASE * (2 ** intento))
+    return tope / 2 + random.uniform(0, tope / 2)
+
+
+def _usar_presupuesto() -> bool:
+    global _reintentos_usados
+    with _lock:
+        if _reintentos_usados >= PRESUPUESTO_REINTENTOS:
+            return False
+        _reintentos_usados += 1
+        return True
+
+
+def reintentos_usados() -> int:
+    return _reintentos_usados
+
+
+def configurar(presupuesto=None, max_reintentos=None, espera_base=None):
+    """Ajusta la política (y reinicia el contador del presupuesto)."""
+    global PRESUPUESTO_REINTENTOS, MAX_REINTENTOS, ESPERA_BASE, _reintentos_usados
+    if presupuesto is not None:
+        PRESUPUESTO_REINTENTOS = presupuesto
+    if max_reintentos is not None:
+        MAX_REINTENTOS = max_reintentos
+    if espera_base is not None:
+        ESPERA_BASE = espera_base
+    with _lock:
+        _reintentos_usados = 0
+
+
+def llamar(fn, *args, antes=None, **kwargs):
+    """
+    fn(*args, **kwargs) con la política de reintentos. Los errores no transitorios, los que
+    agotan MAX_REINTENTOS y los que llegan con el presupuesto agotado se propagan.
+    antes: callable sin argumentos llamado antes de cada intento (p. ej. un limitador de tasa).
+    Solo para llamadas idempotentes (lecturas, ACLs); no para iniciar tareas.
+    """
+    for intento in range(MAX_REINTENTOS + 1):
+        if antes is not None:
+            antes()
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if intento == MAX_REINTENTOS or not es_transitorio(e):
+                raise
+            if not _usar_presupuesto():
+                print(f"❌ Retry budget ({PRESUPUESTO_REINTENTOS}) exhausted")
+                raise
+            segundos = espera(intento)
+            print(f"🔁 Transient Earth Engine error ({e}); retry {intento + 1}/{MAX_REINTENTOS} in {segundos:.1f}s")
+            time.sleep(segundos)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Prepared Subbasin Geometries
+Builds, once per version of a region's subbasin asset, a derived table with only
+the region's COD_SUBC codes, each polygon simplified to a fraction of the SM pixel
+size, indexed by COD_SUBC (system:index, sorted) and with a precomputed 'Region'
+union feature. The zonal and geometry-repair stages read it instead of the
+full-resolution polygons, so far fewer vertices are loaded per run and per export.
+
+Each subbasin is simplified on its own, so shared borders no longer match exactly:
+the tolerance is kept to a small fraction of the pixel (the gaps and overlaps it
+leaves are thinner than that), and before exporting, the area and the mean of one
+HS image per zone are compared with the full-resolution polygons; the asset is not
+exported when they drift beyond TOLERANCIA_PARIDAD.
+
+The prepared asset sits next to the source, named after a hash of the source
+updateTime, the codes and the tolerance settings: when the source changes, the
+name changes and the stages fall back to the source until it is prepared again.
+Note: Earth Engine must be initialized BEFORE calling functions in this module
+
+Usage:
+    python geometrias.py                    # every configured region
+    python geometrias.py --region Valparaiso --no-esperar
+"""
+
+import hashlib
+import json
+import os
+
+import ee
+
+import asset_catalog
+import result_cache
+import task_monitor
+import zonal_stats
+
+# Simplification tolerance as a fraction of the SM pixel size (native grid of the HS images)
+FRACCION_PIXEL = float(os.getenv('HS_GEOM_FRACCION_PIXEL', '0.05'))
+
+# Largest relative change of a zone's area or mean, and of the overlap between
+# simplified subbasins over their total area, allowed before exporting
+TOLERANCIA_PARIDAD = float(os.getenv('HS_GEOM_TOLERANCIA_PARIDAD', '0.005'))
+
+# Bump when the preparation itself changes so a new asset is built
+VERSION_PREPARACION = 2
+
+SUFIJO = '_prep_'
+
+
+def id_preparado(region):
+    """Id del asset preparado para la versión actual de la fuente (exista o no), o None si no se conoce."""
+    version = result_cache.version_asset(region.subcuencas_asset)
+    if version is None:
+        return None
+    firma = json.dumps({
+        'fuente': region.subcuencas_asset,
+        'version_fuente': version,
+        'codigos': sorted(region.subcuencas),
+        'fraccion_pixel': FRACCION_PIXEL,
+        'version_preparacion': VERSION_PREPARACION,
+    }, sort_keys=True)
+    return f"{region.subcuencas_asset}{SUFIJO}{hashlib.sha256(firma.encode('utf-8')).hexdigest()[:10]}"
+
+
+def preparada(region):
+    """Id del asset preparado vigente si ya existe, o None."""
+    try:
+        asset_id = id_preparado(region)
+    except Exception as e:
+        print(f"⚠️ Could not check prepared geometries for {region.subcuencas_asset}: {e}")
+        return None
+    return asset_id if asset_id and asset_catalog.existe(asset_id) else None
+
+
+def fuente(region):
+    """Asset de subcuencas a usar: el preparado vigente o, mientras no exista, el original."""
+    return preparada(region) or region.subcuencas_asset
+
+
+def imagen_referencia(region):
+    """Primera imagen HS de la región (ee.Image): tamaño de píxel y paridad."""
+    for nombre in asset_catalog.iterar_nombres(region.folder_hs):
+        if region.fecha_desde_nombre(nombre):
+            return ee.Image(f"{region.folder_hs}/{nombre}")
+    raise RuntimeError(f"No HS images for {region.nombre} in {region.folder_hs}")
+
+
+def tamano_pixel(region):
+    """Tamaño nominal del píxel SM (ee.Number, metros) desde una imagen HS de la región."""
+    return imagen_referencia(region).select(0).projection().nominalScale()
+
+
+def vertices(fc):
+    """Número total de vértices de las geometrías de fc (ee.Number)."""
+    return ee.FeatureCollection(fc).map(
+        lambda feature: ee.Feature(None, {
+            'n': ee.List(feature.geometry().coordinates()).flatten().size().divide(2)
+        })
+    ).aggregate_sum('n')
+
+
+def resumen_zonas(fc, imagen):
+    """Por zona de fc: COD_SUBC, área (m²) y media de la primera banda de imagen (features sin geometría)."""
+    banda = ee.Image(imagen).select(0)
+    reducidas = banda.reduceRegions(
+        collection=ee.FeatureCollection(fc), reducer=ee.Reducer.mean(), **zonal_stats.parametros_escala(banda)
+    )
+    return reducidas.map(lambda feature: ee.Feature(None, {
+        'COD_SUBC': feature.get('COD_SUBC'),
+        'area': feature.geometry().area(1),
+        'media': feature.get('mean'),
+    }))
+
+
+def solape(fc):
+    """Área (m²) cubierta por más de una subcuenca de fc: suma de las áreas menos el área de la unión."""
+    subcuencas = ee.FeatureCollection(fc).filter(ee.Filter.neq('COD_SUBC', 'Region'))
+    areas = subcuencas.map(lambda feature: feature.set('area', feature.geometry().area(1)))
+    return ee.Number(areas.aggregate_sum('area')).subtract(subcuencas.geometry(1).area(1))
+
+
+def diferencias_paridad(fuente, preparada, solape_m2, tolerancia=None):
+    """
+    Zonas cuya área o media cambian más que tolerancia (relativa) entre las geometrías originales
+    y las preparadas, más el solape entre subcuencas simplificadas si supera tolerancia del área total.
+    fuente, preparada: {COD_SUBC: {'area', 'media'}} (getInfo de resumen_zonas). Retorna mensajes.
+    """
+    tolerancia = TOLERANCIA_PARIDAD if tolerancia is None else tolerancia
+    problemas = []
+    for cod, original in sorted(fuente.items()):
+        nueva = preparada.get(cod)
+        if nueva is None:
+            problemas.append(f"{cod}: missing from the prepared geometries")
+            continue
+        for clave in ('area', 'media'):
+            antes, despues = original.get(clave), nueva.get(clave)
+            if antes is None or despues is None:
+                if (antes is None) != (despues is None):
+                    problemas.append(f"{cod}: {clave} {antes} -> {despues}")
+                continue
+            if abs(despues - antes) > tolerancia * max(abs(antes), 1e-12):
+                problemas.append(f"{cod}: {clave} {antes:.6g} -> {despues:.6g}")
+    total = sum(z['area'] or 0 for cod, z in preparada.items() if cod != 'Region')
+    if total and solape_m2 > tolerancia * total:
+        problemas.append(f"overlap between simplified subbasins: {solape_m2:.6g} m² of {total:.6g} m²")
+    return problemas
+
+
+def tabla_preparada(region, tolerancia):
+    """
+    Subcuencas de la región simplificadas a tolerancia (metros), solo COD_SUBC,
+    system:index = COD_SUBC y ordenadas, más la feature 'Region' (unión de todas).
+    """
+    subcuencas = ee.FeatureCollection(region.subcuencas_asset) \
+        .filter(ee.Filter.inList('COD_SUBC', region.subcuencas))
+
+    def simplificar(feature):
+        feature = ee.Feature(feature)
+        cod = feature.get('COD_SUBC')
+        return ee.Feature(feature.geometry().simplify(maxError=tolerancia), {'COD_SUBC': cod}) \
+            .set('system:index', ee.String(cod))
+
+    # Union of the full-resolution polygons, simplified once (no slivers between simplified edges)
+    union = subcuencas.union(maxError=tolerancia).first().geometry().simplify(maxError=tolerancia)
+    region_feature = ee.Feature(union, {'COD_SUBC': 'Region'}).set('system:index', 'Region')
+    return subcuencas.map(simplificar).sort('COD_SUBC').merge(ee.FeatureCollection([region_feature]))
+
+
+def preparar(region, tolerancia=None, esperar=True, max_wait=1800):
+    """
+    Exporta el asset preparado de la región si la versión actual de la fuente aún no lo tiene
+    y pasa la paridad de área y media por zona (diferencias_paridad).
+    tolerancia: metros (por defecto FRACCION_PIXEL * tamaño del píxel SM).
+    Retorna el id del asset preparado, o None si no pasó la paridad o la exportación no terminó bien.
+    """
+    asset_id = id_preparado(region)
+    if asset_id is None:
+        raise RuntimeError(f"Unknown updateTime for {region.subcuencas_asset}")
+    if asset_catalog.existe(asset_id):
+        print(f"✓ [{region.nombre}] Prepared geometries up to date: {asset_id}")
+        return asset_id
+
+    imagen = imagen_referencia(region)
+    if tolerancia is None:
+        tolerancia = imagen.select(0).projection().nominalScale().multiply(FRACCION_PIXEL)
+    tabla = tabla_preparada(region, tolerancia)
+    originales = ee.FeatureCollection(region.subcuencas_asset) \
+        .filter(ee.Filter.inList('COD_SUBC', region.subcuencas))
+    originales_con_region = originales.select(['COD_SUBC']).merge(ee.FeatureCollection([
+        ee.Feature(originales.geometry(1), {'COD_SUBC': 'Region'})
+    ]))
+
+    # One round-trip for the report and the parity check against the full-resolution polygons
+    info = ee.Dictionary({
+        'tolerancia': tolerancia,
+        'antes': vertices(originales),
+        'despues': vertices(tabla),
+        'fuente': resumen_zonas(originales_con_region, imagen),
+        'preparada': resumen_zonas(tabla, imagen),
+        'solape': solape(tabla),
+    }).getInfo()
+    print(f"📐 [{region.nombre}] Simplifying to {info['tolerancia']} m: "
+          f"{info['antes']} -> {info['despues']} vertices")
+
+    def por_codigo(tabla_info):
+        return {f['properties']['COD_SUBC']: f['properties'] for f in tabla_info['features']}
+
+    problemas = diferencias_paridad(por_codigo(info['fuente']), por_codigo(info['preparada']), info['solape'])
+    if problemas:
+        for problema in problemas:
+            print(f"  ❌ {problema}")
+        print(f"❌ [{region.nombre}] Prepared geometries drift beyond {TOLERANCIA_PARIDAD:.2%}; "
+              f"not exported (lower HS_GEOM_FRACCION_PIXEL or --tolerancia)")
+        return None
+    print(f"✓ [{region.nombre}] Area and mean per zone within {TOLERANCIA_PARIDAD:.2%} of the source")
+
+    task = ee.batch.Export.table.toAsset(
+        collection=tabla,
+        description=f"HS_Geometrias_{region.nombre}",
+        assetId=asset_id
+    )
+    task.start()
+    asset_catalog.registrar(asset_id)
+    print(f"Tarea de geometrías creada: {asset_id}")
+    if not esperar:
+        return asset_id
+
+    estados = task_monitor.esperar_tareas([task.id], max_wait=max_wait)
+    if estados.get(task.id, {}).get('state') != 'COMPLETED':
+        print(f"⚠️ Prepared geometries export did not complete: {asset_id}")
+        return None
+    return asset_id
+
+
+def main(argv=None):
+    import argparse
+
+    import regiones
+    import update_dashboard
+
+    parser = argparse.ArgumentParser(description='Prepare simplified, indexed subbasin geometries')
+    parser.add_argument('--regiones', default=None,
+                        help='region config file (JSON or YAML, default regiones.json or HS_REGIONES)')
+    parser.add_argument('--region', action='append', dest='nombres_regiones',
+                        help='only this region (repeatable)')
+    parser.add_argument('--tolerancia', type=float, default=None,
+                        help=f'simplification tolerance in meters (default {FRACCION_PIXEL} x SM pixel size)')
+    parser.add_argument('--no-esperar', action='store_true', help='submit the exports and return')
+    args = parser.parse_args(argv)
+
+    update_dashboard.initialize_earth_engine()
+
+    fallidas = []
+    for region in regiones.cargar_regiones(args.regiones, args.nombres_regiones):
+        if preparar(region, args.tolerancia, esperar=not args.no_esperar) is None:
+            fallidas.append(region.nombre)
+    return 1 if fallidas else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
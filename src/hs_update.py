@@ -1,7 +1,3 @@
-import datetime
-import time
-import ee
-
 #!/usr/bin/env python3
 """
 Soil Moisture Metrics Processing
@@ -9,40 +5,135 @@ Note: Earth Engine must be initialized BEFORE calling functions in this module
 """
 
 import ee
-import time
+import os
 import datetime
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import ajustes_zonales
+import asset_catalog
+import climatologia
+import ee_session
+import geometrias
+import local_zonal
+import metrics_deltas
+import publish_asset
+import regiones
+import result_cache
+import rpc_profile
+import run_journal
+import task_monitor
+import zonal_stats
 
 # Note: Do NOT initialize EE here - it's done in update_dashboard.py
 
-def asegurar_geometrias_fixed(fc, subcuencas):
-    """Versión corregida que maneja correctamente las geometrías de Earth Engine"""
-
-    def map_geometry(feature):
-        try:
-            # Get geometry and check if it exists and is valid
-            geom = feature.geometry()
-
-            # In Earth Engine Python API, check if geometry is valid
-            # by trying to compute its area (this will fail for null/invalid geometries)
-            try:
-                # This will trigger an error if geometry is null/invalid
-                geom.area().getInfo()
-                return feature  # Geometry is valid, return as is
-            except:
-                # Get geometry from subcuencas if original geometry is invalid
-                cod_subc = feature.get('COD_SUBC')
-                subc_feature = subcuencas.filter(ee.Filter.eq('COD_SUBC', cod_subc)).first()
-                return feature.setGeometry(subc_feature.geometry())
-                
-        except Exception as e:
-            print(f"Error in map_geometry: {e}")
-            return feature
-
-    return ee.FeatureCollection(fc).map(map_geometry)
+# Zonal stage: 'batch' runs one reduceRegions per month over all subbasins,
+# 'por_feature' keeps the original one reduceRegion per feature path
+MODO_ZONAL = 'batch'
+
+# Missing months: 'apilado' stacks them as bands of one image and reduces once,
+# 'encadenado' wraps one table map per month (uses MODO_ZONAL)
+MODO_MESES = 'apilado'
+
+# Zonal backend: 'ee' reduces in Earth Engine, 'local' computes the means from the
+# downloaded GeoTIFFs in HS_LOCAL_TIFF_DIR (months without a file fall back to 'ee')
+BACKEND_ZONAL = os.getenv('HS_ZONAL_BACKEND', 'ee')
+LOCAL_TIFF_DIR = os.getenv('HS_LOCAL_TIFF_DIR', '')
+
+# Statistics per subbasin and month, computed in one pass (see zonal_stats.REDUCTORES).
+# The mean is always included: its 'YYYY-MM' column drives planning and the dashboard;
+# the rest are written as 'YYYY-MM_<stat>'. The local backend and 'por_feature' only give the mean.
+ESTADISTICAS = ['mean'] + [e for e in os.getenv('HS_ESTADISTICAS', '').replace(' ', '').split(',') if e and e != 'mean']
+
+# Months whose image, subbasins and settings are unchanged are read from result_cache
+# instead of being reduced again in Earth Engine (HS_CACHE_RESULTADOS=0 turns it off)
+USAR_CACHE_RESULTADOS = os.getenv('HS_CACHE_RESULTADOS', '1') != '0'
+
+# Zones that run out of memory are reduced with a higher tileScale or a coarser scale
+# (ajustes_zonales). HS_ZONAL_PREFLIGHT=1 probes the zones with no recorded setting before
+# reducing; an export that fails for memory is re-planned up to MAX_REPLANIFICACIONES times.
+PREFLIGHT_ZONAL = os.getenv('HS_ZONAL_PREFLIGHT', '0') != '0'
+MAX_REPLANIFICACIONES = 2
+
+# Export 'YYYY-MM_anom' columns (against the stored per-subbasin climatology) with the new
+# months and fold those months into the climatology from the exported table once its export
+# completes (HS_CLIMATOLOGIA=0 turns it off)
+CLIMATOLOGIA = os.getenv('HS_CLIMATOLOGIA', '1') != '0'
+
+FOLDER_HS = 'projects/ee-corfobbppciren2023/assets/HS'
+FOLDER_METRICS = 'projects/ee-corfobbppciren2023/assets/MetricsHSTransposed'
+FOLDER_METRICS_DELTAS = metrics_deltas.carpeta_deltas(FOLDER_METRICS)
+
+# Export layout: 'delta' writes only the new month columns to FOLDER_METRICS_DELTAS,
+# 'completo' rewrites the whole table (base + deltas + new months) to FOLDER_METRICS
+MODO_EXPORTACION = 'delta'
+# Pending deltas that trigger a compaction into a new base table
+DELTAS_POR_COMPACTACION = 12
+
+SUBCUENCAS_ASSET = "projects/ee-corfobbppciren2023/assets/Geometrias/SubcuencasValparaiso"
+
+SUBCUENCA_NOMBRES = [
+    '0510', '0511', '0512', '0500', '0520', '0541', '0521', '0522',
+    '0530', '0540', '0531', '0542', '0532', '0550', '0551', '0574',
+    '0552', '0553', '0580'
+]
+
+# Region used when no other is given (the constants above); see regiones.json for the rest
+REGION_POR_DEFECTO = regiones.Region(
+    nombre='Valparaiso',
+    subcuencas_asset=SUBCUENCAS_ASSET,
+    subcuencas=SUBCUENCA_NOMBRES,
+    patron_hs='SM{year}Valparaiso_GCOM_mes{month}',
+    folder_hs=FOLDER_HS,
+    folder_metrics=FOLDER_METRICS,
+)
+
+# Property holding the joined source feature during geometry repair
+GEOMETRIA_FUENTE = 'geometria_fuente'
+
+def tabla_sin_geometria(fc):
+    """Same table with every property but no geometry, so monthly maps don't carry polygons"""
+    return ee.FeatureCollection(fc).select(['.*'], None, False)
+
+def fuente_geometrias(csv, region=None):
+    """
+    COD_SUBC -> geometry source: the prepared subbasin asset, which already holds the
+    'Region' union (see geometrias), or, until it exists, the source subbasins plus
+    the table's own 'Region' feature
+    """
+    region = region or REGION_POR_DEFECTO
+    preparada = geometrias.preparada(region)
+    if preparada:
+        return ee.FeatureCollection(preparada).select(['COD_SUBC'])
+    region_feature = ee.FeatureCollection(csv).filter(ee.Filter.eq('COD_SUBC', 'Region'))
+    return ee.FeatureCollection(region.subcuencas_asset).select(['COD_SUBC']) \
+        .merge(region_feature.select(['COD_SUBC']))
+
+def reparar_geometrias(fc, fuente):
+    """
+    Geometry repair in a single server-side pass: every feature takes the geometry
+    of the source feature with the same COD_SUBC (ee.Join, no per-feature filter or getInfo).
+    Features without a match are returned unchanged.
+    """
+    join = ee.Join.saveFirst(matchKey=GEOMETRIA_FUENTE, outer=True)
+    filtro = ee.Filter.equals(leftField='COD_SUBC', rightField='COD_SUBC')
+    unidas = join.apply(ee.FeatureCollection(fc), fuente, filtro)
+
+    def asignar_geometria(feature):
+        feature = ee.Feature(feature)
+        match = feature.get(GEOMETRIA_FUENTE)
+        sin_match = feature.select(feature.propertyNames().remove(GEOMETRIA_FUENTE))
+        return ee.Feature(ee.Algorithms.If(
+            match,
+            sin_match.setGeometry(ee.Feature(match).geometry()),
+            sin_match
+        ))
+
+    return unidas.map(asignar_geometria)
 
 # Function to wait for task completion
 def wait_for_task_completion(task, check_interval=10, max_wait=1800):
-    """Wait for an Earth Engine task to complete with progress reporting"""
+    """Wait for an Earth Engine task to complete (check_interval caps the adaptive polling interval)"""
     if task is None:
         print("❌ No task provided")
         return False
@@ -52,186 +143,360 @@ def wait_for_task_completion(task, check_interval=10, max_wait=1800):
         print("❌ Task has no valid ID")
         return False
 
-    start_time = time.time()
-    previous_state = None
-
-    print(f"🔍 Monitoring task {task_id}...")
-
-    while time.time() - start_time < max_wait:
-        try:
-            status = ee.data.getTaskStatus(task_id)[0]
-            state = status['state']
-
-            # Print status only when it changes
-            if state != previous_state:
-                print(f"⏳ Task status: {state} ({time.strftime('%H:%M:%S')})")
-                previous_state = state
-
-            if state == 'COMPLETED':
-                print(f"✅ Task completed successfully after {int(time.time() - start_time)} seconds")
-                return True
-            elif state == 'FAILED':
-                error_msg = status.get('error_message', 'No error message')
-                print(f"❌ Task failed: {error_msg}")
-                return False
-            elif state == 'CANCELLED':
-                print("❌ Task was cancelled")
-                return False
-
-            time.sleep(check_interval)
-
-        except Exception as e:
-            print(f"Error checking task status: {e}")
-            time.sleep(check_interval)
-
-    print(f"⚠️ Timed out after waiting {max_wait} seconds")
-    return False
+    estados = task_monitor.esperar_tareas([task_id], max_wait=max_wait, intervalo_max=check_interval)
+    return estados.get(task_id, {}).get('state') == 'COMPLETED'
 
 # Asset sharing functions
 def is_asset_public(asset_id):
-    """Función para verificar si un asset ya es público."""
-    try:
-        acl = ee.data.getAssetAcl(asset_id)
-        return acl.get('all_users_can_read', False)
-    except Exception as e:
-        print(f"Error al verificar el estado del asset {asset_id}: {e}")
-        return False
+    """Función para verificar si un asset ya es público (errores persistentes se propagan, no se leen como False)."""
+    return publish_asset.is_asset_public(asset_id)
 
 def make_asset_public(asset_id):
-    """Función para compartir un asset de GEE con permisos públicos."""
-    try:
-        if is_asset_public(asset_id):
-            pass
-            # print(f"Asset {asset_id} ya es público.")
-        else:
-            acl = ee.data.getAssetAcl(asset_id)
-            acl['all_users_can_read'] = True
-            ee.data.setAssetAcl(asset_id, acl)
-            print(f"✅ Asset {asset_id} ahora es público.")
-            return True
-    except Exception as e:
-        print(f"❌ Error al hacer público el asset {asset_id}: {e}")
-    return False
+    """Función para compartir un asset de GEE con permisos públicos (True si queda público, ya lo fuera o no)."""
+    return publish_asset.publicar_asset(asset_id) in ('publicado', 'publico')
 
 def make_assets_public_in_folder(folder):
     """Función para hacer públicos todos los assets dentro de una carpeta específica."""
+    return publish_asset.make_assets_public_in_folder(folder)
+
+# ============================================================
+# 📌 PLANIFICACIÓN
+# ============================================================
+def get_latest_csv_id(folder_path):
+    # Running max over the streamed listing, by year and month parsed numerically (not lexicographically);
+    # ties broken on the full name so a re-run table ('2025_10_1') wins over the original ('2025_10')
+    latest_date = max(asset_catalog.iterar_nombres(folder_path),
+                      key=lambda n: (metrics_deltas.clave_asset_metricas(n), n), default=None)
+    if latest_date is None:
+        raise RuntimeError(f"No metrics tables found in {folder_path}")
+    latest_asset_id = f"{folder_path}/{latest_date}"
+    print(f'Último CSV encontrado: {latest_asset_id}')
+    return latest_asset_id
+
+def get_available_dates_from_folder(folder_path, region=None):
+    region = region or REGION_POR_DEFECTO
+    dates = []
+    for last_part in asset_catalog.iterar_nombres(folder_path):
+        # Parsed with the region's naming pattern (mes10 or mes_10)
+        date = region.fecha_desde_nombre(last_part)
+        if date is None:
+            print(f"Couldn't parse date from {last_part}, skipping")
+            continue
+        dates.append(date)
+    return ee.List(dates).distinct()
+
+def get_processed_dates_from_csv(csv):
+    first_feature = ee.FeatureCollection(csv).first()
+    prop_names = first_feature.propertyNames()
+    # 'YYYY-MM' mean columns only, not the 'YYYY-MM_<stat>' ones
+    return prop_names.filter(ee.Filter.stringContains('item', '-')) \
+        .filter(ee.Filter.stringContains('item', '_').Not())
+
+@dataclass
+class PlanProcesamiento:
+    """Client-side view of what needs processing, fetched in a single getInfo"""
+    csv_id: str
+    disponibles: List[str]
+    procesadas: List[str]
+    faltantes: List[str]
+    deltas: List[str] = field(default_factory=list)
+    # Latest climatology table and the dates already folded into it
+    climatologia_id: Optional[str] = None
+    acumuladas: List[str] = field(default_factory=list)
+
+    @property
+    def hay_faltantes(self) -> bool:
+        return len(self.faltantes) > 0
+
+    @property
+    def fecha_asset(self) -> Optional[str]:
+        """Name of the export asset, e.g. '2025_10' for the first missing date"""
+        return self.faltantes[0].replace('-', '_') if self.faltantes else None
+
+def planificar_procesamiento(folder_hs=None, folder_metrics=None, region=None):
+    """Builds the available/processed/missing date lists server-side and fetches them in one round-trip"""
+    region = region or REGION_POR_DEFECTO
+    folder_hs = folder_hs or region.folder_hs
+    folder_metrics = folder_metrics or region.folder_metrics
+    available_dates = get_available_dates_from_folder(folder_hs, region)
+    csv_id = get_latest_csv_id(folder_metrics)
+    deltas = metrics_deltas.deltas_pendientes(csv_id, metrics_deltas.carpeta_deltas(folder_metrics))
+    processed_dates = get_processed_dates_from_csv(metrics_deltas.tabla_con_deltas(csv_id, deltas))
+    missing_dates = available_dates.removeAll(
+        available_dates.filter(ee.Filter.inList('item', processed_dates))
+    )
+
+    consulta = {
+        'disponibles': available_dates,
+        'procesadas': processed_dates,
+        'faltantes': missing_dates
+    }
+    climatologia_id = None
+    if CLIMATOLOGIA:
+        climatologia_id = climatologia.ultima_climatologia(climatologia.carpeta_climatologia(folder_metrics))
+        if climatologia_id:
+            # Same round-trip: which dates the climatology already holds
+            consulta['acumuladas'] = climatologia.fechas_acumuladas(climatologia_id)
+    info = ee_session.llamar(ee.Dictionary(consulta).getInfo)
+    acumuladas = [f for f in (info.pop('acumuladas', None) or '').split(',') if f]
+
+    plan = PlanProcesamiento(csv_id=csv_id, deltas=deltas, climatologia_id=climatologia_id,
+                             acumuladas=acumuladas, **info)
+    print('Fechas disponibles:', plan.disponibles)
+    print('Fechas procesadas:', plan.procesadas)
+    print('Fechas faltantes:', plan.faltantes)
+    if deltas:
+        print(f'Deltas sobre la tabla base: {len(deltas)}')
+    return plan
+
+# ============================================================
+# 📌 FECHAS Y ASSETS HS
+# ============================================================
+def build_asset_id_from_date(date, region=None):
+    region = region or REGION_POR_DEFECTO
+    # Dates arrive as client-side strings; no server round-trip needed
+    date_str = str(date)
+
+    # Split using Python string methods
+    parts = date_str.split('-')
+    year = parts[0]
+    month = parts[1]
+
+    # Try both naming variants: prefer the one without underscore (existing asset),
+    # fall back to the variant with underscore.
+    candidate_no_underscore, candidate_with_underscore = region.candidatos_hs(year, month)
+
+    # Resolved against the HS folder listing instead of probing each candidate
+    asset_id = asset_catalog.primer_existente([candidate_no_underscore, candidate_with_underscore])
+    if asset_id is None:
+        raise RuntimeError(f"Image asset not found for date {date_str}. Tried: {candidate_no_underscore} and {candidate_with_underscore}")
+    print(f'Asset ID generado: {asset_id}')
+    return asset_id
+
+def fecha_desde_asset(asset_id, region=None):
+    region = region or REGION_POR_DEFECTO
+    # Pure Python parsing (robust for mes10 or mes_10)
+    name = asset_id.split('/')[-1]  # e.g. SM2025Valparaiso_GCOM_mes10
+    date = region.fecha_desde_nombre(name)
+    if date is None:
+        print(f"Parse error for asset name '{name}': does not match {region.patron_hs}")
+    return date  # e.g. 2025-10
+
+# ============================================================
+# 📌 CACHE DE RESULTADOS
+# ============================================================
+def estadisticas_zonales():
+    """Estadísticas que produce el modo zonal actual ('por_feature' solo da la media)."""
+    return list(zonal_stats.SOLO_MEDIA) if MODO_ZONAL == 'por_feature' else list(ESTADISTICAS)
+
+def codigos_zonas(region=None):
+    """Zonas reducidas por mes: las subcuencas de la región más la zona extra (resto o 'Region')."""
+    return list((region or REGION_POR_DEFECTO).subcuencas) + [zonal_stats.zona_extra(ESTADISTICAS)]
+
+def clave_resultado(asset_id, region=None, estadisticas=None):
+    """Clave de result_cache para un mes, o None si no se conoce la versión de la imagen o de las subcuencas."""
+    region = region or REGION_POR_DEFECTO
+    version_imagen = result_cache.version_asset(asset_id)
+    # Prepared (simplified) geometries give other values than the source polygons
+    subcuencas = geometrias.fuente(region)
+    version_subcuencas = result_cache.version_asset(subcuencas)
+    if version_imagen is None or version_subcuencas is None:
+        return None
+    # Zones reduced at a coarser scale give other values; tileScale alone does not change them
+    factores = ajustes_zonales.factores_escala(ajustes_zonales.niveles(region.nombre, codigos_zonas(region)))
+    extra = {'factores_escala': factores} if factores else {}
+    return result_cache.clave(
+        imagen=asset_id,
+        version_imagen=version_imagen,
+        subcuencas=subcuencas,
+        version_subcuencas=version_subcuencas,
+        codigos=sorted(region.subcuencas),
+        estadisticas=list(estadisticas or estadisticas_zonales()),
+        modo_escala=zonal_stats.MODO_ESCALA,
+        escala_fija=zonal_stats.ESCALA if zonal_stats.MODO_ESCALA == 'fija' else None,
+        **extra
+    )
+
+def resultados_en_cache(fechas_assets, region=None, estadisticas=None):
+    """
+    Separa los meses (fecha, asset_id) que ya están en result_cache de los que hay que reducir.
+    Retorna ({COD_SUBC: {columna: valor}}, columnas encontradas, (fecha, asset_id) pendientes,
+    {fecha: clave} de los pendientes para guardarlos cuando termine su exportación).
+    """
+    estadisticas = list(estadisticas or estadisticas_zonales())
+    valores, columnas, pendientes, claves = {}, [], [], {}
+    for fecha, asset_id in fechas_assets:
+        clave = None
+        if USAR_CACHE_RESULTADOS:
+            try:
+                clave = clave_resultado(asset_id, region, estadisticas)
+            except Exception as e:
+                print(f"⚠️ No result cache key for {asset_id}: {e}")
+        guardado = result_cache.obtener(clave) if clave else None
+        if guardado is None:
+            pendientes.append((fecha, asset_id))
+            if clave:
+                claves[fecha] = clave
+            continue
+        for cod, por_estadistica in guardado.items():
+            for estadistica, valor in por_estadistica.items():
+                valores.setdefault(cod, {})[zonal_stats.columna(fecha, estadistica)] = valor
+        columnas.extend(zonal_stats.columna(fecha, e) for e in estadisticas)
+
+    if USAR_CACHE_RESULTADOS and fechas_assets:
+        print(f"💾 Result cache: {len(fechas_assets) - len(pendientes)} month(s) reused, {len(pendientes)} to compute")
+    return valores, columnas, pendientes, claves
+
+def guardar_resultados(asset_id, claves, estadisticas=None):
+    """
+    Lee de la tabla ya exportada las columnas de los meses calculados ({fecha: clave})
+    y las guarda en result_cache. Retorna cuántos meses guardó.
+    """
+    if not claves:
+        return 0
+    estadisticas = list(estadisticas or estadisticas_zonales())
+    columnas = {fecha: {e: zonal_stats.columna(fecha, e) for e in estadisticas} for fecha in claves}
     try:
-        asset_list = ee.data.listAssets({'parent': folder})['assets']
-        print(f"Found {len(asset_list)} assets in {folder}")
-        for asset in asset_list:
-            asset_id = asset['id']
-            make_asset_public(asset_id)
+        filas = ee.FeatureCollection(asset_id) \
+            .select(['COD_SUBC'] + [c for por_fecha in columnas.values() for c in por_fecha.values()], None, False) \
+            .getInfo()['features']
     except Exception as e:
-        print(f"Error al listar o hacer públicos los assets en {folder}: {e}")
+        print(f"⚠️ Could not read {asset_id} into the result cache: {e}")
+        return 0
+
+    guardados = 0
+    for fecha, clave in claves.items():
+        valores = {}
+        for fila in filas:
+            propiedades = fila['properties']
+            por_estadistica = {
+                e: propiedades[c] for e, c in columnas[fecha].items() if propiedades.get(c) is not None
+            }
+            if por_estadistica:
+                valores[propiedades['COD_SUBC']] = por_estadistica
+        if valores:
+            result_cache.guardar(clave, valores, descripcion=f"{asset_id} {fecha}")
+            guardados += 1
+    print(f"💾 Stored {guardados} month(s) of {asset_id} in the result cache")
+    return guardados
+
+# ============================================================
+# 📌 CLIMATOLOGÍA
+# ============================================================
+def climatologia_previa(plan, csv):
+    """
+    Climatología guardada con las fechas ya exportadas que aún no tiene (las de tablas
+    anteriores cuya climatología no alcanzó a exportarse), leídas de las tablas del plan.
+    Retorna (climatología, fechas acumuladas).
+    """
+    if plan.climatologia_id:
+        clima = ee.FeatureCollection(plan.climatologia_id)
+    else:
+        print('Climatología: no hay tabla previa, se acumula todo el historial')
+        clima = climatologia.climatologia_vacia(metrics_deltas.tabla_delta(csv))
+
+    acumuladas = list(plan.acumuladas)
+    previas = [f for f in plan.procesadas if f not in acumuladas]
+    if previas:
+        print(f'Climatología: acumulando {len(previas)} fechas de tablas anteriores')
+        historial = metrics_deltas.tabla_con_deltas(tabla_sin_geometria(csv), plan.deltas)
+        clima = climatologia.acumular(clima, historial, previas, acumuladas)
+        acumuladas += previas
+    return clima, acumuladas
+
+def actualizar_climatologia(plan, region, asset_id, nuevas):
+    """
+    Tras completar la exportación asset_id: acumula sus fechas nuevas, leídas de la tabla
+    exportada (sin volver a reducir las imágenes), sobre climatologia_previa y la exporta.
+    Retorna (tarea, asset id), o (None, None) si no hay fechas que acumular.
+    """
+    clima, acumuladas = climatologia_previa(plan, ee.FeatureCollection(plan.csv_id))
+    nuevas = [f for f in nuevas if f not in acumuladas]
+    if nuevas:
+        clima = climatologia.acumular(clima, ee.FeatureCollection(asset_id), nuevas, acumuladas)
+        acumuladas += nuevas
+    if len(acumuladas) == len(plan.acumuladas):
+        print('Climatología al día, no se exporta')
+        return None, None
+
+    folder = region.folder_climatologia
+    asset_catalog.asegurar_carpeta(folder)
+    nombre = climatologia.nombre_climatologia(acumuladas)
+    asset_name, _ = asset_catalog.nombre_unico(f'{folder}/{nombre}')
+    prefijo_tarea = 'HS_Climatologia' if region == REGION_POR_DEFECTO else f'HS_Climatologia_{region.nombre}'
+    task = ee.batch.Export.table.toAsset(
+        collection=clima,
+        description=f"{prefijo_tarea}_{nombre}",
+        assetId=asset_name
+    )
+    task.start()
+    asset_catalog.registrar(asset_name)
+    run_journal.registrar_exportacion(clave_journal(region, 'climatologia'), task.id, asset_name)
+    print(f'Tarea de climatología creada: {asset_name} ({len(acumuladas)} fechas)')
+    return task, asset_name
 
 # Second cell: Define the main function and auxiliary functions
-def procesar_humedad_suelo():
+def procesar_humedad_suelo(plan=None, region=None):
     """
     Módulo: Humedad de Suelo Processor
+    plan: PlanProcesamiento already fetched by the caller (otherwise it is built here)
+    region: regiones.Region to process (REGION_POR_DEFECTO if None)
     """
     # ============================================================
     # 📌 CONFIGURACIÓN INICIAL
     # ============================================================
-    subcuencas = ee.FeatureCollection("projects/ee-corfobbppciren2023/assets/Geometrias/SubcuencasValparaiso")
-
-    subcuenca_nombres = [
-        '0510', '0511', '0512', '0500', '0520', '0541', '0521', '0522',
-        '0530', '0540', '0531', '0542', '0532', '0550', '0551', '0574',
-        '0552', '0553', '0580'
-    ]
+    region = region or REGION_POR_DEFECTO
+    # Simplified, indexed subbasins when prepared for the current source version
+    subcuencas_asset = geometrias.fuente(region)
+    subcuencas = ee.FeatureCollection(subcuencas_asset)
+    subcuenca_nombres = region.subcuencas
 
     export_task = None
+    export_asset = None
     fechas_procesadas = []
+    # fecha -> result_cache key of the months reduced in Earth Engine by this run
+    claves_calculadas = {}
     estado = "INICIADO"
 
     # ============================================================
     # 📌 FUNCIONES AUXILIARES
     # ============================================================
-    def get_latest_csv(folder_path):
-        asset_list = ee.data.listAssets(folder_path)['assets']
-        date_list = [asset['name'].split('/')[-1] for asset in asset_list]
-        
-        # Sort by parsing year and month numerically, not lexicographically
-        def parse_asset_name(name):
-            try:
-                # Handle formats like '2025_10', '2025_10_1', '2025_5'
-                parts = name.split('_')
-                if len(parts) >= 2:
-                    year = int(parts[0])
-                    month = int(parts[1])
-                    return (year, month)
-                return (0, 0)  # fallback for unparseable names
-            except:
-                return (0, 0)
-        
-        date_list.sort(key=parse_asset_name)
-        latest_date = date_list[-1]
-        latest_asset_id = f"{folder_path}/{latest_date}"
-        print(f'Último CSV encontrado: {latest_asset_id}')
-        return ee.FeatureCollection(latest_asset_id)
-
-    def get_available_dates_from_folder(folder_path):
-        asset_list = ee.data.listAssets(folder_path)['assets']
-        dates = []
-        for asset in asset_list:
-            id_parts = asset['id'].split('/')
-            last_part = id_parts[-1]
-            # Make parsing more robust
-            try:
-                year = last_part.split('SM')[1].split('Valparaiso')[0]
-                month = last_part.split('_mes')[1]
-                dates.append(f"{year}-{month}")
-            except IndexError:
-                print(f"Couldn't parse date from {last_part}, skipping")
-        return ee.List(dates).distinct()
-
-    def get_processed_dates_from_csv(csv):
-        first_feature = ee.FeatureCollection(csv).first()
-        prop_names = first_feature.propertyNames()
-        return prop_names.filter(ee.Filter.stringContains('item', '-'))
-
-    def build_asset_id_from_date(date):
-        # Convert to Earth Engine string and get real value
-        date_str = ee.String(date).getInfo()
-
-        # Split using Python string methods
-        parts = date_str.split('-')
-        year = parts[0]
-        month = parts[1]
-
-        # Try both naming variants: prefer the one without underscore (existing asset),
-        # fall back to the variant with underscore.
-        candidate_no_underscore = f'projects/ee-corfobbppciren2023/assets/HS/SM{year}Valparaiso_GCOM_mes{month}'
-        candidate_with_underscore = f'projects/ee-corfobbppciren2023/assets/HS/SM{year}Valparaiso_GCOM_mes_{month}'
-
-        try:
-            ee.Image(candidate_no_underscore).getInfo()
-            print(f'Asset ID generado (no underscore): {candidate_no_underscore}')
-            return candidate_no_underscore
-        except Exception:
-            try:
-                ee.Image(candidate_with_underscore).getInfo()
-                print(f'Asset ID generado (with underscore): {candidate_with_underscore}')
-                return candidate_with_underscore
-            except Exception:
-                raise RuntimeError(f"Image asset not found for date {date_str}. Tried: {candidate_no_underscore} and {candidate_with_underscore}")
+    def calcular_desde_cache(fechas_assets, current_fc):
+        """Une los meses que ya están en result_cache; retorna la tabla y los (fecha, asset_id) a reducir en EE."""
+        valores, columnas, pendientes, claves = resultados_en_cache(fechas_assets, region)
+        claves_calculadas.update(claves)
+        if columnas:
+            current_fc = zonal_stats.unir_valores_locales(current_fc, valores, columnas)
+        return current_fc, pendientes
+
+    def niveles_zonas(fechas_assets):
+        """Ajuste por zona (ajustes_zonales); con PREFLIGHT_ZONAL sondea antes las zonas nunca probadas."""
+        codigos = codigos_zonas(region)
+        nuevas = ajustes_zonales.sin_sondear(region.nombre, codigos) if PREFLIGHT_ZONAL else []
+        if not nuevas:
+            return ajustes_zonales.niveles(region.nombre, codigos)
+
+        antes = ajustes_zonales.factores_escala(ajustes_zonales.niveles(region.nombre, codigos))
+        subcuencas_filtradas = subcuencas.filter(ee.Filter.inList('COD_SUBC', subcuenca_nombres))
+        zonal_stats.sondear_apilados(region.nombre, fechas_assets, subcuencas_filtradas, nuevas, ESTADISTICAS)
+        niveles = ajustes_zonales.niveles(region.nombre, codigos)
+        if ajustes_zonales.factores_escala(niveles) != antes:
+            # Coarser scale: these results no longer match the cache keys computed above
+            for fecha, _ in fechas_assets:
+                claves_calculadas.pop(fecha, None)
+        return niveles
 
     def calcular_promedios_por_subcuenca(asset_id, current_fc):
         current_fc = ee.FeatureCollection(current_fc)
 
-        # Pure Python parsing (robust for mes10 or mes_10)
-        name = asset_id.split('/')[-1]  # e.g. SM2025Valparaiso_GCOM_mes10
-        try:
-            year = name.split('SM')[1].split('Valparaiso')[0]  # '2025'
-            month_part = name.split('mes')[-1]                 # '10' or '_10'
-            month = month_part.replace('_', '')                # remove optional underscore
-            if not month.isdigit():
-                raise ValueError(f"Month parse failed for {name}: got '{month}'")
-        except Exception as e:
-            print(f"Parse error for asset name '{name}': {e}")
+        date_formatted = fecha_desde_asset(asset_id, region)
+        if date_formatted is None:
             return current_fc
 
-        date_formatted = f"{year}-{month}"  # e.g. 2025-10
+        # Unchanged month: no server-side reduction at all
+        current_fc, pendientes = calcular_desde_cache([(date_formatted, asset_id)], current_fc)
+        if not pendientes:
+            return current_fc
 
         # Load image
         try:
@@ -240,143 +505,135 @@ def procesar_humedad_suelo():
             print(f"Error loading image {asset_id}: {e}")
             return current_fc
 
-        projection = image.projection()
-        geometry = image.geometry()
+        mosaic_image = zonal_stats.preparar_mosaico(image)
+        subcuencas_filtradas = subcuencas.filter(ee.Filter.inList('COD_SUBC', subcuenca_nombres))
 
-        mosaic_image = ee.ImageCollection([image]) \
-            .mosaic() \
-            .setDefaultProjection(projection) \
-            .clip(geometry)
+        if MODO_ZONAL == 'por_feature':
+            return zonal_stats.promedios_por_feature(mosaic_image, subcuencas_filtradas, current_fc, date_formatted)
+        niveles = niveles_zonas(pendientes)
+        return zonal_stats.promedios_batch(mosaic_image, subcuencas_filtradas, current_fc, date_formatted, ESTADISTICAS,
+                                           niveles)
 
-        # Global mean (optional; kept for consistency)
-        media_global = mosaic_image.reduceRegion(
-            reducer=ee.Reducer.mean(),
-            geometry=mosaic_image.geometry(),
-            scale=30,
-            maxPixels=1e13
-        )
+    def calcular_promedios_apilados(asset_ids, current_fc):
+        """Todos los meses faltantes como bandas de una imagen, reducida una sola vez."""
+        current_fc = ee.FeatureCollection(current_fc)
 
-        subcuencas_filtradas = subcuencas.filter(ee.Filter.inList('COD_SUBC', subcuenca_nombres))
+        fechas_assets = []
+        for asset_id in asset_ids:
+            date_formatted = fecha_desde_asset(asset_id, region)
+            if date_formatted is not None:
+                fechas_assets.append((date_formatted, asset_id))
 
-        def map_feature(feature):
-            cod = ee.String(feature.get('COD_SUBC'))
-            geom = ee.Algorithms.If(
-                cod.compareTo('Region').eq(0),
-                mosaic_image.geometry(),
-                subcuencas_filtradas.filter(ee.Filter.eq('COD_SUBC', cod)).first().geometry()
-            )
+        # Only new or changed months go into the stacked image
+        current_fc, fechas_assets = calcular_desde_cache(fechas_assets, current_fc)
+        if not fechas_assets:
+            return current_fc
 
-            stats = mosaic_image.reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=geom,
-                scale=30,
-                maxPixels=1e13
-            )
+        niveles = niveles_zonas(fechas_assets)
+        subcuencas_filtradas = subcuencas.filter(ee.Filter.inList('COD_SUBC', subcuenca_nombres))
+        return zonal_stats.promedios_apilados(fechas_assets, subcuencas_filtradas, current_fc, ESTADISTICAS, niveles)
+
+    def calcular_promedios_locales(dates, current_fc):
+        """Medias desde los GeoTIFF locales; retorna la tabla y las fechas sin resultado local."""
+        encontrados = {}
+        for date in dates:
+            year, month = str(date).split('-')
+            month = month.replace('_', '')
+            path = local_zonal.buscar_tiff(LOCAL_TIFF_DIR, year, month, region.nombre)
+            if path is not None:
+                encontrados[date] = (f"{year}-{month}", path)
+
+        if not encontrados:
+            return current_fc, list(dates)
+
+        features = local_zonal.cargar_subcuencas(subcuencas_asset, subcuenca_nombres)
+        resultados = local_zonal.promedios_por_fecha(
+            [path for _, path in encontrados.values()], features, region.nombre
+        )
+        current_fc = zonal_stats.unir_valores_locales(
+            current_fc, local_zonal.por_codigo(resultados), list(resultados)
+        )
+        # A file that gave no result goes to Earth Engine like a missing one
+        return current_fc, [d for d in dates if d not in encontrados or encontrados[d][0] not in resultados]
 
-            mean_value = stats.values().reduce(ee.Reducer.mean())
-            return feature.set(date_formatted, mean_value)
-
-        return current_fc.map(map_feature)
-
-    def asegurar_geometrias(fc):
-            """Fixed version that properly handles Earth Engine geometries"""
-            def map_geometry(feature):
-                try:
-                    geom = feature.geometry()
-                    
-                    # Check if geometry is valid by testing if we can get bounds
-                    # This is more reliable than isEmpty() in Python API
-                    try:
-                        # This will fail if geometry is null or invalid
-                        bounds = geom.bounds()
-                        # If we got here, geometry is valid
-                        return feature
-                    except:
-                        # Geometry is invalid, get from subcuencas
-                        cod_subc = feature.get('COD_SUBC')
-                        subc_feature = subcuencas.filter(ee.Filter.eq('COD_SUBC', cod_subc)).first()
-                        return feature.setGeometry(subc_feature.geometry())
-                        
-                except Exception as e:
-                    print(f"Error ensuring geometry: {e}")
-                    # Return feature unchanged if error
-                    return feature
-
-            return ee.FeatureCollection(fc).map(map_geometry)
     # ============================================================
     # 📌 PROCESAMIENTO PRINCIPAL
     # ============================================================
     try:
-        available_dates = get_available_dates_from_folder('projects/ee-corfobbppciren2023/assets/HS')
-        csv = get_latest_csv('projects/ee-corfobbppciren2023/assets/MetricsHSTransposed')
-        processed_dates = get_processed_dates_from_csv(csv)
-        missing_dates = available_dates.removeAll(
-            available_dates.filter(ee.Filter.inList('item', processed_dates))
-        )
-
-        print('Fechas disponibles:', available_dates.getInfo())
-        print('Fechas procesadas:', processed_dates.getInfo())
-        print('Fechas faltantes:', missing_dates.getInfo())
-
-        has_missing_dates = ee.List(missing_dates).size().gt(0).getInfo()
-        final_result = csv
-
-        if has_missing_dates:
-            print(f'Procesando {missing_dates.size().getInfo()} fechas faltantes')
-
-            # Convert to Python list for iteration
-            missing_dates_list = missing_dates.getInfo()
-            fecha_procesar = missing_dates_list[0]
-            # Use Python's replace method (client-side)
-            fecha_asset = fecha_procesar.replace('-', '_')
-            print(f'Procesando fecha: {fecha_procesar}')
-
-            # Iterate over each missing date
-            for date in missing_dates_list:
-                print(f'Procesando fecha: {date}')
-                asset_id = build_asset_id_from_date(date)
-                final_result = calcular_promedios_por_subcuenca(asset_id, final_result)
-                fechas_procesadas.append(date)
-
-            datos_para_exportar = asegurar_geometrias(final_result)
+        if plan is None:
+            with rpc_profile.etapa('planificacion'):
+                plan = planificar_procesamiento(region=region)
+        csv = ee.FeatureCollection(plan.csv_id)
+        if MODO_EXPORTACION == 'delta':
+            # Only COD_SUBC rows; the new month columns are the whole export
+            final_result = metrics_deltas.tabla_delta(csv)
+            folder_destino = region.folder_deltas
+        else:
+            # Property-only table; geometries are re-attached once, right before export
+            final_result = metrics_deltas.tabla_con_deltas(tabla_sin_geometria(csv), plan.deltas)
+            folder_destino = region.folder_metrics
+
+        if plan.hay_faltantes:
+            print(f'Procesando {len(plan.faltantes)} fechas faltantes')
+
+            missing_dates_list = plan.faltantes
+            fecha_asset = plan.fecha_asset
+            print(f'Procesando fecha: {missing_dates_list[0]}')
+
+            if BACKEND_ZONAL == 'local':
+                # Local GeoTIFFs first; only months without a file go to Earth Engine
+                final_result, missing_dates_list = calcular_promedios_locales(missing_dates_list, final_result)
+                fechas_procesadas.extend(d for d in plan.faltantes if d not in missing_dates_list)
+
+            if missing_dates_list and MODO_MESES == 'apilado':
+                # One stacked image (one band per month), reduced once
+                asset_ids = []
+                for date in missing_dates_list:
+                    print(f'Procesando fecha: {date}')
+                    asset_ids.append(build_asset_id_from_date(date, region))
+                    fechas_procesadas.append(date)
+                final_result = calcular_promedios_apilados(asset_ids, final_result)
+            else:
+                # Iterate over each missing date
+                for date in missing_dates_list:
+                    print(f'Procesando fecha: {date}')
+                    asset_id = build_asset_id_from_date(date, region)
+                    final_result = calcular_promedios_por_subcuenca(asset_id, final_result)
+                    fechas_procesadas.append(date)
+
+            if CLIMATOLOGIA:
+                # 'YYYY-MM_anom' columns next to the means, against the stored climatology (table reads
+                # only); the new months are folded into it from the exported table (exportar_climatologia)
+                clima, _ = climatologia_previa(plan, csv)
+                final_result = climatologia.anomalias(final_result, clima, fechas_procesadas)
+
+            if MODO_EXPORTACION == 'delta':
+                datos_para_exportar = final_result
+            else:
+                datos_para_exportar = reparar_geometrias(final_result, fuente_geometrias(csv, region))
 
             # Find a unique asset name by appending _1, _2, etc. if base name exists
-            base_asset_name = f'projects/ee-corfobbppciren2023/assets/MetricsHSTransposed/{fecha_asset}'
-            asset_name = base_asset_name
-            suffix = 1
-            
-            while True:
-                try:
-                    info = ee.data.getAsset(asset_name)
-                    if info:
-                        # Asset exists, try next suffix
-                        print(f"Asset exists: {asset_name}, trying with suffix _{suffix}")
-                        asset_name = f"{base_asset_name}_{suffix}"
-                        suffix += 1
-                    else:
-                        # Asset doesn't exist (shouldn't reach here, but handle it)
-                        break
-                except Exception as e:
-                    # Asset not found (expected for new asset) - use this name
-                    msg = str(e).lower()
-                    if 'not found' in msg or 'does not exist' in msg or '404' in msg:
-                        print(f"Asset name is available: {asset_name}")
-                        break
-                    else:
-                        # Unexpected error - log and use base name
-                        print(f"Warning checking asset existence: {e}")
-                        break
-
-            # Make sure to start the task with a meaningful description
+            asset_catalog.asegurar_carpeta(folder_destino)
+            base_asset_name = f'{folder_destino}/{fecha_asset}'
+            asset_name, suffix = asset_catalog.nombre_unico(base_asset_name)
+
+            # Make sure to start the task with a meaningful description (and region, when not the default)
+            prefijo_tarea = 'HS_Update' if region == REGION_POR_DEFECTO else f'HS_Update_{region.nombre}'
             export_task = ee.batch.Export.table.toAsset(
                 collection=datos_para_exportar,
-                description=f"HS_Update_{fecha_asset}_{suffix}" if suffix > 1 else f"HS_Update_{fecha_asset}",
+                description=f"{prefijo_tarea}_{fecha_asset}_{suffix}" if suffix > 1 else f"{prefijo_tarea}_{fecha_asset}",
                 assetId=asset_name
             )
 
             # In Colab/GitHub Actions, start the task
             export_task.start()
+            asset_catalog.registrar(asset_name)
+            run_journal.registrar_exportacion(
+                clave_journal(region, 'actualizacion'), export_task.id, asset_name,
+                fechas=list(fechas_procesadas), csv_id=plan.csv_id, claves_cache=dict(claves_calculadas)
+            )
             print(f'Tarea de exportación SHP creada con éxito: {asset_name}')
+            export_asset = asset_name
             estado = "COMPLETED"
         else:
             print('No hay fechas faltantes. No se generó archivo SHP.')
@@ -394,11 +651,99 @@ def procesar_humedad_suelo():
         'fechasProcesadas': fechas_procesadas,
         'totalFechas': len(fechas_procesadas),
         'exportTask': export_task,
+        'exportAsset': export_asset,
+        'clavesCache': claves_calculadas,
+        'plan': plan,
         'ultimaEjecucion': datetime.datetime.now().isoformat()
     }
 
-def main():
-    resultado = procesar_humedad_suelo()
+def clave_journal(region, tipo):
+    """Clave de las exportaciones de una región en el run journal."""
+    return f"{(region or REGION_POR_DEFECTO).nombre}:{tipo}"
+
+def tarea_reanudable(clave):
+    """
+    (exportación registrada, tarea) si el journal tiene una exportación de la clave que
+    sigue en curso o ya terminó bien; (None, None) si no hay o falló (queda cerrada).
+    """
+    pendiente = run_journal.exportacion_pendiente(clave)
+    if not pendiente:
+        return None, None
+    tarea = run_journal.TareaRegistrada(pendiente['taskId'])
+    try:
+        estado = tarea.status().get('state')
+    except Exception as e:
+        print(f"⚠️ Could not check recorded task {pendiente['taskId']}: {e}")
+        return None, None
+    if estado in ('FAILED', 'CANCELLED', 'UNKNOWN'):
+        print(f"Recorded export {pendiente['taskId']} ended as {estado}; submitting a new one")
+        run_journal.cerrar_exportacion(clave, estado)
+        return None, None
+    print(f"↩️ Reattaching to export {pendiente['taskId']} -> {pendiente['assetId']} ({estado})")
+    return pendiente, tarea
+
+def reanudar_exportacion(region=None):
+    """Resultado como el de procesar_humedad_suelo para la exportación registrada, o None."""
+    pendiente, tarea = tarea_reanudable(clave_journal(region, 'actualizacion'))
+    if pendiente is None:
+        return None
+    fechas = pendiente.get('fechas', [])
+    return {
+        'status': 'COMPLETED',
+        'fechasProcesadas': fechas,
+        'totalFechas': len(fechas),
+        'exportTask': tarea,
+        'exportAsset': pendiente['assetId'],
+        'clavesCache': pendiente.get('claves_cache', {}),
+        'ultimaEjecucion': datetime.datetime.now().isoformat(),
+        'reanudado': True
+    }
+
+def fallo_por_memoria(task):
+    """True si la tarea terminó FAILED por memoria o exceso de píxeles."""
+    try:
+        status = task.status()
+    except Exception as e:
+        print(f"⚠️ Could not read the status of task {task.id}: {e}")
+        return False
+    return status.get('state') == 'FAILED' and ajustes_zonales.es_error_de_memoria(status.get('error_message'))
+
+def replanificar_por_memoria(resultado, region=None):
+    """
+    Tras una exportación que falló por memoria: la quita del catálogo y vuelve a listar las
+    carpetas que lee el plan, sondea las zonas sobre los meses de esa exportación, sube de
+    nivel solo las que fallan (todas un nivel si ninguna falla por separado) y vuelve a
+    procesar. Retorna el nuevo resultado, o None si no queda nivel.
+    """
+    region = region or REGION_POR_DEFECTO
+    run_journal.cerrar_exportacion(clave_journal(region, 'actualizacion'), 'FAILED')
+    # The failed export never created its asset; the plan must only see tables that exist
+    asset_catalog.olvidar(resultado['exportAsset'])
+    for folder in (region.folder_metrics, region.folder_deltas, region.folder_climatologia):
+        try:
+            asset_catalog.listar(folder, refrescar=True)
+        except Exception as e:
+            print(f"⚠️ Could not refresh the listing of {folder}: {e}")
+    codigos = codigos_zonas(region)
+
+    fechas_assets = []
+    for fecha in resultado['fechasProcesadas']:
+        asset_id = build_asset_id_from_date(fecha, region)
+        fechas_assets.append((fecha_desde_asset(asset_id, region), asset_id))
+    subcuencas_filtradas = ee.FeatureCollection(geometrias.fuente(region)) \
+        .filter(ee.Filter.inList('COD_SUBC', region.subcuencas))
+    escaladas = zonal_stats.sondear_apilados(region.nombre, fechas_assets, subcuencas_filtradas, codigos, ESTADISTICAS)
+    if not escaladas:
+        escaladas = ajustes_zonales.escalar(region.nombre, codigos, motivo='export failed for memory')
+    if not escaladas:
+        print("❌ Every zone is already at the last escalation level")
+        return None
+    print("🔁 Re-planning the export with the escalated zones")
+    return procesar_humedad_suelo(None, region)
+
+def main(plan=None, region=None):
+    # A rerun reattaches to the export recorded in the run journal instead of submitting another one
+    resultado = reanudar_exportacion(region) or procesar_humedad_suelo(plan, region)
     print(f"Estado inicial: {resultado['status']}")
     
     # Si no hay tarea o no hay fechas procesadas, retornar temprano
@@ -412,17 +757,35 @@ def main():
         print("\n❌ No processed dates found in the results.")
         return resultado
     
-    # Determinar ruta del asset
-    fecha_asset = resultado['fechasProcesadas'][0].replace('-', '_')
-    target_asset = f"projects/ee-corfobbppciren2023/assets/MetricsHSTransposed/{fecha_asset}"
+    # Determinar ruta del asset (incluye carpeta de deltas y sufijo _N si hubo)
+    target_asset = resultado['exportAsset']
     
     print(f"\n⏳ Monitoring task until completion for asset: {target_asset}")
     print("   (this will automatically wait up to 30 minutes)")
     
     # Esperar a que la tarea se complete
-    task_success = wait_for_task_completion(task, check_interval=15, max_wait=1800)
+    with rpc_profile.etapa('espera_exportacion'):
+        task_success = wait_for_task_completion(task, check_interval=15, max_wait=1800)
+
+    # Out of memory / too many pixels: escalate the affected zones and submit again
+    replanificaciones = 0
+    while not task_success and replanificaciones < MAX_REPLANIFICACIONES and fallo_por_memoria(task):
+        replanificaciones += 1
+        with rpc_profile.etapa('replanificacion_zonal'):
+            nuevo = replanificar_por_memoria(resultado, region)
+        if nuevo is None or nuevo['status'] != 'COMPLETED' or not nuevo['exportTask']:
+            break
+        resultado = dict(nuevo, replanificaciones=replanificaciones)
+        task = resultado['exportTask']
+        target_asset = resultado['exportAsset']
+        print(f"\n⏳ Monitoring re-planned task for asset: {target_asset}")
+        with rpc_profile.etapa('espera_exportacion'):
+            task_success = wait_for_task_completion(task, check_interval=15, max_wait=1800)
     
     if task_success:
+        # The exported columns of the months reduced in EE feed the next runs
+        guardar_resultados(target_asset, resultado.get('clavesCache'))
+
         print("\n🔄 Task completed successfully! Now making assets public...")
         
         # Hacer público el asset específico
@@ -435,15 +798,122 @@ def main():
             
             # Hacer públicos todos los assets en la carpeta
             print("\n📂 Making all assets in folder public...")
-            make_assets_public_in_folder('projects/ee-corfobbppciren2023/assets/MetricsHSTransposed')
+            make_assets_public_in_folder(target_asset.rsplit('/', 1)[0])
             resultado['assetPublic'] = 'folder'
     else:
         print("\n⚠️ Task did not complete successfully within the time limit.")
         resultado['taskCompleted'] = False
     
+    # The climatology reads the exported table, so it only goes out once that export completed
+    if CLIMATOLOGIA and task_success:
+        exportar_climatologia(resultado, region)
+    
     # Actualizar resultado con información final
     resultado['taskCompleted'] = task_success
     resultado['assetPath'] = target_asset
     resultado['finalStatus'] = task.status()['state'] if task else 'UNKNOWN'
     
-    return resultado
\ No newline at end of file
+    # Still running (timeout): keep it in the journal so the next attempt reattaches
+    if resultado['finalStatus'] in task_monitor.ESTADOS_FINALES:
+        run_journal.cerrar_exportacion(clave_journal(region, 'actualizacion'), resultado['finalStatus'])
+    if resultado['finalStatus'] in ('FAILED', 'CANCELLED'):
+        # Registered when it started; the cached listing must not offer it to the next plan
+        asset_catalog.olvidar(target_asset)
+    
+    return resultado
+
+def exportar_climatologia(resultado, region=None):
+    """
+    Exporta la climatología con los meses de la exportación completada del resultado (o se
+    reengancha a la registrada en el journal), la espera y la publica. No es fatal: los meses
+    que no alcancen a acumularse los toma la siguiente ejecución desde las tablas.
+    """
+    region = region or REGION_POR_DEFECTO
+    clave = clave_journal(region, 'climatologia')
+    pendiente, task = tarea_reanudable(clave)
+    if pendiente is not None:
+        asset_climatologia = pendiente['assetId']
+    else:
+        plan, nuevas = resultado.get('plan'), resultado['fechasProcesadas']
+        try:
+            if plan is None:
+                # Reattached export: its months are read from the tables like the earlier ones
+                plan, nuevas = planificar_procesamiento(region=region), []
+            task, asset_climatologia = actualizar_climatologia(plan, region, resultado['exportAsset'], nuevas)
+        except Exception as e:
+            print(f"⚠️ Could not update the climatology: {e}")
+            resultado['climatologiaCompleted'] = False
+            return
+        if task is None:
+            return
+
+    resultado['climatologiaTask'] = task
+    resultado['climatologiaAsset'] = asset_climatologia
+    if wait_for_task_completion(task, check_interval=15, max_wait=600):
+        make_asset_public(asset_climatologia)
+        resultado['climatologiaCompleted'] = True
+    else:
+        print(f"⚠️ Climatology export {asset_climatologia} did not complete")
+        resultado['climatologiaCompleted'] = False
+    estado = task.status()['state']
+    if estado in task_monitor.ESTADOS_FINALES:
+        run_journal.cerrar_exportacion(clave, estado)
+    if estado in ('FAILED', 'CANCELLED'):
+        asset_catalog.olvidar(asset_climatologia)
+
+def necesita_compactacion(region=None):
+    """True cuando hay DELTAS_POR_COMPACTACION o más deltas sobre la tabla base, o una compactación sin cerrar en el journal."""
+    region = region or REGION_POR_DEFECTO
+    if run_journal.exportacion_pendiente(clave_journal(region, 'compactacion')):
+        return True
+    base_id = get_latest_csv_id(region.folder_metrics)
+    return len(metrics_deltas.deltas_pendientes(base_id, region.folder_deltas)) >= DELTAS_POR_COMPACTACION
+
+def compactar_deltas(esperar=True, region=None):
+    """
+    Escribe la tabla base + todos sus deltas (con geometrías) como nueva tabla base
+    en FOLDER_METRICS, nombrada por el último delta. Los deltas anteriores quedan obsoletos.
+    """
+    region = region or REGION_POR_DEFECTO
+    clave = clave_journal(region, 'compactacion')
+    pendiente, task = tarea_reanudable(clave)
+    if pendiente is not None:
+        return esperar_compactacion(clave, pendiente['assetId'], pendiente.get('deltas', []), task, esperar)
+
+    base_id = get_latest_csv_id(region.folder_metrics)
+    deltas = metrics_deltas.deltas_pendientes(base_id, region.folder_deltas)
+    if not deltas:
+        print('No hay deltas pendientes. No se compactó.')
+        return None
+
+    print(f'Compactando {len(deltas)} deltas sobre {base_id}')
+    csv = ee.FeatureCollection(base_id)
+    tabla = metrics_deltas.tabla_con_deltas(tabla_sin_geometria(csv), deltas)
+    datos_para_exportar = reparar_geometrias(tabla, fuente_geometrias(csv, region))
+
+    year, month = metrics_deltas.clave_asset_metricas(deltas[-1].split('/')[-1])
+    asset_name, _ = asset_catalog.nombre_unico(f'{region.folder_metrics}/{year}_{month}')
+    task = ee.batch.Export.table.toAsset(
+        collection=datos_para_exportar,
+        description=f"HS_Compactacion_{year}_{month}",
+        assetId=asset_name
+    )
+    task.start()
+    asset_catalog.registrar(asset_name)
+    run_journal.registrar_exportacion(clave, task.id, asset_name, deltas=deltas)
+    print(f'Tarea de compactación creada: {asset_name}')
+    return esperar_compactacion(clave, asset_name, deltas, task, esperar)
+
+def esperar_compactacion(clave, asset_name, deltas, task, esperar=True):
+    """Espera la tarea de compactación, publica la nueva tabla base y cierra su entrada del journal."""
+    resultado = {'assetPath': asset_name, 'deltas': deltas, 'exportTask': task}
+    if esperar:
+        resultado['taskCompleted'] = wait_for_task_completion(task, check_interval=15, max_wait=1800)
+        if resultado['taskCompleted']:
+            make_asset_public(asset_name)
+        estado = task.status()['state']
+        if estado in task_monitor.ESTADOS_FINALES:
+            run_journal.cerrar_exportacion(clave, estado)
+        if estado in ('FAILED', 'CANCELLED'):
+            asset_catalog.olvidar(asset_name)
+    return resultado
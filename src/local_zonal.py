@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Offline Zonal Statistics (NumPy backend)
+Computes subbasin means from the monthly SM GeoTIFFs downloaded by the
+sm-download workflow, without Earth Engine reductions.
+
+The subbasins are rasterized once per grid into a label image, cached on disk
+as a memory-mapped .npy keyed by geometry hash and grid transform; every
+subbasin mean is then one np.bincount pass over the valid pixels.
+Pixels are assigned to a subbasin by their center (native resolution), so
+values can differ slightly from the EE reduction, which weights edge pixels
+by their area fraction, along the borders.
+
+Optional dependencies: numpy, rasterio (only needed for this backend).
+
+Usage:
+    python local_zonal.py <tiff_dir> <salida.csv> [--geojson subcuencas.geojson]
+"""
+
+import csv
+import glob
+import hashlib
+import json
+import os
+import re
+
+try:
+    import numpy as np
+    import rasterio
+    from rasterio import features as rio_features
+    from rasterio.crs import CRS
+    from rasterio.warp import transform_geom
+except ImportError:  # optional backend
+    np = None
+    rasterio = None
+    rio_features = None
+
+# CRS of the GeoJSON geometries (Earth Engine's getInfo returns them in EPSG:4326)
+CRS_GEOJSON = 'EPSG:4326'
+
+CACHE_DIR = os.getenv('HS_LOCAL_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.hs_cache'))
+
+
+def patron_tiff(region='Valparaiso'):
+    """SM{year}<region>_<sensor>_mes{month}.tif, e.g. SM2025Valparaiso_VIIRS_mes10.tif"""
+    return re.compile(rf'SM(\d{{4}}){re.escape(region)}_[A-Za-z]+_mes_?(\d{{1,2}})\.tif$')
+
+
+def _requiere_dependencias():
+    if np is None or rasterio is None:
+        raise ImportError("The local zonal backend needs numpy and rasterio: pip install numpy rasterio")
+
+
+def fecha_desde_tiff(path, region='Valparaiso'):
+    """'YYYY-M' con el mes tal como aparece en el nombre (mismo formato que las columnas de la tabla)."""
+    match = patron_tiff(region).search(os.path.basename(path))
+    if not match:
+        return None
+    return f"{match.group(1)}-{match.group(2)}"
+
+
+def buscar_tiff(tiff_dir, year, month, region='Valparaiso'):
+    """Primer GeoTIFF del mes en tiff_dir (cualquier sensor, mes10 o mes_10), o None."""
+    for path in sorted(glob.glob(os.path.join(tiff_dir, f'SM{year}{region}_*mes*{month}.tif'))):
+        if fecha_desde_tiff(path, region) == f"{year}-{month}":
+            return path
+    return None
+
+
+def cargar_subcuencas(subcuencas_asset, codigos, geojson_path=None):
+    """
+    Features GeoJSON (COD_SUBC + geometry) de las subcuencas.
+    Se leen de geojson_path si se entrega; si no, una sola vez desde Earth Engine
+    y se guardan en CACHE_DIR para las siguientes ejecuciones.
+    """
+    if geojson_path is None:
+        nombre = hashlib.sha1(subcuencas_asset.encode()).hexdigest()[:12]
+        geojson_path = os.path.join(CACHE_DIR, f'subcuencas_{nombre}.geojson')
+        if not os.path.exists(geojson_path):
+            import ee
+            fc = ee.FeatureCollection(subcuencas_asset) \
+                .filter(ee.Filter.inList('COD_SUBC', codigos)) \
+                .select(['COD_SUBC'])
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(geojson_path, 'w') as f:
+                json.dump(fc.getInfo(), f)
+
+    with open(geojson_path) as f:
+        fc = json.load(f)
+    return [feat for feat in fc['features'] if feat['properties'].get('COD_SUBC') in codigos]
+
+
+def _hash_geometrias(features):
+    canonico = json.dumps(
+        sorted(((f['properties']['COD_SUBC'], f['geometry']) for f in features), key=lambda x: x[0]),
+        sort_keys=True
+    )
+    return hashlib.sha256(canonico.encode()).hexdigest()
+
+
+def grilla_etiquetas(features, transform, shape, crs):
+    """
+    Label grid (0 = outside, i + 1 = features[i]) for one raster grid, memory-mapped
+    from CACHE_DIR when a grid with the same geometries and transform was already built.
+    The geometries (CRS_GEOJSON) are reprojected to the raster's crs before rasterizing.
+    Returns (labels, codigos) where codigos[i] is the COD_SUBC of label i + 1.
+    """
+    _requiere_dependencias()
+    features = sorted(features, key=lambda f: f['properties']['COD_SUBC'])
+    codigos = [f['properties']['COD_SUBC'] for f in features]
+
+    clave = hashlib.sha256(json.dumps({
+        'geometrias': _hash_geometrias(features),
+        'transform': list(transform)[:6],
+        'shape': list(shape),
+        'crs': str(crs),
+    }, sort_keys=True).encode()).hexdigest()[:16]
+    path = os.path.join(CACHE_DIR, f'etiquetas_{clave}.npy')
+
+    if not os.path.exists(path):
+        geometrias = [f['geometry'] for f in features]
+        if crs is not None and CRS.from_user_input(crs) != CRS.from_user_input(CRS_GEOJSON):
+            geometrias = [transform_geom(CRS_GEOJSON, crs, g) for g in geometrias]
+        labels = rio_features.rasterize(
+            ((g, i + 1) for i, g in enumerate(geometrias)),
+            out_shape=shape,
+            transform=transform,
+            fill=0,
+            dtype='int32'
+        )
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        np.save(path, labels)
+
+    return np.load(path, mmap_mode='r'), codigos
+
+
+def medias_por_zona(valores, labels, codigos):
+    """
+    Means per subbasin in one vectorized pass, plus 'Region' over every valid pixel.
+    valores: masked array (or float array with NaN for invalid pixels).
+    """
+    datos = np.ma.masked_invalid(np.ma.asarray(valores, dtype='float64'))
+    validos = ~np.ma.getmaskarray(datos)
+    etiquetas = np.asarray(labels)[validos]
+    pixeles = datos.data[validos]
+
+    n = len(codigos) + 1
+    sumas = np.bincount(etiquetas, weights=pixeles, minlength=n)
+    conteos = np.bincount(etiquetas, minlength=n)
+
+    resultado = {}
+    for i, cod in enumerate(codigos, start=1):
+        resultado[cod] = float(sumas[i] / conteos[i]) if conteos[i] else None
+    resultado['Region'] = float(pixeles.mean()) if pixeles.size else None
+    return resultado
+
+
+def promedios_geotiff(path, features):
+    """{COD_SUBC: media, 'Region': media} para la primera banda de un GeoTIFF."""
+    _requiere_dependencias()
+    with rasterio.open(path) as src:
+        valores = src.read(1, masked=True)
+        labels, codigos = grilla_etiquetas(features, src.transform, (src.height, src.width), src.crs)
+    return medias_por_zona(valores, labels, codigos)
+
+
+def promedios_por_fecha(tiff_paths, features, region='Valparaiso'):
+    """{fecha: {COD_SUBC: media}} para una lista de GeoTIFFs mensuales de la región."""
+    resultados = {}
+    for path in tiff_paths:
+        fecha = fecha_desde_tiff(path, region)
+        if fecha is None:
+            print(f"Couldn't parse date from {path}, skipping")
+            continue
+        resultados[fecha] = promedios_geotiff(path, features)
+        print(f"✓ {fecha}: {os.path.basename(path)}")
+    return resultados
+
+
+def por_codigo(resultados):
+    """Transpone {fecha: {cod: v}} a {cod: {fecha: v}} (formato de la tabla COD_SUBC × YYYY-MM)."""
+    tabla = {}
+    for fecha, valores in resultados.items():
+        for cod, valor in valores.items():
+            tabla.setdefault(cod, {})[fecha] = valor
+    return tabla
+
+
+def escribir_csv(resultados, salida):
+    """Escribe la tabla transpuesta: una fila por COD_SUBC, una columna por fecha."""
+    def orden(fecha):
+        year, month = fecha.split('-')
+        return (int(year), int(month))
+
+    fechas = sorted(resultados, key=orden)
+    tabla = por_codigo(resultados)
+    with open(salida, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['COD_SUBC'] + fechas)
+        for cod in sorted(tabla):
+            writer.writerow([cod] + ['' if tabla[cod].get(fecha) is None else tabla[cod][fecha] for fecha in fechas])
+
+
+def main(argv=None):
+    import argparse
+
+    import hs_update
+
+    parser = argparse.ArgumentParser(description='Offline subbasin means from SM GeoTIFFs')
+    parser.add_argument('tiff_dir', help='directory with SM{year}Valparaiso_*_mes{month}.tif files')
+    parser.add_argument('salida', help='output CSV (COD_SUBC x YYYY-MM)')
+    parser.add_argument('--geojson', help='subbasin GeoJSON; read once from Earth Engine if omitted')
+    args = parser.parse_args(argv)
+
+    if args.geojson is None:
+        import update_dashboard
+        update_dashboard.initialize_earth_engine()
+
+    features = cargar_subcuencas(hs_update.SUBCUENCAS_ASSET, hs_update.SUBCUENCA_NOMBRES, args.geojson)
+    tiffs = sorted(glob.glob(os.path.join(args.tiff_dir, '*.tif')))
+    resultados = promedios_por_fecha(tiffs, features)
+    escribir_csv(resultados, args.salida)
+    print(f"✅ {len(resultados)} months written to {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Append-only layout for the transposed metrics table
+Each run exports only its new month columns as a small delta asset in
+<metrics folder>Deltas; a compaction periodically writes base + deltas as a
+new base table. Readers combine the latest base with the deltas exported after it.
+Note: Earth Engine must be initialized BEFORE calling functions in this module
+"""
+
+import ee
+
+import asset_catalog
+import zonal_stats
+
+
+def carpeta_deltas(folder_metrics):
+    """Carpeta de deltas asociada a una carpeta de tablas base."""
+    return f"{folder_metrics}Deltas"
+
+
+def clave_asset_metricas(name):
+    """(year, month) de nombres como '2025_10', '2025_10_1', '2025_5'; (0, 0) si no se puede leer."""
+    try:
+        parts = name.split('_')
+        if len(parts) >= 2:
+            return (int(parts[0]), int(parts[1]))
+        return (0, 0)
+    except ValueError:
+        return (0, 0)
+
+
+def deltas_pendientes(base_id, folder_deltas):
+    """Deltas más nuevos que la tabla base, ordenados por fecha."""
+    clave_base = clave_asset_metricas(base_id.split('/')[-1])
+    try:
+        nombres = asset_catalog.nombres(folder_deltas)
+    except Exception as e:
+        print(f"Delta folder not available ({folder_deltas}): {e}")
+        return []
+    nombres = [n for n in nombres if clave_asset_metricas(n) > clave_base]
+    nombres.sort(key=lambda n: (clave_asset_metricas(n), n))
+    return [f"{folder_deltas}/{n}" for n in nombres]
+
+
+def columnas_fecha(fc):
+    """Columnas 'YYYY-MM' de una tabla (server-side)."""
+    return ee.FeatureCollection(fc).first().propertyNames() \
+        .filter(ee.Filter.stringContains('item', '-'))
+
+
+def tabla_con_deltas(base, delta_ids):
+    """La tabla base con las columnas de cada delta unidas por COD_SUBC, como una sola tabla."""
+    tabla = ee.FeatureCollection(base)
+    for delta_id in delta_ids:
+        delta = ee.FeatureCollection(delta_id)
+        tabla = zonal_stats.unir_valores(tabla, delta, columnas_fecha(delta))
+    return tabla
+
+
+def tabla_delta(base):
+    """Tabla mínima para un delta: solo COD_SUBC, sin geometría."""
+    return ee.FeatureCollection(base).select(['COD_SUBC'], None, False)
@@ -1,46 +1,191 @@
+import datetime
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
 import ee
 
+import asset_catalog
+import ee_session
+
 # Note: Earth Engine must be initialized BEFORE importing this module
 # The initialization is done in update_dashboard.py
 
 # Carpeta con los assets a hacer públicos
 #folder = 'users/corfobbppciren2024/SR'
 
+# Publishing engine: bounded pool and shared token bucket; retries follow ee_session's policy
+MAX_WORKERS = 8
+LLAMADAS_POR_SEGUNDO = 10
+
+# Incremental publishing: last published updateTime per folder
+RUTA_WATERMARK = os.getenv('HS_PUBLISH_WATERMARK', 'publish_watermark.json')
+
+
+class TokenBucket:
+    """Limitador de tasa compartido entre hilos: `tasa` llamadas/s con ráfagas de hasta `capacidad`."""
+
+    def __init__(self, tasa: float, capacidad: float = None):
+        self.tasa = tasa
+        self.capacidad = capacidad if capacidad is not None else tasa
+        self._tokens = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self) -> None:
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa)
+                self._ultimo = ahora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.tasa
+            time.sleep(espera)
+
+
+def _llamar(limitador: TokenBucket, fn, *args):
+    """Llama fn respetando el limitador en cada intento, con la política de reintentos de ee_session."""
+    return ee_session.llamar(fn, *args, antes=limitador.adquirir)
+
+
 def is_asset_public(asset_id: str) -> bool:
-    """Verifica si un asset ya es público."""
+    """Verifica si un asset ya es público (los errores que persisten tras los reintentos se propagan)."""
+    acl = ee_session.llamar(ee.data.getAssetAcl, asset_id)
+    return acl.get('all_users_can_read', False)
+
+
+def publicar_asset(asset_id: str, limitador: TokenBucket = None) -> str:
+    """
+    Hace público un asset leyendo su ACL una sola vez.
+    Retorna 'publico' si ya lo era, 'publicado' si se cambió o 'error'.
+    """
+    if limitador is None:
+        limitador = TokenBucket(LLAMADAS_POR_SEGUNDO)
     try:
-        acl = ee.data.getAssetAcl(asset_id)
-        return acl.get('all_users_can_read', False)
+        acl = _llamar(limitador, ee.data.getAssetAcl, asset_id)
+        if acl.get('all_users_can_read', False):
+            return 'publico'
+        acl['all_users_can_read'] = True
+        _llamar(limitador, ee.data.setAssetAcl, asset_id, acl)
+        print(f"Asset {asset_id} ahora es público.")
+        return 'publicado'
     except Exception as e:
-        print(f"Error al verificar el estado del asset {asset_id}: {e}")
-        return False
+        print(f"Error al hacer público el asset {asset_id}: {e}")
+        return 'error'
 
 
 def make_asset_public(asset_id: str) -> None:
     """Hace público un asset de Google Earth Engine."""
+    publicar_asset(asset_id)
+
+
+def publicar_assets(asset_ids, max_workers: Optional[int] = None,
+                    llamadas_por_segundo: Optional[float] = None) -> dict:
+    """
+    Publica varios assets en paralelo con un pool acotado y un limitador compartido.
+    asset_ids puede ser un generador: cada asset se encola apenas llega.
+    """
+    max_workers = max_workers or MAX_WORKERS
+    limitador = TokenBucket(llamadas_por_segundo or LLAMADAS_POR_SEGUNDO)
+    resumen = {'total': 0, 'publico': 0, 'publicado': 0, 'error': 0}
+    inicio = time.time()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for estado in pool.map(lambda asset_id: publicar_asset(asset_id, limitador), asset_ids):
+            resumen['total'] += 1
+            resumen[estado] += 1
+
+    resumen['segundos'] = round(time.time() - inicio, 2)
+    return resumen
+
+
+def _parse_update_time(valor):
     try:
-        if is_asset_public(asset_id):
-            pass
-            # print(f"Asset {asset_id} ya es público.")
-        else:
-            acl = ee.data.getAssetAcl(asset_id)
-            acl['all_users_can_read'] = True
-            ee.data.setAssetAcl(asset_id, acl)
-            print(f"Asset {asset_id} ahora es público.")
-    except Exception as e:
-        print(f"Error al hacer público el asset {asset_id}: {e}")
+        return datetime.datetime.fromisoformat(valor.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
 
 
-def make_assets_public_in_folder(folder: str) -> None:
-    """Hace públicos todos los assets dentro de una carpeta."""
+def cargar_watermarks() -> dict:
+    """Lee {folder: updateTime} del archivo de watermarks; vacío si no existe."""
+    if not os.path.exists(RUTA_WATERMARK):
+        return {}
     try:
-        asset_list = ee.data.listAssets({'parent': folder}).get('assets', [])
-        print(f"Se encontraron {len(asset_list)} assets en {folder}")
-        for asset in asset_list:
-            make_asset_public(asset['id'])
+        with open(RUTA_WATERMARK) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ No se pudo leer {RUTA_WATERMARK}: {e}")
+        return {}
+
+
+def guardar_watermark(folder: str, update_time: str) -> None:
+    """Guarda el updateTime más reciente publicado para la carpeta."""
+    watermarks = cargar_watermarks()
+    watermarks[folder] = update_time
+    try:
+        with open(RUTA_WATERMARK, 'w') as f:
+            json.dump(watermarks, f, indent=1)
+    except OSError as e:
+        print(f"⚠️ No se pudo escribir {RUTA_WATERMARK}: {e}")
+
+
+def assets_nuevos(asset_list, watermark: str):
+    """Assets con updateTime posterior al watermark (o sin updateTime conocido), uno a uno."""
+    limite = _parse_update_time(watermark)
+    for asset in asset_list:
+        update_time = _parse_update_time(asset.get('updateTime'))
+        if limite is None or update_time is None or update_time > limite:
+            yield asset
+
+
+def make_assets_public_in_folder(folder: str, full: bool = True) -> Optional[dict]:
+    """
+    Hace públicos los assets de una carpeta.
+    Con full=False solo revisa los assets más nuevos que el watermark de la carpeta.
+    Retorna el resumen de publicar_assets, o None si no se pudo listar la carpeta.
+    """
+    try:
+        watermark = None if full else cargar_watermarks().get(folder)
+        vistos = {'total': 0}
+        tiempos = []
+
+        def contar(assets):
+            for asset in assets:
+                vistos['total'] += 1
+                yield asset
+
+        def a_publicar():
+            # Streamed page by page: publishing starts while later pages are still being listed
+            asset_list = contar(asset_catalog.iterar(folder))
+            if watermark:
+                asset_list = assets_nuevos(asset_list, watermark)
+            for asset in asset_list:
+                if _parse_update_time(asset.get('updateTime')):
+                    tiempos.append(asset['updateTime'])
+                yield asset['id']
+
+        resumen = publicar_assets(a_publicar())
+        print(f"Se encontraron {vistos['total']} assets en {folder}")
+        if watermark:
+            print(f"  Assets nuevos desde {watermark}: {resumen['total']}")
+        print(f"  Ya públicos: {resumen['publico']}")
+        print(f"  Hechos públicos: {resumen['publicado']}")
+        print(f"  Errores: {resumen['error']}")
+        print(f"  Tiempo: {resumen['segundos']} s")
+
+        # Only advance the watermark when every asset up to it was handled
+        if resumen['error'] == 0 and tiempos:
+            guardar_watermark(folder, max(tiempos, key=_parse_update_time))
+        return resumen
     except Exception as e:
         print(f"Error al listar o hacer públicos los assets en {folder}: {e}")
+        return None
 
 
-def main(folder):
-    make_assets_public_in_folder(folder)
\ No newline at end of file
+def main(folder, full=True):
+    return make_assets_public_in_folder(folder, full=full)
@@ -6,25 +6,24 @@ Makes Earth Engine assets publicly readable
 
 import ee
 
+import asset_catalog
+import ee_session
+
 def is_asset_public(asset_id: str) -> bool:
-    """Verifies if an asset is already public."""
-    try:
-        acl = ee.data.getAssetAcl(asset_id)
-        return acl.get('all_users_can_read', False)
-    except Exception as e:
-        print(f"Error verifying asset status {asset_id}: {e}")
-        return False
+    """Verifies if an asset is already public (errors that outlast the retries propagate)."""
+    acl = ee_session.llamar(ee.data.getAssetAcl, asset_id)
+    return acl.get('all_users_can_read', False)
 
 
 def make_asset_public(asset_id: str) -> None:
     """Makes an Earth Engine asset public."""
     try:
-        if is_asset_public(asset_id):
+        acl = ee_session.llamar(ee.data.getAssetAcl, asset_id)
+        if acl.get('all_users_can_read', False):
             pass  # Already public, skip logging
         else:
-            acl = ee.data.getAssetAcl(asset_id)
             acl['all_users_can_read'] = True
-            ee.data.setAssetAcl(asset_id, acl)
+            ee_session.llamar(ee.data.setAssetAcl, asset_id, acl)
             print(f"✓ Asset {asset_id} is now public")
     except Exception as e:
         print(f"❌ Error making asset public {asset_id}: {e}")
@@ -33,15 +32,19 @@ def make_asset_public(asset_id: str) -> None:
 def make_assets_public_in_folder(folder: str) -> None:
     """Makes all assets within a folder public."""
     try:
-        asset_list = ee.data.listAssets({'parent': folder}).get('assets', [])
-        print(f"  Found {len(asset_list)} assets in {folder}")
-        
         public_count = 0
         updated_count = 0
+        error_count = 0
         
-        for asset in asset_list:
+        # Every page of the folder, streamed (the next page is fetched while this one is processed)
+        for asset in asset_catalog.iterar_assets(folder):
             asset_id = asset['id']
-            was_public = is_asset_public(asset_id)
+            try:
+                was_public = is_asset_public(asset_id)
+            except Exception as e:
+                print(f"❌ Error verifying asset status {asset_id}: {e}")
+                error_count += 1
+                continue
             
             if was_public:
                 public_count += 1
@@ -49,8 +52,11 @@ def make_assets_public_in_folder(folder: str) -> None:
                 make_asset_public(asset_id)
                 updated_count += 1
         
+        print(f"  Found {public_count + updated_count + error_count} assets in {folder}")
         print(f"  Already public: {public_count}")
         print(f"  Made public: {updated_count}")
+        if error_count:
+            print(f"  Errors: {error_count}")
         
     except Exception as e:
         print(f"❌ Error listing or making assets public in {folder}: {e}")
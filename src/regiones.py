@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Region Configuration
+Each region processed by the dashboard update: subbasin geometry asset, zone
+codes, HS image naming pattern and output folders, read from a JSON (or YAML)
+file so a new region needs a config entry instead of a copy of hs_update.py.
+
+Config format (regiones.json):
+    {"regiones": [{
+        "nombre": "Valparaiso",
+        "subcuencas_asset": "projects/.../Geometrias/SubcuencasValparaiso",
+        "subcuencas": ["0510", "0511", ...],
+        "patron_hs": "SM{year}Valparaiso_GCOM_mes{month}",
+        "folder_hs": "projects/.../assets/HS",
+        "folder_metrics": "projects/.../assets/MetricsHSTransposed"
+    }]}
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import climatologia
+import metrics_deltas
+
+try:
+    import yaml
+except ImportError:  # YAML configs are optional
+    yaml = None
+
+RUTA_CONFIG = os.getenv('HS_REGIONES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'regiones.json'))
+
+CAMPOS_REQUERIDOS = ['nombre', 'subcuencas_asset', 'subcuencas', 'patron_hs', 'folder_hs', 'folder_metrics']
+
+
+@dataclass
+class Region:
+    """One region of the dashboard: where its inputs live and where its table goes"""
+    nombre: str
+    subcuencas_asset: str
+    subcuencas: List[str]
+    patron_hs: str
+    folder_hs: str
+    folder_metrics: str
+    _regex: re.Pattern = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # 'SM{year}Valparaiso_GCOM_mes{month}' -> SM(?P<year>\d{4})Valparaiso_GCOM_mes_?(?P<month>\d{1,2})
+        partes = re.split(r'(\{year\}|\{month\})', self.patron_hs)
+        regex = ''.join(
+            r'(?P<year>\d{4})' if p == '{year}' else
+            r'_?(?P<month>\d{1,2})' if p == '{month}' else
+            re.escape(p)
+            for p in partes
+        )
+        self._regex = re.compile(f'^{regex}$')
+
+    @property
+    def folder_deltas(self) -> str:
+        return metrics_deltas.carpeta_deltas(self.folder_metrics)
+
+    @property
+    def folder_climatologia(self) -> str:
+        return climatologia.carpeta_climatologia(self.folder_metrics)
+
+    def candidatos_hs(self, year, month) -> List[str]:
+        """Asset ids posibles de la imagen de un mes: sin y con guion bajo antes del mes."""
+        return [
+            f"{self.folder_hs}/{self.patron_hs.format(year=year, month=month)}",
+            f"{self.folder_hs}/{self.patron_hs.format(year=year, month=f'_{month}')}",
+        ]
+
+    def fecha_desde_nombre(self, nombre) -> Optional[str]:
+        """'YYYY-M' desde el nombre (o id) de una imagen HS de la región; None si no calza."""
+        match = self._regex.match(nombre.split('/')[-1])
+        if not match:
+            return None
+        return f"{match.group('year')}-{match.group('month')}"
+
+
+def _leer(ruta):
+    with open(ruta) as f:
+        if ruta.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ImportError("YAML region configs need PyYAML: pip install pyyaml")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def cargar_regiones(ruta=None, nombres=None) -> List[Region]:
+    """Regiones del archivo de configuración; nombres limita a un subconjunto."""
+    ruta = ruta or RUTA_CONFIG
+    datos = _leer(ruta)
+    entradas = datos.get('regiones', []) if isinstance(datos, dict) else datos
+
+    regiones = []
+    for entrada in entradas:
+        faltantes = [c for c in CAMPOS_REQUERIDOS if c not in entrada]
+        if faltantes:
+            raise ValueError(f"Region {entrada.get('nombre', '?')} in {ruta} is missing {faltantes}")
+        regiones.append(Region(**{c: entrada[c] for c in CAMPOS_REQUERIDOS}))
+
+    if nombres:
+        desconocidas = set(nombres) - {r.nombre for r in regiones}
+        if desconocidas:
+            raise ValueError(f"Unknown region(s) {sorted(desconocidas)} in {ruta}")
+        regiones = [r for r in regiones if r.nombre in nombres]
+
+    if not regiones:
+        raise ValueError(f"No regions configured in {ruta}")
+    return regiones
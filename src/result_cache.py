@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Result Cache for monthly subbasin statistics
+Content-addressed store of the per-subbasin values of one month: the key is a hash
+of everything the result depends on (source image updateTime, subbasin geometry
+version, zone codes and reducer settings), so a rebuild, backfill or new-region run
+only sends months that are new or whose inputs changed to Earth Engine.
+
+Stored locally in SQLite; when the file grows past MAX_MB the least recently used
+entries are evicted.
+Note: Earth Engine must be initialized BEFORE calling version_asset()
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import asset_catalog
+
+RUTA_CACHE = os.getenv('HS_RESULT_CACHE', 'result_cache.sqlite')
+MAX_MB = float(os.getenv('HS_RESULT_CACHE_MB', '64'))
+
+# Bump when the reduction itself changes so older results stop matching
+VERSION_ALGORITMO = 1
+
+# Regions run in threads (update_dashboard); one connection per operation under this lock
+_lock = threading.RLock()
+
+
+def configurar(ruta=None, max_mb=None):
+    """Cambia el archivo SQLite y/o el tamaño máximo."""
+    global RUTA_CACHE, MAX_MB
+    if ruta is not None:
+        RUTA_CACHE = ruta
+    if max_mb is not None:
+        MAX_MB = max_mb
+
+
+@contextlib.contextmanager
+def _conectar():
+    """Conexión con la tabla creada; confirma al salir sin error y siempre se cierra."""
+    with _lock, contextlib.closing(sqlite3.connect(RUTA_CACHE)) as conexion:
+        conexion.execute(
+            'CREATE TABLE IF NOT EXISTS resultados ('
+            ' clave TEXT PRIMARY KEY, valores TEXT NOT NULL, bytes INTEGER NOT NULL,'
+            ' descripcion TEXT, creado REAL NOT NULL, usado REAL NOT NULL)'
+        )
+        with conexion:
+            yield conexion
+
+
+def clave(**entradas):
+    """sha256 de las entradas (cualquier valor serializable a JSON), independiente del orden."""
+    entradas = dict(entradas, version_algoritmo=VERSION_ALGORITMO)
+    texto = json.dumps(entradas, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def version_asset(asset_id):
+    """updateTime del asset según el listado de su carpeta (asset_catalog), o None si no se conoce."""
+    folder = asset_id.rsplit('/', 1)[0]
+    for asset in asset_catalog.listar(folder):
+        if asset['id'] == asset_id or asset['name'] == asset_id or asset['name'].endswith(f"/{asset_id}"):
+            return asset.get('updateTime')
+    return None
+
+
+def obtener(clave_resultado):
+    """Valores guardados para la clave ({COD_SUBC: {stat: valor}}), o None; marca la entrada como usada."""
+    try:
+        with _conectar() as conexion:
+            fila = conexion.execute(
+                'SELECT valores FROM resultados WHERE clave = ?', (clave_resultado,)
+            ).fetchone()
+            if fila is None:
+                return None
+            conexion.execute('UPDATE resultados SET usado = ? WHERE clave = ?', (time.time(), clave_resultado))
+        return json.loads(fila[0])
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not read result cache {RUTA_CACHE}: {e}")
+        return None
+
+
+def guardar(clave_resultado, valores, descripcion=''):
+    """Guarda los valores de la clave y desaloja las entradas menos usadas si se pasa de MAX_MB."""
+    texto = json.dumps(valores, sort_keys=True)
+    ahora = time.time()
+    try:
+        with _conectar() as conexion:
+            conexion.execute(
+                'INSERT OR REPLACE INTO resultados (clave, valores, bytes, descripcion, creado, usado)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (clave_resultado, texto, len(texto), descripcion, ahora, ahora)
+            )
+            _desalojar(conexion)
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not write result cache {RUTA_CACHE}: {e}")
+
+
+def _desalojar(conexion):
+    """Borra las entradas usadas hace más tiempo hasta quedar bajo MAX_MB."""
+    limite = MAX_MB * 1024 * 1024
+    total = conexion.execute('SELECT COALESCE(SUM(bytes), 0) FROM resultados').fetchone()[0]
+    if total <= limite:
+        return
+    borradas = 0
+    for clave_resultado, tamano in conexion.execute(
+            'SELECT clave, bytes FROM resultados ORDER BY usado ASC').fetchall():
+        if total <= limite:
+            break
+        conexion.execute('DELETE FROM resultados WHERE clave = ?', (clave_resultado,))
+        total -= tamano
+        borradas += 1
+    print(f"🧹 Result cache over {MAX_MB:g} MB: evicted {borradas} least recently used result(s)")
+
+
+def resumen():
+    """{'entradas': n, 'bytes': total} del cache."""
+    with _conectar() as conexion:
+        entradas, total = conexion.execute(
+            'SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM resultados'
+        ).fetchone()
+    return {'entradas': entradas, 'bytes': total}
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+RPC Profiling for Earth Engine calls
+Opt-in wrapper around the ee.data entry points and ComputedObject.getInfo that
+records call counts, latency histograms, payload sizes and the pipeline stage
+of every round-trip, and writes a JSON profile (plus an optional Chrome trace).
+
+Usage:
+    rpc_profile.activar()
+    with rpc_profile.etapa('procesamiento'):
+        ...
+    rpc_profile.escribir_perfil('rpc_profile.json', 'rpc_trace.json')
+"""
+
+import contextlib
+import contextvars
+import functools
+import json
+import threading
+import time
+
+import ee
+
+# ee.data functions that issue a round-trip
+METODOS_EE_DATA = [
+    'computeValue', 'getInfo', 'listAssets', 'getAsset', 'getAssetAcl', 'setAssetAcl',
+    'getTaskStatus', 'getTaskList', 'createAsset', 'deleteAsset', 'copyAsset',
+    'exportTable', 'exportImage', 'startTableExport', 'startProcessing',
+    'getOperation', 'listOperations',
+]
+
+# Latency histogram bucket upper bounds (ms)
+BUCKETS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf')]
+
+_llamadas = []
+_lock = threading.Lock()
+_local = threading.local()
+_originales = {}
+_etapa_actual = 'sin_etapa'
+# Stage of the current thread/task; asyncio.to_thread copies it, plain thread pools fall back to _etapa_actual
+_etapa_contexto = contextvars.ContextVar('etapa', default=None)
+_inicio = None
+
+
+def _tamano(resultado):
+    try:
+        return len(json.dumps(resultado, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _envolver(nombre, fn):
+    @functools.wraps(fn)
+    def envoltura(*args, **kwargs):
+        # Only the outermost call is recorded (getInfo -> computeValue counts once)
+        if getattr(_local, 'profundidad', 0) > 0:
+            return fn(*args, **kwargs)
+        _local.profundidad = 1
+        inicio = time.perf_counter()
+        error = None
+        resultado = None
+        try:
+            resultado = fn(*args, **kwargs)
+            return resultado
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            duracion = time.perf_counter() - inicio
+            _local.profundidad = 0
+            with _lock:
+                _llamadas.append({
+                    'metodo': nombre,
+                    'etapa': _etapa_contexto.get() or _etapa_actual,
+                    'inicio': inicio - _inicio,
+                    'duracion': duracion,
+                    'bytes': _tamano(resultado) if error is None else 0,
+                    'error': error,
+                    'hilo': threading.get_ident(),
+                })
+    return envoltura
+
+
+def activar():
+    """Instala los wrappers (idempotente)."""
+    global _inicio
+    if _originales:
+        return
+    _inicio = time.perf_counter()
+    for nombre in METODOS_EE_DATA:
+        fn = getattr(ee.data, nombre, None)
+        if fn is not None:
+            _originales[('data', nombre)] = fn
+            setattr(ee.data, nombre, _envolver(nombre, fn))
+    _originales[('ComputedObject', 'getInfo')] = ee.ComputedObject.getInfo
+    ee.ComputedObject.getInfo = _envolver('ComputedObject.getInfo', ee.ComputedObject.getInfo)
+    print("⏱️ RPC profiling enabled")
+
+
+def desactivar():
+    """Restaura las funciones originales."""
+    for (donde, nombre), fn in _originales.items():
+        setattr(ee.data if donde == 'data' else ee.ComputedObject, nombre, fn)
+    _originales.clear()
+
+
+def activo():
+    return bool(_originales)
+
+
+@contextlib.contextmanager
+def etapa(nombre):
+    """
+    Atribuye las llamadas del bloque a la etapa `nombre` del pipeline.
+    La etapa es propia de cada hilo (regiones en paralelo); los hilos sin etapa
+    propia, como los pools de publicación, usan la del hilo principal.
+    """
+    global _etapa_actual
+    principal = threading.current_thread() is threading.main_thread()
+    anterior = _etapa_actual
+    if principal:
+        _etapa_actual = nombre
+    token = _etapa_contexto.set(nombre)
+    try:
+        yield
+    finally:
+        _etapa_contexto.reset(token)
+        if principal:
+            _etapa_actual = anterior
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))]
+
+
+def _histograma(duraciones):
+    conteos = [0] * len(BUCKETS_MS)
+    for d in duraciones:
+        ms = d * 1000
+        for i, limite in enumerate(BUCKETS_MS):
+            if ms <= limite:
+                conteos[i] += 1
+                break
+    return {('inf' if limite == float('inf') else f"<={limite}ms"): n for limite, n in zip(BUCKETS_MS, conteos)}
+
+
+def resumen():
+    """Perfil agregado por método y por etapa."""
+    with _lock:
+        llamadas = list(_llamadas)
+
+    por_metodo = {}
+    for llamada in llamadas:
+        por_metodo.setdefault(llamada['metodo'], []).append(llamada)
+
+    metodos = {}
+    for metodo, lista in sorted(por_metodo.items()):
+        duraciones = [l['duracion'] for l in lista]
+        metodos[metodo] = {
+            'llamadas': len(lista),
+            'errores': sum(1 for l in lista if l['error']),
+            'segundos_total': round(sum(duraciones), 4),
+            'ms_media': round(1000 * sum(duraciones) / len(duraciones), 2),
+            'ms_p50': round(1000 * _percentil(duraciones, 0.5), 2),
+            'ms_p95': round(1000 * _percentil(duraciones, 0.95), 2),
+            'ms_max': round(1000 * max(duraciones), 2),
+            'bytes_total': sum(l['bytes'] for l in lista),
+            'histograma': _histograma(duraciones),
+        }
+
+    etapas = {}
+    for llamada in llamadas:
+        datos = etapas.setdefault(llamada['etapa'], {'llamadas': 0, 'segundos': 0.0, 'por_metodo': {}})
+        datos['llamadas'] += 1
+        datos['segundos'] = round(datos['segundos'] + llamada['duracion'], 4)
+        datos['por_metodo'][llamada['metodo']] = datos['por_metodo'].get(llamada['metodo'], 0) + 1
+
+    return {
+        'total_llamadas': len(llamadas),
+        'total_segundos_rpc': round(sum(l['duracion'] for l in llamadas), 4),
+        'por_metodo': metodos,
+        'por_etapa': etapas,
+    }
+
+
+def escribir_perfil(ruta, ruta_trace=None):
+    """Escribe el perfil JSON y, si se pide, un trace en formato Chrome (chrome://tracing)."""
+    perfil = resumen()
+    with open(ruta, 'w') as f:
+        json.dump(perfil, f, indent=2)
+    print(f"⏱️ RPC profile written to {ruta}: {perfil['total_llamadas']} calls, "
+          f"{perfil['total_segundos_rpc']} s in round-trips")
+
+    if ruta_trace:
+        with _lock:
+            llamadas = list(_llamadas)
+        eventos = [{
+            'name': l['metodo'],
+            'cat': l['etapa'],
+            'ph': 'X',
+            'ts': round(l['inicio'] * 1e6),
+            'dur': round(l['duracion'] * 1e6),
+            'pid': 1,
+            'tid': l['hilo'],
+            'args': {'bytes': l['bytes'], 'error': l['error']},
+        } for l in llamadas]
+        with open(ruta_trace, 'w') as f:
+            json.dump({'traceEvents': eventos, 'displayTimeUnit': 'ms'}, f)
+        print(f"⏱️ Chrome trace written to {ruta_trace}")
+    return perfil
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Run Journal
+Records, in a local JSON file, the export tasks submitted by a run (task ID and
+target asset) and the steps that already succeeded, so a rerun of the same job
+reattaches to its exports instead of submitting new ones and skips finished steps.
+
+Steps belong to one run (GITHUB_RUN_ID, reruns keep it; HS_RUN_ID or the date
+locally); exports that never finished are kept across runs until closed.
+"""
+
+import datetime
+import json
+import os
+import threading
+
+import ee
+
+import ee_session
+
+RUTA_JOURNAL = os.getenv('HS_RUN_JOURNAL', 'run_journal.json')
+
+_lock = threading.RLock()
+_journal = None
+
+
+class TareaRegistrada:
+    """Handle of a task known only by its ID (same id/status() interface as ee.batch.Task)."""
+
+    def __init__(self, task_id):
+        self.id = task_id
+
+    def status(self):
+        return ee_session.llamar(ee.data.getTaskStatus, [self.id])[0]
+
+
+def configurar(ruta=None):
+    """Cambia el archivo del journal y descarta lo cargado en memoria."""
+    global RUTA_JOURNAL, _journal
+    with _lock:
+        if ruta is not None:
+            RUTA_JOURNAL = ruta
+        _journal = None
+
+
+def id_ejecucion():
+    return os.getenv('GITHUB_RUN_ID') or os.getenv('HS_RUN_ID') or f"local-{datetime.date.today().isoformat()}"
+
+
+def _ahora():
+    return datetime.datetime.now().isoformat()
+
+
+def _cargar():
+    global _journal
+    if _journal is not None:
+        return _journal
+    guardado = {}
+    if os.path.exists(RUTA_JOURNAL):
+        try:
+            with open(RUTA_JOURNAL) as f:
+                guardado = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read run journal {RUTA_JOURNAL}: {e}")
+
+    ejecucion = id_ejecucion()
+    if guardado.get('ejecucion') != ejecucion:
+        if guardado.get('pasos'):
+            print(f"📓 Run journal belongs to run {guardado.get('ejecucion')}; starting a new one for {ejecucion}")
+        guardado['pasos'] = {}
+    else:
+        print(f"📓 Resuming run {ejecucion}: {len(guardado.get('pasos', {}))} step(s) already done")
+    guardado['ejecucion'] = ejecucion
+    guardado.setdefault('exportaciones', {})
+    _journal = guardado
+    return _journal
+
+
+def _guardar():
+    temporal = f"{RUTA_JOURNAL}.tmp"
+    try:
+        with open(temporal, 'w') as f:
+            json.dump(_journal, f, indent=2)
+        os.replace(temporal, RUTA_JOURNAL)
+    except OSError as e:
+        print(f"⚠️ Could not write run journal {RUTA_JOURNAL}: {e}")
+
+
+def paso_completado(paso):
+    """Datos del paso si ya terminó en esta ejecución, o None."""
+    with _lock:
+        return _cargar()['pasos'].get(paso)
+
+
+def marcar_paso(paso, **datos):
+    with _lock:
+        _cargar()['pasos'][paso] = dict(datos, terminado=_ahora())
+        _guardar()
+
+
+def registrar_exportacion(clave, task_id, asset_id, **datos):
+    """Guarda la tarea recién enviada para la clave (p. ej. 'Valparaiso:actualizacion')."""
+    with _lock:
+        _cargar()['exportaciones'][clave] = dict(datos, taskId=task_id, assetId=asset_id, enviada=_ahora())
+        _guardar()
+
+
+def exportacion_pendiente(clave):
+    """Exportación registrada y aún no cerrada para la clave, o None."""
+    with _lock:
+        return _cargar()['exportaciones'].get(clave)
+
+
+def cerrar_exportacion(clave, estado):
+    """Quita la exportación de las pendientes; queda como paso de esta ejecución."""
+    with _lock:
+        exportacion = _cargar()['exportaciones'].pop(clave, None)
+        if exportacion is not None:
+            _journal['pasos'][f"exportacion:{clave}"] = dict(exportacion, estado=estado, terminado=_ahora())
+        _guardar()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Earth Engine Task Monitor
+Polls many export tasks with one getTaskStatus call per tick, adapting the
+interval to their state, and fires a callback as soon as each task finishes.
+Note: Earth Engine must be initialized BEFORE calling functions in this module
+
+Usage:
+    python task_monitor.py sm_tasks.json lst_tasks.json
+    python task_monitor.py TASK_ID [TASK_ID ...] --max-wait 3600 --publicar
+"""
+
+import asyncio
+import inspect
+import json
+import os
+import time
+
+import ee
+
+import ee_session
+
+ESTADOS_FINALES = {'COMPLETED', 'FAILED', 'CANCELLED', 'UNKNOWN'}
+ESTADOS_EN_COLA = {'UNSUBMITTED', 'READY'}
+
+# Polling intervals (seconds)
+INTERVALO_RECIEN_INICIADA = 5   # a task switched to RUNNING less than RECIEN_INICIADA s ago
+INTERVALO_RUNNING = 15
+INTERVALO_EN_COLA = 60
+RECIEN_INICIADA = 120
+
+
+def cargar_tareas(path):
+    """Lee un archivo tipo sm_tasks.json / lst_tasks.json: lista de {'taskId', 'assetPath', ...}."""
+    with open(path) as f:
+        tareas = json.load(f)
+    return [t for t in tareas if t.get('taskId')]
+
+
+def consultar_estados(task_ids):
+    """Estado de todas las tareas en una sola llamada a getTaskStatus (reintentada si el error es transitorio)."""
+    return {status['id']: status for status in ee_session.llamar(ee.data.getTaskStatus, list(task_ids))}
+
+
+def siguiente_intervalo(estados, inicio_running, intervalo_max=None):
+    """
+    Intervalo hasta el próximo tick según los estados pendientes:
+    corto si alguna tarea acaba de pasar a RUNNING, medio si alguna corre,
+    largo si todas siguen en cola.
+    """
+    ahora = time.time()
+    pendientes = [s for s in estados.values() if s.get('state') not in ESTADOS_FINALES]
+    if any(s.get('state') == 'RUNNING' and ahora - inicio_running.get(s['id'], ahora) < RECIEN_INICIADA
+           for s in pendientes):
+        intervalo = INTERVALO_RECIEN_INICIADA
+    elif any(s.get('state') == 'RUNNING' for s in pendientes):
+        intervalo = INTERVALO_RUNNING
+    else:
+        intervalo = INTERVALO_EN_COLA
+    if intervalo_max is not None:
+        intervalo = min(intervalo, intervalo_max)
+    return intervalo
+
+
+async def _llamar_callback(callback, task_id, status):
+    try:
+        resultado = callback(task_id, status)
+        if inspect.isawaitable(resultado):
+            await resultado
+    except Exception as e:
+        print(f"❌ Callback error for task {task_id}: {e}")
+
+
+async def monitorear(task_ids, callbacks=None, al_terminar=None, max_wait=1800, intervalo_max=None):
+    """
+    Monitorea varias tareas a la vez.
+
+    callbacks: dict task_id -> callable(task_id, status), llamado al terminar esa tarea.
+    al_terminar: callable(task_id, status) para las tareas sin callback propio.
+    Los callables pueden ser funciones normales o corutinas.
+    Retorna {task_id: último status}; las tareas que no terminaron quedan con su último estado.
+    """
+    callbacks = callbacks or {}
+    pendientes = list(dict.fromkeys(task_ids))
+    estados = {}
+    inicio_running = {}
+    errores_seguidos = 0
+    start_time = time.time()
+
+    print(f"🔍 Monitoring {len(pendientes)} task(s)...")
+
+    while pendientes and time.time() - start_time < max_wait:
+        try:
+            nuevos = await asyncio.to_thread(consultar_estados, pendientes)
+            errores_seguidos = 0
+        except Exception as e:
+            # Retries already ran in ee_session; only transient errors keep the polling alive
+            if not ee_session.es_transitorio(e):
+                raise
+            errores_seguidos += 1
+            espera = min(INTERVALO_EN_COLA, INTERVALO_RECIEN_INICIADA * 2 ** errores_seguidos)
+            print(f"Error checking task status: {e}")
+            await asyncio.sleep(espera)
+            continue
+
+        terminadas = []
+        for task_id in pendientes:
+            status = nuevos.get(task_id, {'id': task_id, 'state': 'UNKNOWN'})
+            state = status.get('state')
+            previo = estados.get(task_id, {}).get('state')
+            estados[task_id] = status
+
+            if state != previo:
+                print(f"⏳ Task {task_id}: {state} ({time.strftime('%H:%M:%S')})")
+                if state == 'RUNNING':
+                    inicio_running[task_id] = time.time()
+
+            if state in ESTADOS_FINALES:
+                terminadas.append(task_id)
+                if state == 'FAILED':
+                    print(f"❌ Task {task_id} failed: {status.get('error_message', 'No error message')}")
+                elif state == 'COMPLETED':
+                    print(f"✅ Task {task_id} completed after {int(time.time() - start_time)} seconds")
+                callback = callbacks.get(task_id, al_terminar)
+                if callback is not None:
+                    await _llamar_callback(callback, task_id, status)
+
+        pendientes = [t for t in pendientes if t not in terminadas]
+        if pendientes:
+            await asyncio.sleep(siguiente_intervalo(estados, inicio_running, intervalo_max))
+
+    if pendientes:
+        print(f"⚠️ Timed out after waiting {max_wait} seconds: {len(pendientes)} task(s) still pending")
+    return estados
+
+
+def esperar_tareas(task_ids, callbacks=None, al_terminar=None, max_wait=1800, intervalo_max=None):
+    """Versión bloqueante de monitorear() para código sin event loop."""
+    return asyncio.run(monitorear(task_ids, callbacks, al_terminar, max_wait, intervalo_max))
+
+
+async def monitorear_con_cupo(envios, max_en_vuelo=4, max_wait=7200, intervalo_max=None):
+    """
+    Envía tareas sin superar max_en_vuelo pendientes a la vez (cupo de tareas concurrentes de EE).
+
+    envios: lista de (clave, enviar), donde enviar() inicia una tarea y la retorna.
+    Cada vez que una tarea termina se envía la siguiente. Retorna {clave: último status};
+    las que no alcanzaron a enviarse o a terminar quedan con estado 'UNSUBMITTED' o su último estado.
+    """
+    pendientes = list(envios)
+    en_vuelo = {}   # task_id -> clave
+    estados = {}    # task_id -> status, para siguiente_intervalo
+    resultado = {clave: {'state': 'UNSUBMITTED'} for clave, _ in pendientes}
+    inicio_running = {}
+    errores_seguidos = 0
+    start_time = time.time()
+
+    print(f"🔍 Submitting {len(pendientes)} task(s), at most {max_en_vuelo} in flight...")
+
+    while (pendientes or en_vuelo) and time.time() - start_time < max_wait:
+        while pendientes and len(en_vuelo) < max_en_vuelo:
+            clave, enviar = pendientes.pop(0)
+            try:
+                task = await asyncio.to_thread(enviar)
+            except Exception as e:
+                print(f"❌ Could not submit {clave}: {e}")
+                resultado[clave] = {'state': 'FAILED', 'error_message': str(e)}
+                continue
+            en_vuelo[task.id] = clave
+            resultado[clave] = {'id': task.id, 'state': 'READY'}
+            print(f"🚀 Submitted {clave} as task {task.id} ({len(en_vuelo)} in flight)")
+
+        if not en_vuelo:
+            break
+
+        try:
+            nuevos = await asyncio.to_thread(consultar_estados, en_vuelo)
+            errores_seguidos = 0
+        except Exception as e:
+            if not ee_session.es_transitorio(e):
+                raise
+            errores_seguidos += 1
+            print(f"Error checking task status: {e}")
+            await asyncio.sleep(min(INTERVALO_EN_COLA, INTERVALO_RECIEN_INICIADA * 2 ** errores_seguidos))
+            continue
+
+        terminadas = 0
+        for task_id, clave in list(en_vuelo.items()):
+            status = nuevos.get(task_id, {'id': task_id, 'state': 'UNKNOWN'})
+            state = status.get('state')
+            if state != estados.get(task_id, {}).get('state'):
+                print(f"⏳ {clave} ({task_id}): {state} ({time.strftime('%H:%M:%S')})")
+                if state == 'RUNNING':
+                    inicio_running[task_id] = time.time()
+            estados[task_id] = status
+            resultado[clave] = status
+
+            if state in ESTADOS_FINALES:
+                terminadas += 1
+                del en_vuelo[task_id]
+                del estados[task_id]
+                if state == 'FAILED':
+                    print(f"❌ {clave} failed: {status.get('error_message', 'No error message')}")
+
+        # A freed slot is refilled right away; otherwise wait for the next tick
+        if en_vuelo and not (terminadas and pendientes):
+            await asyncio.sleep(siguiente_intervalo(estados, inicio_running, intervalo_max))
+
+    if pendientes or en_vuelo:
+        print(f"⚠️ Timed out after waiting {max_wait} seconds: "
+              f"{len(en_vuelo)} task(s) in flight, {len(pendientes)} not submitted")
+    return resultado
+
+
+def ejecutar_con_cupo(envios, max_en_vuelo=4, max_wait=7200, intervalo_max=None):
+    """Versión bloqueante de monitorear_con_cupo()."""
+    return asyncio.run(monitorear_con_cupo(envios, max_en_vuelo, max_wait, intervalo_max))
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Monitor Earth Engine export tasks')
+    parser.add_argument('fuentes', nargs='+',
+                        help='task IDs or task JSON files (sm_tasks.json, lst_tasks.json)')
+    parser.add_argument('--max-wait', type=int, default=1800, help='seconds before giving up')
+    parser.add_argument('--publicar', action='store_true',
+                        help='make each assetPath public as soon as its task completes')
+    args = parser.parse_args(argv)
+
+    import publish_asset
+    import update_dashboard
+
+    update_dashboard.initialize_earth_engine()
+
+    destinos = {}
+    for fuente in args.fuentes:
+        if os.path.isfile(fuente):
+            for tarea in cargar_tareas(fuente):
+                destinos[tarea['taskId']] = tarea.get('assetPath')
+        else:
+            destinos[fuente] = None
+
+    def publicar(task_id, status):
+        if status.get('state') == 'COMPLETED' and destinos.get(task_id):
+            publish_asset.publicar_asset(destinos[task_id])
+
+    estados = esperar_tareas(destinos, al_terminar=publicar if args.publicar else None,
+                             max_wait=args.max_wait)
+    fallidas = [t for t in destinos if estados.get(t, {}).get('state') != 'COMPLETED']
+    print(f"\nCompleted: {len(destinos) - len(fallidas)}/{len(destinos)}")
+    return 1 if fallidas else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -5,109 +5,209 @@ Processes soil moisture results and makes assets public
 Runs after SM exports complete
 """
 
-import ee
 import sys
 import os
-import json
+import argparse
+
+import ee_session
 
 def initialize_earth_engine():
-    """Initialize Earth Engine with service account or user credentials"""
-    print("\nInitializing Earth Engine...")
-    
-    # GitHub Actions: use service account
-    if os.getenv('EE_PRIVATE_KEY'):
-        try:
-            key_data = os.getenv('EE_PRIVATE_KEY')
-            if not key_data:
-                raise ValueError('EE_PRIVATE_KEY is empty')
-            
-            # Parse the JSON to get service account info
-            service_account_info = json.loads(key_data)
-            
-            # Use ee.ServiceAccountCredentials (correct Python API method)
-            credentials = ee.ServiceAccountCredentials(
-                email=service_account_info['client_email'],
-                key_data=key_data
-            )
-            ee.Initialize(credentials)
-            print(f"✓ Initialized with service account: {service_account_info['client_email']}\n")
-            return
-        except json.JSONDecodeError as e:
-            print(f"❌ Failed to parse EE_PRIVATE_KEY as JSON: {e}")
-            sys.exit(1)
-        except Exception as e:
-            print(f"❌ Service account initialization failed: {e}")
-            sys.exit(1)
-    
-    # Local development: use default credentials
-    try:
-        ee.Initialize(project='ee-corfobbppciren2023')
-        print("✓ Initialized with user credentials\n")
-    except Exception as e:
-        print("❌ Please authenticate first:")
-        print("  python -c \"import ee; ee.Authenticate()\"")
-        print(f"\nError: {e}")
-        sys.exit(1)
+    """Initialize Earth Engine with service account or user credentials (shared session, see ee_session)"""
+    ee_session.inicializar()
 
 # Import the processing modules AFTER defining initialize function
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import chart_data
 import hs_update
 import publish_asset
+import regiones
+import rpc_profile
+import run_journal
+
+def main(full=False, compactar=False, perfil=None, trace=None, ruta_regiones=None, nombres_regiones=None,
+         graficos=True, dir_graficos=None):
+    """
+    Main entry point for dashboard update
+    full=True re-checks every asset ACL instead of only assets newer than the watermark
+    compactar=True merges the metrics deltas into a new base table even below the threshold
+    perfil/trace: paths for the RPC profile JSON and Chrome trace (profiling is off if perfil is None)
+    ruta_regiones/nombres_regiones: region config file and optional subset of region names
+    graficos/dir_graficos: write the static per-subbasin chart files (default dir chart_data.DIR_SALIDA)
+    """
+    if perfil:
+        rpc_profile.activar()
+    try:
+        actualizar(full=full, compactar=compactar, ruta_regiones=ruta_regiones, nombres_regiones=nombres_regiones,
+                   graficos=graficos, dir_graficos=dir_graficos)
+    finally:
+        if perfil:
+            rpc_profile.escribir_perfil(perfil, trace)
+
+def procesar_region(region, compactar=False):
+    """Steps 1 and 1b for one region (runs in its own thread, sharing the EE session)"""
+    resumen = {'region': region.nombre, 'status': 'ERROR', 'segundos': {}}
+
+    # Rerun of the same job: this region already finished in a previous attempt
+    paso = run_journal.paso_completado(f'procesamiento:{region.nombre}')
+    if paso is not None:
+        print(f"\n⏭️  [{region.nombre}] Already processed in this run ({paso['terminado']}), skipping")
+        resumen.update({k: v for k, v in paso.items() if k != 'terminado'})
+        return resumen
+
+    inicio = time.time()
+    try:
+        with rpc_profile.etapa(f'procesamiento:{region.nombre}'):
+            resultado = hs_update.main(region=region)
+        print(f"\n✓ [{region.nombre}] Processing completed with status: {resultado['status']}")
+        
+        if resultado.get('taskCompleted'):
+            print(f"✓ [{region.nombre}] Export task completed successfully")
+            print(f"  Asset: {resultado.get('assetPath', 'N/A')}")
+        else:
+            print(f"⚠️  [{region.nombre}] Task did not complete or no new data to process")
+        resumen.update({
+            'status': resultado['status'],
+            'taskCompleted': resultado.get('taskCompleted'),
+            'assetPath': resultado.get('assetPath'),
+            'totalFechas': resultado.get('totalFechas', 0),
+            'ultimaEjecucion': resultado.get('ultimaEjecucion'),
+        })
+    except Exception as e:
+        print(f"\n❌ [{region.nombre}] Error processing soil moisture data: {e}")
+        resumen['error'] = str(e)
+        return resumen
+    finally:
+        resumen['segundos']['procesamiento'] = round(time.time() - inicio, 1)
+    
+    # Step 1b: Merge accumulated deltas into a new base table
+    inicio = time.time()
+    compactacion_ok = True
+    try:
+        with rpc_profile.etapa(f'compactacion:{region.nombre}'):
+            if compactar or hs_update.necesita_compactacion(region):
+                print(f"\n📦 [{region.nombre}] Compacting metrics deltas")
+                compactacion = hs_update.compactar_deltas(region=region)
+                resumen['compactado'] = True
+                compactacion_ok = compactacion is None or bool(compactacion.get('taskCompleted'))
+    except Exception as e:
+        print(f"\n❌ [{region.nombre}] Error compacting metrics deltas: {e}")
+        # Don't fail the region - the deltas stay readable until the next compaction
+        compactacion_ok = False
+    resumen['segundos']['compactacion'] = round(time.time() - inicio, 1)
 
-def main():
-    """Main entry point for dashboard update"""
+    # Nothing left to resume for this region (a still-running export is reattached on rerun)
+    if compactacion_ok and (resumen['status'] == 'NO_PROCESSING_NEEDED' or resumen.get('taskCompleted')):
+        run_journal.marcar_paso(f'procesamiento:{region.nombre}', **{
+            k: v for k, v in resumen.items() if k != 'segundos'
+        })
+    return resumen
+
+def actualizar(full=False, compactar=False, ruta_regiones=None, nombres_regiones=None,
+               graficos=True, dir_graficos=None):
+    """Dashboard update steps (see main)"""
     
     print("=" * 60)
     print("SOIL MOISTURE DASHBOARD UPDATE")
     print("=" * 60)
     
-    # Initialize Earth Engine FIRST
+    # Initialize Earth Engine FIRST (one session shared by every region)
     initialize_earth_engine()
     
-    # Asset folders to process
-    folder_hs = 'projects/ee-corfobbppciren2023/assets/HS'
-    folder_dashboard = 'projects/ee-corfobbppciren2023/assets/MetricsHSTransposed'
+    lista_regiones = regiones.cargar_regiones(ruta_regiones, nombres_regiones)
     
-    # Step 1: Process soil moisture data and create metrics
+    # Step 1: Process soil moisture data and create metrics, all regions at once
     print("=" * 60)
-    print("STEP 1: PROCESSING SOIL MOISTURE DATA")
+    print(f"STEP 1: PROCESSING SOIL MOISTURE DATA ({', '.join(r.nombre for r in lista_regiones)})")
     print("=" * 60)
     
-    try:
-        resultado = hs_update.main()
-        print(f"\n✓ Processing completed with status: {resultado['status']}")
-        
-        if resultado.get('taskCompleted'):
-            print(f"✓ Export task completed successfully")
-            print(f"  Asset: {resultado.get('assetPath', 'N/A')}")
-        else:
-            print(f"⚠️  Task did not complete or no new data to process")
-            
-    except Exception as e:
-        print(f"\n❌ Error processing soil moisture data: {e}")
-        sys.exit(1)
+    with ThreadPoolExecutor(max_workers=len(lista_regiones)) as pool:
+        resumenes = list(pool.map(lambda region: procesar_region(region, compactar), lista_regiones))
     
     # Step 2: Make assets public
     print("\n" + "=" * 60)
     print("STEP 2: MAKING ASSETS PUBLIC")
     print("=" * 60)
     
-    folders_to_publish = [folder_hs, folder_dashboard]
+    folders_to_publish = list(dict.fromkeys(
+        folder
+        for region in lista_regiones
+        for folder in (region.folder_hs, region.folder_metrics, region.folder_deltas,
+                       region.folder_climatologia)
+    ))
+    print("Mode: full sweep" if full else "Mode: incremental (assets newer than last watermark)")
     
     for folder in folders_to_publish:
         print(f"\nProcessing folder: {folder}")
+        if run_journal.paso_completado(f'publicacion:{folder}'):
+            print("⏭️  Already published in this run, skipping")
+            continue
         try:
-            publish_asset.main(folder)
+            with rpc_profile.etapa('publicacion'):
+                resumen_publicacion = publish_asset.main(folder, full=full)
+            # Only a clean pass is journaled, so a resumed run retries the folder
+            if resumen_publicacion is None or resumen_publicacion['error'] != 0:
+                errores = 'listing failed' if resumen_publicacion is None else f"{resumen_publicacion['error']} errors"
+                print(f"❌ Assets in {folder} not all public ({errores}); will retry on the next run")
+                continue
+            run_journal.marcar_paso(f'publicacion:{folder}')
             print(f"✓ Assets in {folder} are now public")
         except Exception as e:
             print(f"❌ Error making assets public in {folder}: {e}")
             # Don't exit - continue with other folders
     
+    # Step 3: Static chart data (one gzip JSON per subbasin)
+    if graficos:
+        print("\n" + "=" * 60)
+        print("STEP 3: WRITING STATIC CHART DATA")
+        print("=" * 60)
+        
+        for region, resumen in zip(lista_regiones, resumenes):
+            try:
+                with rpc_profile.etapa(f'graficos:{region.nombre}'):
+                    indice = chart_data.escribir_graficos(region, dir_graficos)
+                resumen['seriesGraficos'] = len(indice['subcuencas'])
+            except Exception as e:
+                print(f"❌ [{region.nombre}] Error writing chart data: {e}")
+                # Don't fail the run - the dashboard still reads the table from Earth Engine
+    
+    fallidas = [r for r in resumenes if 'error' in r]
+    
     print("\n" + "=" * 60)
-    print("DASHBOARD UPDATE COMPLETED SUCCESSFULLY")
+    print("DASHBOARD UPDATE COMPLETED" + (" WITH ERRORS" if fallidas else " SUCCESSFULLY"))
     print("=" * 60)
-    print(f"Total dates processed: {resultado.get('totalFechas', 0)}")
-    print(f"Last execution: {resultado.get('ultimaEjecucion', 'N/A')}")
+    for r in resumenes:
+        tiempos = ', '.join(f"{etapa} {segundos}s" for etapa, segundos in r['segundos'].items())
+        print(f"{r['region']}: {r['status']} - {r.get('totalFechas', 0)} date(s) processed ({tiempos})")
+        if 'error' in r:
+            print(f"  Error: {r['error']}")
+    print(f"Last execution: {max((r.get('ultimaEjecucion') or '' for r in resumenes), default='') or 'N/A'}")
     print("=" * 60)
+    
+    if fallidas:
+        sys.exit(1)
+    return resumenes
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Soil moisture dashboard update')
+    parser.add_argument('--full', action='store_true',
+                        help='re-check the ACL of every asset, not only new ones')
+    parser.add_argument('--compactar', action='store_true',
+                        help='merge the metrics deltas into a new base table')
+    parser.add_argument('--profile', default=os.getenv('HS_RPC_PROFILE'),
+                        help='write a JSON profile of Earth Engine round-trips to this path')
+    parser.add_argument('--trace', default=os.getenv('HS_RPC_TRACE'),
+                        help='also write a Chrome trace (needs --profile)')
+    parser.add_argument('--regiones', default=None,
+                        help='region config file (JSON or YAML, default regiones.json or HS_REGIONES)')
+    parser.add_argument('--region', action='append', dest='nombres_regiones',
+                        help='only process this region (repeatable)')
+    parser.add_argument('--chart-data', dest='dir_graficos', default=None,
+                        help='directory for the static chart files (default chart_data or HS_CHART_DATA_DIR)')
+    parser.add_argument('--no-chart-data', action='store_true',
+                        help="don't write the static chart files")
+    args = parser.parse_args()
+    main(full=args.full, compactar=args.compactar, perfil=args.profile, trace=args.trace,
+         ruta_regiones=args.regiones, nombres_regiones=args.nombres_regiones,
+         graficos=not args.no_chart_data, dir_graficos=args.dir_graficos)
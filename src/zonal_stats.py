@@ -0,0 +1,529 @@
+#!/usr/bin/env python3
+"""
+Zonal Statistics for Soil Moisture Metrics
+Computes subbasin means for the transposed metrics table
+Note: Earth Engine must be initialized BEFORE calling functions in this module
+"""
+
+import os
+import time
+
+import ee
+
+import ajustes_zonales
+
+# Fixed scale of the former reductions; reference for comparar_escalas()
+ESCALA = 30
+MAX_PIXELS = 1e13
+
+# 'nativa' reduces on the image's own grid (projection().nominalScale()); the weighted
+# reducers give each edge pixel its area fraction inside the zone, so no 30 m resampling.
+# 'fija' resamples to ESCALA as before.
+MODO_ESCALA = os.getenv('HS_ZONAL_ESCALA', 'nativa')
+
+# Property holding the joined reduction while it is copied onto the table
+PROPIEDAD_ZONAL = 'zonal'
+
+# Statistic -> reducer; each one's output is named like the statistic, so a
+# combined reducer yields '<fecha>_<stat>' outputs after forEach(fechas)
+REDUCTORES = {
+    'mean': lambda: ee.Reducer.mean(),
+    'median': lambda: ee.Reducer.median(),
+    'stdDev': lambda: ee.Reducer.stdDev(),
+    'p10': lambda: ee.Reducer.percentile([10]),
+    'p90': lambda: ee.Reducer.percentile([90]),
+    'count': lambda: ee.Reducer.count(),
+}
+SOLO_MEDIA = ('mean',)
+
+# 'Region' is not reduced as a zone over the whole footprint: its value is combined
+# from per-zone partial sums (weighted sum, weight, sum of squares) of the subbasins
+# plus ZONA_RESTO, the part of the footprint outside every subbasin, all in the same
+# pass. Exact as long as the subbasins do not overlap each other.
+ZONA_RESTO = 'Resto'
+# Statistics that can be combined that way; others (median, percentiles) keep a 'Region' zone
+DERIVABLES = ('mean', 'count', 'stdDev')
+SUFIJO_SUMA = '__suma'
+SUFIJO_PESO = '__peso'
+SUFIJO_CUADRADOS = '__cuadrados'
+
+
+def parametros_escala(image, modo=None):
+    """Argumentos de escala para reduceRegion(s): grilla nativa de la imagen (primera banda) o ESCALA."""
+    if (modo or MODO_ESCALA) == 'fija':
+        return {'scale': ESCALA}
+    proyeccion = ee.Image(image).select(0).projection()
+    return {'crs': proyeccion, 'scale': proyeccion.nominalScale()}
+
+
+def reductor_combinado(estadisticas=SOLO_MEDIA):
+    """Un solo reductor con todas las estadísticas (sharedInputs: una pasada por los píxeles)."""
+    desconocidas = [e for e in estadisticas if e not in REDUCTORES]
+    if desconocidas:
+        raise ValueError(f"Unknown statistics {desconocidas}; available: {list(REDUCTORES)}")
+    reductor = REDUCTORES[estadisticas[0]]()
+    for estadistica in estadisticas[1:]:
+        reductor = reductor.combine(REDUCTORES[estadistica](), sharedInputs=True)
+    return reductor
+
+
+def columna(fecha, estadistica):
+    """Columna de la tabla: 'YYYY-MM' para la media (como siempre), 'YYYY-MM_<stat>' para el resto."""
+    return fecha if estadistica == 'mean' else f"{fecha}_{estadistica}"
+
+
+def columnas_estadisticas(fechas, estadisticas=SOLO_MEDIA):
+    """
+    Pares (salida del reductor, columna de la tabla) para reductor_combinado(...).forEach(fechas).
+    Con una sola estadística forEach deja los nombres tal cual ('YYYY-MM').
+    """
+    pares = []
+    for fecha in fechas:
+        for estadistica in estadisticas:
+            salida = fecha if len(estadisticas) == 1 else f"{fecha}_{estadistica}"
+            pares.append((salida, columna(fecha, estadistica)))
+    return pares
+
+
+def reducir_partes(imagen, zonas, reductor, escala, niveles=None):
+    """
+    reduceRegions over the zones, as a list of (area factor, FeatureCollection). With niveles
+    ({COD_SUBC: level} from ajustes_zonales) the escalated zones are reduced in one call per
+    level with that level's tileScale and scale, the rest in one plain call. The area factor
+    (factorEscala**2) is how many pixels of the base grid one pixel of the part stands for:
+    its weighted sums and counts are multiplied by it before adding them up (sumar_partes).
+    """
+    grupos = {nivel: cods for nivel, cods in ajustes_zonales.agrupar(niveles or {}).items() if nivel}
+    if not grupos:
+        return [(1, imagen.reduceRegions(collection=zonas, reducer=reductor, **escala))]
+
+    zonas = ee.FeatureCollection(zonas)
+    escaladas = [cod for cods in grupos.values() for cod in cods]
+    partes = [(1, imagen.reduceRegions(
+        collection=zonas.filter(ee.Filter.inList('COD_SUBC', escaladas).Not()), reducer=reductor, **escala
+    ))]
+    for nivel, cods in sorted(grupos.items()):
+        partes.append((ajustes_zonales.NIVELES[nivel]['factorEscala'] ** 2, imagen.reduceRegions(
+            collection=zonas.filter(ee.Filter.inList('COD_SUBC', cods)), reducer=reductor,
+            **ajustes_zonales.parametros(nivel, escala)
+        )))
+    return partes
+
+
+def unir_partes(partes):
+    """Las partes de reducir_partes en una sola colección (una feature por zona)."""
+    if len(partes) == 1:
+        return partes[0][1]
+    return ee.FeatureCollection([fc for _, fc in partes]).flatten()
+
+
+def reducir_regiones(imagen, zonas, reductor, escala, niveles=None):
+    """reduceRegions over the zones with their per-zone settings (reducir_partes), merged."""
+    return unir_partes(reducir_partes(imagen, zonas, reductor, escala, niveles))
+
+
+def sumar_partes(partes, propiedad):
+    """Suma de propiedad sobre las zonas de todas las partes, en píxeles de la grilla base (ee.Number)."""
+    total = None
+    for factor, fc in partes:
+        suma = ee.Number(fc.aggregate_sum(propiedad))
+        if factor != 1:
+            suma = suma.multiply(factor)
+        total = suma if total is None else total.add(suma)
+    return total
+
+
+def region_derivable(estadisticas=SOLO_MEDIA):
+    """True si el valor de 'Region' de todas las estadísticas sale de sumas parciales por zona."""
+    return all(e in DERIVABLES for e in estadisticas)
+
+
+def zona_extra(estadisticas=SOLO_MEDIA):
+    """Zona reducida además de las subcuencas: ZONA_RESTO o, si no es derivable, 'Region'."""
+    return ZONA_RESTO if region_derivable(estadisticas) else 'Region'
+
+
+def bandas_parciales(imagen, bandas, cuadrados=False):
+    """
+    Las bandas como bloques de bandas parciales: el valor, 1 donde hay dato (su suma ponderada
+    es el peso de la zona) y, con cuadrados, el valor al cuadrado. Una operación por bloque,
+    no por banda. Retorna (imagen, nombres de las bandas).
+    """
+    valores = ee.Image(imagen).select(list(bandas))
+    bloques = [(valores, SUFIJO_SUMA), (valores.multiply(0).add(1), SUFIJO_PESO)]
+    if cuadrados:
+        bloques.append((valores.pow(2), SUFIJO_CUADRADOS))
+    partes, nombres = [], []
+    for bloque, sufijo in bloques:
+        renombradas = [f"{banda}{sufijo}" for banda in bandas]
+        partes.append(bloque.rename(renombradas))
+        nombres += renombradas
+    return ee.Image.cat(partes), nombres
+
+
+def nombre_parcial(banda, sufijo):
+    """Nombre de la banda parcial; en el cliente si banda es str, si no server-side."""
+    return f"{banda}{sufijo}" if isinstance(banda, str) else ee.String(banda).cat(sufijo)
+
+
+def media_combinada(partes, banda):
+    """Media ponderada de banda sobre todas las zonas (reducir_partes), desde sus sumas parciales (None sin datos)."""
+    peso = sumar_partes(partes, nombre_parcial(banda, SUFIJO_PESO))
+    suma = sumar_partes(partes, nombre_parcial(banda, SUFIJO_SUMA))
+    return ee.Algorithms.If(peso.gt(0), suma.divide(peso), None)
+
+
+def con_region(zonales, valores_region):
+    """Las zonas sin ZONA_RESTO más una feature 'Region' con valores_region."""
+    region = ee.Feature(None, dict(valores_region, COD_SUBC='Region'))
+    return zonales.filter(ee.Filter.neq('COD_SUBC', ZONA_RESTO)).merge(ee.FeatureCollection([region]))
+
+
+def imagen_y_reductor(imagen, fechas, estadisticas=SOLO_MEDIA):
+    """
+    Imagen y reductor de reducir_estadisticas: las estadísticas sobre las bandas fechas y,
+    si 'Region' es derivable, las sumas parciales en la misma pasada (sharedInputs=False:
+    cada reductor toma sus propias bandas).
+    """
+    reductor = reductor_combinado(estadisticas).forEach(fechas)
+    if not region_derivable(estadisticas):
+        return imagen, reductor
+    parciales, nombres = bandas_parciales(imagen, fechas, cuadrados='stdDev' in estadisticas)
+    return (
+        ee.Image.cat([ee.Image(imagen).select(fechas), parciales]),
+        reductor.combine(ee.Reducer.sum().forEach(nombres), sharedInputs=False)
+    )
+
+
+def reducir_estadisticas(imagen, zonas, fechas, estadisticas=SOLO_MEDIA, escala=None, niveles=None):
+    """
+    One reduceRegions over an image with one band per date, every statistic in the
+    same pass. Returns property-only features with COD_SUBC and the table columns.
+    zonas: zonas_reduccion(...) for the same estadisticas ('Region' is combined from the
+    partial sums of every zone when the statistics allow it)
+    escala: parametros_escala(...) of the source images (default: the image's own grid)
+    niveles: per-zone settings for reducir_regiones
+    """
+    pares = columnas_estadisticas(fechas, estadisticas)
+    escala = escala or parametros_escala(imagen)
+    seleccion = (['COD_SUBC'] + [s for s, _ in pares], ['COD_SUBC'] + [c for _, c in pares], False)
+    imagen, reductor = imagen_y_reductor(imagen, fechas, estadisticas)
+    partes = reducir_partes(imagen, zonas, reductor, escala, niveles)
+    zonales = unir_partes(partes)
+    if not region_derivable(estadisticas):
+        return zonales.select(*seleccion)
+
+    # Zones reduced at a coarser scale (ajustes_zonales) count in base-grid pixels
+    valores_region = {}
+    for fecha in fechas:
+        media = media_combinada(partes, fecha)
+        for (salida, _), estadistica in zip(columnas_estadisticas([fecha], estadisticas), estadisticas):
+            if estadistica == 'mean':
+                valores_region[salida] = media
+            elif estadistica == 'count':
+                # Unweighted count: every pixel center falls in exactly one zone
+                valores_region[salida] = sumar_partes(partes, salida)
+            else:
+                # Weighted population variance: E[x^2] - mean^2
+                peso = sumar_partes(partes, f"{fecha}{SUFIJO_PESO}")
+                cuadrados = sumar_partes(partes, f"{fecha}{SUFIJO_CUADRADOS}")
+                valores_region[salida] = ee.Algorithms.If(
+                    peso.gt(0), cuadrados.divide(peso).subtract(ee.Number(media).pow(2)).max(0).sqrt(), None
+                )
+    return con_region(zonales, valores_region).select(*seleccion)
+
+
+def preparar_mosaico(image):
+    """Mosaico de una imagen con su proyección original, recortado a su huella."""
+    projection = image.projection()
+    geometry = image.geometry()
+
+    return ee.ImageCollection([image]) \
+        .mosaic() \
+        .setDefaultProjection(projection) \
+        .clip(geometry)
+
+
+def zonas_con_region(region_geometry, subcuencas_filtradas):
+    """Subcuencas (solo COD_SUBC) más una zona 'Region' con la geometría dada."""
+    region = ee.Feature(region_geometry, {'COD_SUBC': 'Region'})
+    return ee.FeatureCollection(subcuencas_filtradas) \
+        .select(['COD_SUBC']) \
+        .merge(ee.FeatureCollection([region]))
+
+
+def zonas_con_resto(huella, subcuencas_filtradas):
+    """Subcuencas (solo COD_SUBC) más ZONA_RESTO: la parte de la huella fuera de todas ellas."""
+    subcuencas = ee.FeatureCollection(subcuencas_filtradas).select(['COD_SUBC'])
+    resto = ee.Geometry(huella).difference(subcuencas.geometry(), 1)
+    return subcuencas.merge(ee.FeatureCollection([ee.Feature(resto, {'COD_SUBC': ZONA_RESTO})]))
+
+
+def zonas_reduccion(huella, subcuencas_filtradas, estadisticas=SOLO_MEDIA):
+    """Zonas a reducir: subcuencas + ZONA_RESTO, o + 'Region' si sus estadísticas no son derivables."""
+    if region_derivable(estadisticas):
+        return zonas_con_resto(huella, subcuencas_filtradas)
+    return zonas_con_region(huella, subcuencas_filtradas)
+
+
+def reducir_zonas(mosaic_image, zonas, date_formatted, estadisticas=SOLO_MEDIA, modo_escala=None, niveles=None):
+    """
+    Single reduceRegions pass over every zone (zonas from zonas_reduccion).
+    Returns one property-only feature per subbasin plus 'Region' with COD_SUBC and the
+    date_formatted column (mean of the band means, same as the per-feature path).
+    With more statistics, they are all computed in that pass over the per-pixel band mean.
+    """
+    escala = parametros_escala(mosaic_image, modo_escala)
+    if tuple(estadisticas) != SOLO_MEDIA:
+        return reducir_estadisticas(
+            mosaic_image.reduce(ee.Reducer.mean()).rename(date_formatted), zonas, [date_formatted],
+            estadisticas, escala, niveles
+        )
+
+    band_names = mosaic_image.bandNames()
+    # Same partial sums as bandas_parciales, with the band names known only server-side
+    sumas = band_names.map(lambda banda: ee.String(banda).cat(SUFIJO_SUMA))
+    pesos = band_names.map(lambda banda: ee.String(banda).cat(SUFIJO_PESO))
+    imagen = ee.Image.cat([mosaic_image, mosaic_image.rename(sumas), mosaic_image.multiply(0).add(1).rename(pesos)])
+    reductor = ee.Reducer.mean().forEach(band_names) \
+        .combine(ee.Reducer.sum().forEach(sumas.cat(pesos)), sharedInputs=False)
+
+    partes = reducir_partes(imagen, zonas, reductor, escala, niveles)
+    reducidas = unir_partes(partes)
+
+    def a_valor(feature):
+        medias = feature.toDictionary().select(band_names, True)
+        return ee.Feature(None, {
+            'COD_SUBC': feature.get('COD_SUBC'),
+            date_formatted: medias.values().reduce(ee.Reducer.mean())
+        })
+
+    region = band_names.map(lambda banda: media_combinada(partes, banda), True).reduce(ee.Reducer.mean())
+    return con_region(reducidas.map(a_valor), {date_formatted: region})
+
+
+def unir_valores(current_fc, valores, columnas):
+    """Copia las columnas de cada zona a la tabla transpuesta, uniendo por COD_SUBC."""
+    join = ee.Join.saveFirst(matchKey=PROPIEDAD_ZONAL, outer=True)
+    filtro = ee.Filter.equals(leftField='COD_SUBC', rightField='COD_SUBC')
+    unidas = join.apply(ee.FeatureCollection(current_fc), valores, filtro)
+
+    def copiar_valores(feature):
+        feature = ee.Feature(feature)
+        zonal = feature.get(PROPIEDAD_ZONAL)
+        sin_zonal = feature.select(feature.propertyNames().remove(PROPIEDAD_ZONAL))
+        return ee.Feature(ee.Algorithms.If(
+            zonal,
+            sin_zonal.copyProperties(ee.Feature(zonal), columnas),
+            sin_zonal
+        ))
+
+    return unidas.map(copiar_valores)
+
+
+def promedios_batch(mosaic_image, subcuencas_filtradas, current_fc, date_formatted, estadisticas=SOLO_MEDIA,
+                    niveles=None):
+    """Todas las medias (y estadísticas) de un mes en un solo reduceRegions, unidas a la tabla transpuesta."""
+    zonas = zonas_reduccion(mosaic_image.geometry(), subcuencas_filtradas, estadisticas)
+    valores = reducir_zonas(mosaic_image, zonas, date_formatted, estadisticas, niveles=niveles)
+    columnas = [c for _, c in columnas_estadisticas([date_formatted], estadisticas)]
+    return unir_valores(current_fc, valores, columnas)
+
+
+def apilar_meses(fechas_assets):
+    """
+    Stack several months into one image with one band per 'YYYY-MM'.
+    fechas_assets: list of (date_formatted, asset_id) tuples.
+    Returns the stacked image and the union of the monthly footprints.
+    """
+    mosaicos = [preparar_mosaico(ee.Image(asset_id)) for _, asset_id in fechas_assets]
+    bandas = [
+        mosaico.reduce(ee.Reducer.mean()).rename(fecha)
+        for (fecha, _), mosaico in zip(fechas_assets, mosaicos)
+    ]
+    huella = ee.FeatureCollection([ee.Feature(m.geometry()) for m in mosaicos]).union().geometry()
+    return ee.Image.cat(bandas), huella
+
+
+def promedios_apilados(fechas_assets, subcuencas_filtradas, current_fc, estadisticas=SOLO_MEDIA, niveles=None):
+    """
+    Todos los meses faltantes en un solo reduceRegions sobre la imagen apilada,
+    con todas las estadísticas pedidas en la misma pasada.
+    El grafo de exportación no crece en profundidad con el número de meses.
+    niveles: ajustes por zona (ajustes_zonales) de las zonas escaladas
+    """
+    fechas = [fecha for fecha, _ in fechas_assets]
+    stack, huella = apilar_meses(fechas_assets)
+    zonas = zonas_reduccion(huella, subcuencas_filtradas, estadisticas)
+
+    # Native grid of the source product (the stacked bands keep it)
+    escala = parametros_escala(ee.Image(fechas_assets[0][1]))
+    valores = reducir_estadisticas(stack, zonas, fechas, estadisticas, escala, niveles)
+    columnas = [c for _, c in columnas_estadisticas(fechas, estadisticas)]
+    return unir_valores(current_fc, valores, columnas)
+
+
+def sondear_apilados(region, fechas_assets, subcuencas_filtradas, codigos, estadisticas=SOLO_MEDIA):
+    """
+    Preflight de ajustes_zonales para las zonas dadas sobre la misma imagen apilada y el
+    mismo reductor que promedios_apilados. Retorna {COD_SUBC: nivel} de las zonas escaladas.
+    """
+    fechas = [fecha for fecha, _ in fechas_assets]
+    stack, huella = apilar_meses(fechas_assets)
+    zonas = zonas_reduccion(huella, subcuencas_filtradas, estadisticas)
+    escala = parametros_escala(ee.Image(fechas_assets[0][1]))
+    imagen, reductor = imagen_y_reductor(stack, fechas, estadisticas)
+    return ajustes_zonales.sondear(region, imagen, zonas, codigos, reductor, escala, MAX_PIXELS)
+
+
+def unir_valores_locales(current_fc, valores_por_codigo, fechas):
+    """
+    Copia valores calculados fuera de Earth Engine ({COD_SUBC: {fecha: valor}})
+    a la tabla transpuesta, con el mismo join por COD_SUBC.
+    """
+    valores = ee.FeatureCollection([
+        ee.Feature(None, dict(
+            {fecha: valor for fecha, valor in por_fecha.items() if fecha in fechas and valor is not None},
+            COD_SUBC=cod
+        ))
+        for cod, por_fecha in valores_por_codigo.items()
+    ])
+    return unir_valores(current_fc, valores, fechas)
+
+
+def promedios_por_feature(mosaic_image, subcuencas_filtradas, current_fc, date_formatted):
+    """
+    Ruta original: un reduceRegion por feature de la tabla (referencia para paridad).
+    Su 'Region' reduce la huella completa, así verificar_paridad contrasta el valor combinado
+    desde las sumas parciales de la ruta batch con la reducción directa.
+    """
+    escala = parametros_escala(mosaic_image)
+
+    def map_feature(feature):
+        cod = ee.String(feature.get('COD_SUBC'))
+        geom = ee.Algorithms.If(
+            cod.compareTo('Region').eq(0),
+            mosaic_image.geometry(),
+            subcuencas_filtradas.filter(ee.Filter.eq('COD_SUBC', cod)).first().geometry()
+        )
+
+        stats = mosaic_image.reduceRegion(
+            reducer=ee.Reducer.mean(),
+            geometry=geom,
+            maxPixels=MAX_PIXELS,
+            **escala
+        )
+
+        mean_value = stats.values().reduce(ee.Reducer.mean())
+        return feature.set(date_formatted, mean_value)
+
+    return ee.FeatureCollection(current_fc).map(map_feature)
+
+
+def verificar_paridad(asset_id, subcuencas_filtradas, current_fc, tolerancia=1e-6):
+    """
+    Compara la ruta batch con la ruta por feature para una imagen.
+    Una sola llamada getInfo; imprime las diferencias y retorna True si todas
+    quedan dentro de la tolerancia.
+    """
+    columna = 'paridad'
+    mosaic_image = preparar_mosaico(ee.Image(asset_id))
+    current_fc = ee.FeatureCollection(current_fc)
+
+    batch = promedios_batch(mosaic_image, subcuencas_filtradas, current_fc, columna)
+    referencia = promedios_por_feature(mosaic_image, subcuencas_filtradas, current_fc, columna)
+
+    def como_tabla(fc):
+        return fc.select(['COD_SUBC', columna], None, False)
+
+    resultado = ee.Dictionary({
+        'batch': como_tabla(batch),
+        'referencia': como_tabla(referencia)
+    }).getInfo()
+
+    def por_codigo(tabla):
+        return {f['properties'].get('COD_SUBC'): f['properties'].get(columna) for f in tabla['features']}
+
+    valores_batch = por_codigo(resultado['batch'])
+    valores_ref = por_codigo(resultado['referencia'])
+
+    ok = True
+    for cod, valor_ref in valores_ref.items():
+        valor_batch = valores_batch.get(cod)
+        if valor_batch is None or valor_ref is None:
+            iguales = valor_batch is None and valor_ref is None
+            diferencia = None
+        else:
+            diferencia = abs(valor_batch - valor_ref)
+            iguales = diferencia <= tolerancia * max(1.0, abs(valor_ref))
+        if not iguales:
+            ok = False
+        marca = '✓' if iguales else '❌'
+        print(f"  {marca} {cod}: batch={valor_batch} por_feature={valor_ref} diff={diferencia}")
+
+    print(f"{'✅' if ok else '❌'} Paridad batch vs por_feature para {asset_id}")
+    return ok
+
+
+def comparar_escalas(asset_id, subcuencas_filtradas, tolerancia=1e-3):
+    """
+    Paridad y speedup de la grilla nativa contra la reducción a ESCALA (30 m) para una imagen.
+    Una llamada getInfo por modo, cronometradas; imprime las diferencias por zona y
+    retorna (ok, speedup) con ok=True si todas quedan dentro de la tolerancia relativa.
+    """
+    columna = 'paridad'
+    mosaic_image = preparar_mosaico(ee.Image(asset_id))
+    zonas = zonas_reduccion(mosaic_image.geometry(), subcuencas_filtradas)
+
+    def medias(modo):
+        tabla = reducir_zonas(mosaic_image, zonas, columna, modo_escala=modo)
+        inicio = time.perf_counter()
+        info = tabla.getInfo()
+        segundos = time.perf_counter() - inicio
+        return {f['properties'].get('COD_SUBC'): f['properties'].get(columna) for f in info['features']}, segundos
+
+    valores_fija, segundos_fija = medias('fija')
+    valores_nativa, segundos_nativa = medias('nativa')
+
+    ok = True
+    for cod, valor_fija in valores_fija.items():
+        valor_nativa = valores_nativa.get(cod)
+        if valor_fija is None or valor_nativa is None:
+            iguales = valor_fija is None and valor_nativa is None
+            diferencia = None
+        else:
+            diferencia = abs(valor_nativa - valor_fija)
+            iguales = diferencia <= tolerancia * max(1.0, abs(valor_fija))
+        if not iguales:
+            ok = False
+        marca = '✓' if iguales else '❌'
+        print(f"  {marca} {cod}: {ESCALA}m={valor_fija} nativa={valor_nativa} diff={diferencia}")
+
+    speedup = segundos_fija / segundos_nativa if segundos_nativa > 0 else float('inf')
+    print(f"⏱️ {ESCALA} m: {segundos_fija:.1f} s, nativa: {segundos_nativa:.1f} s, speedup x{speedup:.1f}")
+    print(f"{'✅' if ok else '❌'} Paridad {ESCALA} m vs nativa para {asset_id}")
+    return ok, speedup
+
+
+if __name__ == '__main__':
+    # Parity checks:
+    #   python zonal_stats.py <image_asset_id> <metrics_table_id>   batch vs por_feature
+    #   python zonal_stats.py --escala <image_asset_id>              30 m vs native grid (+ speedup)
+    import sys
+
+    import hs_update
+    import update_dashboard
+
+    if len(sys.argv) != 3:
+        print("Uso: python zonal_stats.py <image_asset_id> <metrics_table_id>")
+        print("     python zonal_stats.py --escala <image_asset_id>")
+        sys.exit(2)
+
+    update_dashboard.initialize_earth_engine()
+    subcuencas_filtradas = ee.FeatureCollection(hs_update.SUBCUENCAS_ASSET) \
+        .filter(ee.Filter.inList('COD_SUBC', hs_update.SUBCUENCA_NOMBRES))
+    if sys.argv[1] == '--escala':
+        ok, _ = comparar_escalas(sys.argv[2], subcuencas_filtradas)
+    else:
+        ok = verificar_paridad(sys.argv[1], subcuencas_filtradas, ee.FeatureCollection(sys.argv[2]))
+    sys.exit(0 if ok else 1)
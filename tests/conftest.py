@@ -0,0 +1,41 @@
+"""
+Shared setup for the tests: src/ and benchmarks/ on sys.path and the benchmark's
+fake Earth Engine installed as `ee` before any pipeline module is imported.
+Numeric checks of the zonal reductions swap in ee_numerico per test.
+"""
+
+import os
+import sys
+import types
+
+import pytest
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, AQUI)
+sys.path.insert(0, os.path.join(AQUI, '..', 'benchmarks'))
+sys.path.insert(0, os.path.join(AQUI, '..', 'src'))
+
+import fake_ee  # noqa: E402
+
+fake_ee.instalar(fake_ee.Backend(latencia=0))
+
+
+@pytest.fixture
+def backend_pipeline(tmp_path):
+    """Benchmark scenario (HS images, metrics tables, climatology, one missing month) with instant tasks."""
+    import ajustes_zonales
+    import asset_catalog
+    import result_cache
+    import run_benchmarks
+    import run_journal
+
+    args = types.SimpleNamespace(latencia=0, duracion_cola=0, duracion_corrida=0, fraccion_publica=1.0,
+                                 hs=24, csvs=3)
+    backend = run_benchmarks.escenario(args, faltantes=1)
+    fake_ee.usar(backend)
+    # Local state of the run in tmp_path
+    asset_catalog.configurar()
+    run_journal.configurar(str(tmp_path / 'run_journal.json'))
+    result_cache.configurar(str(tmp_path / 'result_cache.sqlite'))
+    ajustes_zonales.configurar(str(tmp_path / 'zonal_settings.json'))
+    return backend
@@ -0,0 +1,529 @@
+"""
+Tiny numeric stand-in for the parts of `ee` used by zonal_stats.
+
+Everything is evaluated eagerly on a small grid of cells: an image is a set of
+bands (rows of values, None where masked) at a base pixel size, a geometry is the
+fraction of each cell it covers. reduceRegion(s) at a multiple of the base pixel
+size averages each block of cells into one coarser pixel, with weights like Earth
+Engine's: the fraction of that pixel inside the zone for weighted reducers, the
+pixel center for count. Enough to compare two reduction paths numerically.
+
+Usage (monkeypatch the module over the fake one):
+    monkeypatch.setattr(zonal_stats, 'ee', ee_numerico)
+    ee_numerico.registrar('HS/img', ee_numerico.imagen({'b1': filas}, huella))
+"""
+
+import math
+
+ASSETS = {}
+
+
+def registrar(asset_id, objeto):
+    ASSETS[asset_id] = objeto
+
+
+def reiniciar():
+    ASSETS.clear()
+
+
+def _v(x):
+    """Python value of a wrapped server-side object."""
+    if isinstance(x, (Number, String)):
+        return x.valor
+    if isinstance(x, List):
+        return [_v(e) for e in x.valores]
+    if isinstance(x, list):
+        return [_v(e) for e in x]
+    return x
+
+
+# ------------------------------------------------------------------ scalars
+class Number:
+    def __init__(self, valor):
+        self.valor = _v(valor)
+
+    def _op(self, otro, fn):
+        a, b = self.valor, _v(otro)
+        if a is None or b is None:
+            return Number(None)
+        return Number(fn(a, b))
+
+    def add(self, otro):
+        return self._op(otro, lambda a, b: a + b)
+
+    def subtract(self, otro):
+        return self._op(otro, lambda a, b: a - b)
+
+    def multiply(self, otro):
+        return self._op(otro, lambda a, b: a * b)
+
+    def divide(self, otro):
+        return self._op(otro, lambda a, b: a / b if b else None)
+
+    def pow(self, otro):
+        return self._op(otro, lambda a, b: a ** b)
+
+    def max(self, otro):
+        return self._op(otro, max)
+
+    def gt(self, otro):
+        return self._op(otro, lambda a, b: int(a > b))
+
+    def eq(self, otro):
+        return self._op(otro, lambda a, b: int(a == b))
+
+    def sqrt(self):
+        return Number(None if self.valor is None else math.sqrt(self.valor))
+
+    def getInfo(self):
+        return self.valor
+
+
+class String:
+    def __init__(self, valor):
+        self.valor = _v(valor)
+
+    def cat(self, otro):
+        return String(self.valor + _v(otro))
+
+    def compareTo(self, otro):
+        otro = _v(otro)
+        return Number((self.valor > otro) - (self.valor < otro))
+
+
+class List:
+    def __init__(self, valores):
+        self.valores = list(valores.valores if isinstance(valores, List) else valores)
+
+    def map(self, fn, dropNulls=False):
+        salida = [_v(fn(e)) for e in self.valores]
+        return List([e for e in salida if not (dropNulls and e is None)])
+
+    def cat(self, otra):
+        return List(self.valores + List(otra).valores)
+
+    def remove(self, valor):
+        return List([e for e in self.valores if e != _v(valor)])
+
+    def get(self, i):
+        return self.valores[_v(i)]
+
+    def size(self):
+        return Number(len(self.valores))
+
+    def reduce(self, reducer):
+        salida = reducer.aplicar([[(_v(e), 1.0, True) for e in self.valores if _v(e) is not None]])
+        return Number(next(iter(salida.values())))
+
+    def getInfo(self):
+        return _v(self)
+
+
+class Dictionary:
+    def __init__(self, valores):
+        self.valores = dict(valores.valores if isinstance(valores, Dictionary) else valores)
+
+    def select(self, claves, ignoreMissing=False):
+        claves = _v(claves)
+        if not ignoreMissing:
+            faltantes = [c for c in claves if c not in self.valores]
+            if faltantes:
+                raise KeyError(faltantes)
+        return Dictionary({c: self.valores[c] for c in claves if c in self.valores})
+
+    def values(self):
+        return List(list(self.valores.values()))
+
+    def get(self, clave):
+        return self.valores[_v(clave)]
+
+    def getInfo(self):
+        return {k: v.getInfo() if hasattr(v, 'getInfo') else _v(v) for k, v in self.valores.items()}
+
+
+class Algorithms:
+    @staticmethod
+    def If(condicion, verdadero, falso):
+        return verdadero if _v(condicion) else falso
+
+
+# ----------------------------------------------------------------- geometry
+class Geometry:
+    """Fraction of each cell (i, j) covered by the geometry."""
+
+    def __init__(self, cobertura):
+        if isinstance(cobertura, Geometry):
+            cobertura = cobertura.cobertura
+        self.cobertura = {c: f for c, f in dict(cobertura).items() if f > 0}
+
+    def difference(self, otra, maxError=None):
+        otra = Geometry(otra).cobertura
+        return Geometry({c: f - otra.get(c, 0) for c, f in self.cobertura.items()})
+
+    def union(self, otra, maxError=None):
+        return union([self, Geometry(otra)])
+
+    def simplify(self, maxError=None):
+        return self
+
+    def area(self, maxError=None):
+        return Number(sum(self.cobertura.values()))
+
+
+def union(geometrias):
+    cobertura = {}
+    for g in geometrias:
+        for c, f in Geometry(g).cobertura.items():
+            cobertura[c] = min(1.0, cobertura.get(c, 0) + f)
+    return Geometry(cobertura)
+
+
+def rectangulo(i0, j0, i1, j1, fraccion=1.0):
+    """Cells [i0, i1) x [j0, j1), each covered by fraccion."""
+    return Geometry({(i, j): fraccion for i in range(i0, i1) for j in range(j0, j1)})
+
+
+# ----------------------------------------------------------------- features
+class Feature:
+    def __init__(self, geometria=None, propiedades=None):
+        if isinstance(geometria, Feature):
+            propiedades = dict(geometria.propiedades, **(propiedades or {}))
+            geometria = geometria.geometria
+        self.geometria = None if geometria is None else Geometry(geometria)
+        self.propiedades = {k: _v(v) for k, v in (propiedades or {}).items()}
+
+    def get(self, propiedad):
+        return self.propiedades.get(_v(propiedad))
+
+    def set(self, *args):
+        nuevas = dict(args[0].valores if isinstance(args[0], Dictionary) else args[0]) if len(args) == 1 \
+            else {_v(args[0]): args[1]}
+        return Feature(self.geometria, dict(self.propiedades, **{k: _v(v) for k, v in nuevas.items()}))
+
+    def select(self, propiedades):
+        propiedades = _v(propiedades)
+        return Feature(self.geometria, {k: v for k, v in self.propiedades.items() if k in propiedades})
+
+    def propertyNames(self):
+        return List(list(self.propiedades))
+
+    def copyProperties(self, fuente, properties=None):
+        fuente = Feature(fuente)
+        claves = _v(properties) if properties is not None else list(fuente.propiedades)
+        copiadas = {k: fuente.propiedades[k] for k in claves if k in fuente.propiedades}
+        return Feature(self.geometria, dict(self.propiedades, **copiadas))
+
+    def toDictionary(self, propiedades=None):
+        claves = _v(propiedades) if propiedades is not None else list(self.propiedades)
+        return Dictionary({k: self.propiedades[k] for k in claves if k in self.propiedades})
+
+    def geometry(self):
+        return self.geometria
+
+    def getInfo(self):
+        return {'type': 'Feature', 'geometry': None, 'properties': dict(self.propiedades)}
+
+
+class Filter:
+    def __init__(self, predicado):
+        self.predicado = predicado
+
+    def Not(self):
+        return Filter(lambda f, otra=None: not self.predicado(f, otra))
+
+    @staticmethod
+    def eq(propiedad, valor):
+        return Filter(lambda f, otra=None: f.get(propiedad) == _v(valor))
+
+    @staticmethod
+    def neq(propiedad, valor):
+        return Filter(lambda f, otra=None: f.get(propiedad) != _v(valor))
+
+    @staticmethod
+    def inList(propiedad, valores):
+        return Filter(lambda f, otra=None: f.get(propiedad) in _v(valores))
+
+    @staticmethod
+    def equals(leftField, rightField):
+        return Filter(lambda f, otra: f.get(leftField) == otra.get(rightField))
+
+
+class FeatureCollection:
+    def __init__(self, features):
+        if isinstance(features, str):
+            features = ASSETS[features]
+        if isinstance(features, FeatureCollection):
+            features = features.features
+        self.features = list(features)
+
+    def filter(self, filtro):
+        return FeatureCollection([f for f in self.features if filtro.predicado(f)])
+
+    def select(self, propiedades, nuevas=None, retainGeometry=True):
+        propiedades = _v(propiedades)
+        nuevas = _v(nuevas) if nuevas is not None else propiedades
+        return FeatureCollection([
+            Feature(f.geometria if retainGeometry else None,
+                    {n: f.propiedades[p] for p, n in zip(propiedades, nuevas) if p in f.propiedades})
+            for f in self.features
+        ])
+
+    def merge(self, otra):
+        return FeatureCollection(self.features + FeatureCollection(otra).features)
+
+    def map(self, fn):
+        return FeatureCollection([fn(f) for f in self.features])
+
+    def flatten(self):
+        return FeatureCollection([f for fc in self.features for f in FeatureCollection(fc).features])
+
+    def aggregate_sum(self, propiedad):
+        return Number(sum(f.get(propiedad) for f in self.features if f.get(propiedad) is not None))
+
+    def first(self):
+        return self.features[0] if self.features else Feature(None)
+
+    def sort(self, propiedad):
+        return FeatureCollection(sorted(self.features, key=lambda f: f.get(propiedad)))
+
+    def size(self):
+        return Number(len(self.features))
+
+    def geometry(self, maxError=None):
+        return union([f.geometria for f in self.features if f.geometria is not None])
+
+    def union(self, maxError=None):
+        return FeatureCollection([Feature(self.geometry())])
+
+    def getInfo(self):
+        return {'type': 'FeatureCollection', 'features': [f.getInfo() for f in self.features]}
+
+
+class Join:
+    def __init__(self, clave, outer):
+        self.clave, self.outer = clave, outer
+
+    @staticmethod
+    def saveFirst(matchKey, outer=False):
+        return Join(matchKey, outer)
+
+    def apply(self, primary, secondary, condition):
+        salida = []
+        for f in FeatureCollection(primary).features:
+            pareja = next((s for s in FeatureCollection(secondary).features if condition.predicado(f, s)), None)
+            if pareja is not None:
+                salida.append(f.set(self.clave, pareja))
+            elif self.outer:
+                salida.append(f)
+        return FeatureCollection(salida)
+
+
+# ----------------------------------------------------------------- reducers
+def _media(muestras):
+    peso = sum(w for _, w, _ in muestras)
+    return sum(v * w for v, w, _ in muestras) / peso if peso else None
+
+
+def _desviacion(muestras):
+    media = _media(muestras)
+    if media is None:
+        return None
+    peso = sum(w for _, w, _ in muestras)
+    return math.sqrt(sum(w * (v - media) ** 2 for v, w, _ in muestras) / peso)
+
+
+class Reducer:
+    """
+    partes: [(salidas, fn)], one input each; fn(muestras) -> {salida: valor} with
+    muestras = [(valor, peso, centro_dentro)] of that input's pixels.
+    """
+
+    def __init__(self, partes):
+        self.partes = partes
+
+    @staticmethod
+    def mean():
+        return Reducer([(['mean'], lambda m: {'mean': _media(m)})])
+
+    @staticmethod
+    def sum():
+        return Reducer([(['sum'], lambda m: {'sum': sum(v * w for v, w, _ in m)})])
+
+    @staticmethod
+    def count():
+        return Reducer([(['count'], lambda m: {'count': sum(1 for _, _, centro in m if centro)})])
+
+    @staticmethod
+    def stdDev():
+        return Reducer([(['stdDev'], lambda m: {'stdDev': _desviacion(m)})])
+
+    def combine(self, otro, outputPrefix='', sharedInputs=False):
+        if not sharedInputs:
+            return Reducer(self.partes + otro.partes)
+        (sa, fa), (sb, fb) = self.partes[0], otro.partes[0]
+        return Reducer([(sa + sb, lambda m: dict(fa(m), **fb(m)))])
+
+    def forEach(self, nombres):
+        (salidas, fn), = self.partes
+
+        def renombrar(nombre):
+            if len(salidas) == 1:
+                return [nombre], lambda m: {nombre: fn(m)[salidas[0]]}
+            return [f"{nombre}_{s}" for s in salidas], lambda m: {f"{nombre}_{s}": v for s, v in fn(m).items()}
+
+        return Reducer([renombrar(n) for n in _v(nombres)])
+
+    def aplicar(self, entradas, nombres=None):
+        """entradas: one list of samples per input (band). A one-input reducer over several bands repeats per band."""
+        if len(self.partes) == 1 and len(entradas) > 1:
+            return self.forEach(nombres).aplicar(entradas)
+        if len(entradas) != len(self.partes):
+            raise ValueError(f"Reducer expects {len(self.partes)} inputs, got {len(entradas)}")
+        salida = {}
+        for (_, fn), muestras in zip(self.partes, entradas):
+            salida.update(fn(muestras))
+        return salida
+
+
+# ------------------------------------------------------------------- images
+class Projection:
+    def __init__(self, escala):
+        self.escala = escala
+
+    def nominalScale(self):
+        return Number(self.escala)
+
+
+class Image:
+    """bandas: {nombre: filas de valores (None = enmascarado)} on a grid of `escala` m cells."""
+
+    def __init__(self, bandas, escala=None, huella=None):
+        if isinstance(bandas, str):
+            bandas = ASSETS[bandas]
+        if isinstance(bandas, Image):
+            bandas, escala, huella = bandas.bandas, bandas.escala, bandas.huella
+        self.bandas = dict(bandas)
+        self.escala = escala
+        self.huella = huella
+
+    def _con(self, bandas):
+        return Image(bandas, self.escala, self.huella)
+
+    def _celdas(self):
+        filas = next(iter(self.bandas.values()))
+        return len(filas), len(filas[0])
+
+    def _por_pixel(self, fn):
+        return {b: [[None if v is None else fn(v) for v in fila] for fila in filas] for b, filas in self.bandas.items()}
+
+    def select(self, bandas):
+        bandas = _v(bandas)
+        nombres = list(self.bandas)
+        if isinstance(bandas, int):
+            bandas = [nombres[bandas]]
+        elif isinstance(bandas, str):
+            bandas = [bandas]
+        return self._con({b: self.bandas[b] for b in bandas})
+
+    def rename(self, nombres):
+        nombres = _v(nombres)
+        nombres = [nombres] if isinstance(nombres, str) else nombres
+        if len(nombres) != len(self.bandas):
+            raise ValueError(f"rename: {len(nombres)} names for {len(self.bandas)} bands")
+        return self._con(dict(zip(nombres, self.bandas.values())))
+
+    def bandNames(self):
+        return List(list(self.bandas))
+
+    def multiply(self, n):
+        return self._con(self._por_pixel(lambda v: v * _v(n)))
+
+    def add(self, n):
+        return self._con(self._por_pixel(lambda v: v + _v(n)))
+
+    def pow(self, n):
+        return self._con(self._por_pixel(lambda v: v ** _v(n)))
+
+    def projection(self):
+        return Projection(self.escala)
+
+    def geometry(self):
+        return self.huella
+
+    def setDefaultProjection(self, proyeccion):
+        return self
+
+    def clip(self, geometria):
+        cobertura = Geometry(geometria).cobertura
+        return Image({
+            b: [[v if (i, j) in cobertura else None for j, v in enumerate(fila)] for i, fila in enumerate(filas)]
+            for b, filas in self.bandas.items()
+        }, self.escala, geometria)
+
+    def reduce(self, reducer):
+        alto, ancho = self._celdas()
+        filas = [[None] * ancho for _ in range(alto)]
+        salida = None
+        for i in range(alto):
+            for j in range(ancho):
+                muestras = [(f[i][j], 1.0, True) for f in self.bandas.values() if f[i][j] is not None]
+                valores = reducer.aplicar([muestras])
+                salida = salida or next(iter(valores))
+                filas[i][j] = valores[salida] if muestras else None
+        return self._con({salida or 'mean': filas})
+
+    @staticmethod
+    def cat(imagenes):
+        imagenes = [Image(i) for i in imagenes]
+        bandas = {}
+        for imagen in imagenes:
+            for nombre, filas in imagen.bandas.items():
+                # Repeated names get a suffix, like Earth Engine's cat
+                unico, n = nombre, 0
+                while unico in bandas:
+                    n += 1
+                    unico = f"{nombre}_{n}"
+                bandas[unico] = filas
+        return Image(bandas, imagenes[0].escala, imagenes[0].huella)
+
+    def _muestras(self, geometria, scale):
+        """Per band, the samples of the pixels of the scale grid touching geometria."""
+        factor = int(round(_v(scale) / self.escala)) if scale is not None else 1
+        cobertura = Geometry(geometria).cobertura
+        alto, ancho = self._celdas()
+        entradas = []
+        for filas in self.bandas.values():
+            muestras = []
+            for bi in range(0, alto, factor):
+                for bj in range(0, ancho, factor):
+                    bloque = [(i, j) for i in range(bi, min(bi + factor, alto)) for j in range(bj, min(bj + factor, ancho))]
+                    peso = sum(cobertura.get(c, 0) for c in bloque) / factor ** 2
+                    validos = [filas[i][j] for i, j in bloque if filas[i][j] is not None]
+                    if peso <= 0 or not validos:
+                        continue
+                    centro = (min(bi + factor // 2, alto - 1), min(bj + factor // 2, ancho - 1))
+                    muestras.append((sum(validos) / len(validos), peso, cobertura.get(centro, 0) >= 0.5))
+            entradas.append(muestras)
+        return entradas
+
+    def reduceRegion(self, reducer, geometry, scale=None, crs=None, maxPixels=None, tileScale=1):
+        return Dictionary(reducer.aplicar(self._muestras(geometry, scale), list(self.bandas)))
+
+    def reduceRegions(self, collection, reducer, scale=None, crs=None, tileScale=1):
+        return FeatureCollection([
+            f.set(reducer.aplicar(self._muestras(f.geometria, scale), list(self.bandas)))
+            for f in FeatureCollection(collection).features
+        ])
+
+
+class ImageCollection:
+    def __init__(self, imagenes):
+        self.imagenes = [Image(i) for i in imagenes]
+
+    def mosaic(self):
+        return self.imagenes[0]
+
+
+def imagen(bandas, huella, escala=1.0):
+    """Image with the given bands, masked outside huella (like preparar_mosaico's clip)."""
+    return Image(bandas, escala, huella).clip(huella)
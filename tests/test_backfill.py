@@ -0,0 +1,28 @@
+import fake_ee
+
+import ajustes_zonales
+import backfill
+import hs_update
+
+
+def escaladas(coleccion):
+    """reduceRegions calls of the export graph that run with a raised tileScale."""
+    return sum(1 for nodo in fake_ee.recorrer(coleccion)
+               if nodo.op == 'reduceRegions' and nodo.kwargs.get('tileScale', 1) > 1)
+
+
+def test_fragmento_fallido_por_memoria_se_reenvia_escalado(backend_pipeline):
+    backend = backend_pipeline
+    backend.fallar_tareas('User memory limit exceeded.')
+    fragmentos = backfill.fragmentar(backfill.fechas_en_rango('1991-1', '1991-6'), 3)
+    filas = hs_update.tabla_sin_geometria(hs_update.get_latest_csv_id(hs_update.FOLDER_METRICS))
+
+    estados = backfill.exportar_fragmentos(fragmentos, filas, max_wait=60)
+
+    fallido, segundo, reenviado = backend.exportaciones
+    assert [s['state'] for s in estados.values()] == ['COMPLETED', 'COMPLETED']
+    assert list(estados) == [fallido.asset_id, segundo.asset_id] and reenviado.asset_id == fallido.asset_id
+    # The resubmitted shard reduces with the zones' new settings, like the cache keys it stores under
+    assert escaladas(fallido.collection) == 0
+    assert escaladas(reenviado.collection) > 0
+    assert any(ajustes_zonales.niveles('Valparaiso', hs_update.codigos_zonas()).values())
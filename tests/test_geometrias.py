@@ -0,0 +1,28 @@
+import geometrias
+
+FUENTE = {
+    'A': {'area': 1000.0, 'media': 0.25},
+    'B': {'area': 500.0, 'media': None},
+    'Region': {'area': 1500.0, 'media': 0.25},
+}
+
+
+def test_paridad_dentro_de_la_tolerancia():
+    preparada = {
+        'A': {'area': 1002.0, 'media': 0.2501},
+        'B': {'area': 499.0, 'media': None},
+        'Region': {'area': 1500.5, 'media': 0.25},
+    }
+    assert geometrias.diferencias_paridad(FUENTE, preparada, solape_m2=1.0, tolerancia=0.005) == []
+
+
+def test_paridad_detecta_area_media_zonas_y_solape():
+    preparada = {
+        'A': {'area': 1020.0, 'media': 0.26},
+        'Region': {'area': 1500.0, 'media': 0.25},
+    }
+    problemas = geometrias.diferencias_paridad(FUENTE, preparada, solape_m2=30.0, tolerancia=0.005)
+    assert any(p.startswith('A: area') for p in problemas)
+    assert any(p.startswith('A: media') for p in problemas)
+    assert any(p.startswith('B: missing') for p in problemas)
+    assert any(p.startswith('overlap') for p in problemas)
@@ -0,0 +1,81 @@
+import fake_ee
+
+import asset_catalog
+import hs_update
+
+FOLDER_METRICS = 'projects/ee-corfobbppciren2023/assets/MetricsHSTransposed'
+
+
+def backend_con_tablas(nombres):
+    backend = fake_ee.Backend(latencia=0)
+    backend.agregar_carpeta(FOLDER_METRICS, nombres, tipo='TABLE', columnas=['2025-10'])
+    fake_ee.usar(backend)
+    asset_catalog.configurar()
+    return backend
+
+
+def test_get_latest_csv_id_prefiere_sufijo_en_empate():
+    backend_con_tablas(['2024_12', '2025_9', '2025_10', '2025_10_1'])
+    assert hs_update.get_latest_csv_id(FOLDER_METRICS) == f"{FOLDER_METRICS}/2025_10_1"
+
+
+def test_get_latest_csv_id_no_depende_del_orden_del_listado():
+    backend_con_tablas(['2025_10_1', '2025_10', '2025_9', '2024_12'])
+    assert hs_update.get_latest_csv_id(FOLDER_METRICS) == f"{FOLDER_METRICS}/2025_10_1"
+
+
+def test_get_latest_csv_id_mes_numerico():
+    backend_con_tablas(['2025_9', '2025_10', '2025_2'])
+    assert hs_update.get_latest_csv_id(FOLDER_METRICS) == f"{FOLDER_METRICS}/2025_10"
+
+
+def test_make_asset_public_acepta_asset_ya_publico():
+    backend = backend_con_tablas(['2025_9', '2025_10'])
+    publico, privado = (f"{FOLDER_METRICS}/{n}" for n in ('2025_9', '2025_10'))
+    backend.acl_publica.update({publico: True, privado: False})
+
+    assert hs_update.make_asset_public(publico)
+    assert hs_update.make_asset_public(privado)
+    assert backend.acl_publica[privado]
+    assert backend.llamadas.get('setAssetAcl') == 1
+
+
+def reducciones(coleccion):
+    return sum(1 for nodo in fake_ee.recorrer(coleccion) if nodo.op == 'reduceRegions')
+
+
+def tablas_leidas(coleccion):
+    return {nodo.args[0] for nodo in fake_ee.recorrer(coleccion)
+            if nodo.op == 'FeatureCollection' and nodo.args and isinstance(nodo.args[0], str)}
+
+
+def test_climatologia_se_acumula_desde_la_tabla_exportada(backend_pipeline, monkeypatch):
+    backend = backend_pipeline
+    monkeypatch.setattr(hs_update, 'CLIMATOLOGIA', True)
+
+    resultado = hs_update.main()
+
+    metricas, clima = backend.exportaciones
+    assert resultado['taskCompleted'] and resultado['climatologiaCompleted']
+    assert clima.asset_id == resultado['climatologiaAsset']
+    # The images are reduced once, by the metrics export; the climatology reads its output
+    assert reducciones(metricas.collection) > 0
+    assert reducciones(clima.collection) == 0
+    assert resultado['exportAsset'] in tablas_leidas(clima.collection)
+
+
+def test_replanificacion_tras_exportacion_fallida_por_memoria(backend_pipeline, monkeypatch):
+    backend = backend_pipeline
+    monkeypatch.setattr(hs_update, 'CLIMATOLOGIA', True)
+    backend.fallar_tareas('User memory limit exceeded.')
+
+    resultado = hs_update.main()
+
+    fallida, replanificada, clima = backend.exportaciones
+    assert resultado['replanificaciones'] == 1 and resultado['taskCompleted']
+    # The failed export never created its asset: the re-plan neither reads it nor folds a climatology from it
+    assert fallida.asset_id not in resultado['plan'].deltas
+    assert fallida.asset_id not in tablas_leidas(replanificada.collection)
+    assert replanificada.asset_id == fallida.asset_id
+    assert resultado['exportAsset'] in tablas_leidas(clima.collection)
+    assert asset_catalog.existe(resultado['exportAsset'])
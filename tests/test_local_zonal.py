@@ -0,0 +1,15 @@
+import local_zonal
+
+
+def test_fecha_desde_tiff_de_otra_region():
+    assert local_zonal.fecha_desde_tiff('/tmp/SM2025Biobio_VIIRS_mes3.tif', 'Biobio') == '2025-3'
+    assert local_zonal.fecha_desde_tiff('/tmp/SM2025Biobio_VIIRS_mes3.tif') is None
+
+
+def test_promedios_por_fecha_usa_la_region(monkeypatch):
+    monkeypatch.setattr(local_zonal, 'promedios_geotiff', lambda path, features: {'Region': 0.3})
+    paths = ['/tmp/SM2025Biobio_VIIRS_mes_10.tif', '/tmp/SM2025Biobio_GCOM_mes2.tif', '/tmp/otro.tif']
+
+    resultados = local_zonal.promedios_por_fecha(paths, [], 'Biobio')
+
+    assert resultados == {'2025-10': {'Region': 0.3}, '2025-2': {'Region': 0.3}}
@@ -0,0 +1,161 @@
+import math
+
+import pytest
+
+import ee_numerico
+
+import ajustes_zonales
+import zonal_stats
+
+# 8x8 cells of 1 m: three 4x4 subbasins and the rest of the footprint in the fourth quadrant.
+# Values are constant over 2x2 blocks, so a zone reduced at twice the scale sees the same pixels.
+HUELLA = ee_numerico.rectangulo(0, 0, 8, 8)
+SUBCUENCAS = {
+    'A': ee_numerico.rectangulo(0, 0, 4, 4),
+    'B': ee_numerico.rectangulo(0, 4, 4, 8),
+    'C': ee_numerico.rectangulo(4, 0, 8, 4),
+}
+
+
+def filas(fn):
+    return [[fn(i // 2, j // 2) for j in range(8)] for i in range(8)]
+
+
+def valor(bi, bj):
+    if (bi, bj) == (3, 0):
+        return None  # masked block inside C
+    return 0.1 * bi + 0.03 * bj + 0.01 * bi * bj
+
+
+@pytest.fixture
+def ee(monkeypatch):
+    monkeypatch.setattr(zonal_stats, 'ee', ee_numerico)
+    monkeypatch.setattr(ajustes_zonales, 'ee', ee_numerico)
+    ee_numerico.reiniciar()
+    return ee_numerico
+
+
+def subcuencas():
+    return ee_numerico.FeatureCollection([
+        ee_numerico.Feature(g, {'COD_SUBC': cod, 'NOMBRE': cod.lower()}) for cod, g in SUBCUENCAS.items()
+    ])
+
+
+def por_codigo(fc, columna):
+    return {f.get('COD_SUBC'): f.get(columna) for f in fc.features}
+
+
+def directo(imagen, geometria, reductor):
+    """Reducción directa de la geometría en la grilla base (la referencia)."""
+    return imagen.reduceRegion(reducer=reductor, geometry=geometria, scale=1).valores
+
+
+@pytest.mark.parametrize('niveles', [
+    None,
+    {'A': 0, 'B': 2, 'C': 5},   # tileScale only for B, twice the scale for C
+    {'A': 6, 'B': 5, 'C': 0},   # four and twice the scale
+])
+def test_region_combinada_con_zonas_escaladas(ee, niveles):
+    imagen = ee.imagen({'2025-01': filas(valor)}, HUELLA)
+    estadisticas = ('mean', 'count', 'stdDev')
+    zonas = zonal_stats.zonas_reduccion(HUELLA, subcuencas(), estadisticas)
+
+    tabla = zonal_stats.reducir_estadisticas(imagen, zonas, ['2025-01'], estadisticas, niveles=niveles)
+
+    region = next(f for f in tabla.features if f.get('COD_SUBC') == 'Region')
+    esperado = directo(imagen, HUELLA, ee.Reducer.mean().combine(ee.Reducer.count(), sharedInputs=True)
+                       .combine(ee.Reducer.stdDev(), sharedInputs=True))
+    assert region.get('2025-01') == pytest.approx(esperado['mean'])
+    assert region.get('2025-01_count') == pytest.approx(esperado['count'])
+    assert region.get('2025-01_stdDev') == pytest.approx(esperado['stdDev'])
+    assert zonal_stats.ZONA_RESTO not in por_codigo(tabla, '2025-01')
+
+
+def test_media_de_bandas_con_zonas_escaladas(ee):
+    mosaico = ee.imagen({
+        'b1': filas(valor),
+        'b2': filas(lambda bi, bj: 1.0 + bi if bj < 2 else None),
+    }, HUELLA)
+    zonas = zonal_stats.zonas_reduccion(HUELLA, subcuencas())
+
+    tabla = zonal_stats.reducir_zonas(mosaico, zonas, '2025-01', niveles={'A': 6, 'B': 0, 'C': 5})
+
+    valores = por_codigo(tabla, '2025-01')
+    medias = directo(mosaico, HUELLA, ee.Reducer.mean())
+    assert valores['Region'] == pytest.approx((medias['b1'] + medias['b2']) / 2)
+    for cod, geometria in SUBCUENCAS.items():
+        medias = [m for m in directo(mosaico, geometria, ee.Reducer.mean()).values() if m is not None]
+        assert valores[cod] == pytest.approx(sum(medias) / len(medias))
+
+
+def test_escala_doble_suma_un_cuarto(ee):
+    """Sanity check of the fixture: the escalated zone's raw sums are a quarter of the base grid's."""
+    imagen = ee.imagen({'2025-01': filas(valor)}, HUELLA)
+    base = directo(imagen, SUBCUENCAS['A'], ee.Reducer.sum())
+    gruesa = imagen.reduceRegion(reducer=ee.Reducer.sum(), geometry=SUBCUENCAS['A'], scale=2).valores
+    assert gruesa['sum'] * 4 == pytest.approx(base['sum'])
+    assert not math.isclose(gruesa['sum'], base['sum'])
+
+
+def zonas_fraccionarias():
+    """Two subbasins sharing a column of half-covered cells, inside a 6x6 footprint."""
+    a = dict(ee_numerico.rectangulo(0, 0, 4, 3).cobertura)
+    b = dict(ee_numerico.rectangulo(0, 4, 4, 6).cobertura)
+    for i in range(4):
+        a[(i, 3)] = b[(i, 3)] = 0.5
+    return ee_numerico.FeatureCollection([
+        ee_numerico.Feature(ee_numerico.Geometry(a), {'COD_SUBC': 'A'}),
+        ee_numerico.Feature(ee_numerico.Geometry(b), {'COD_SUBC': 'B'}),
+    ])
+
+
+def tabla_transpuesta(codigos):
+    return ee_numerico.FeatureCollection([
+        ee_numerico.Feature(None, {'COD_SUBC': cod, '2024-12': 0.1}) for cod in codigos
+    ])
+
+
+def imagen_prueba(ee):
+    """Two bands on a 30 m grid (the reduction scale), with some masked pixels."""
+    return ee.Image({
+        'b1': [[0.1 * i + 0.02 * j for j in range(6)] for i in range(6)],
+        'b2': [[None if (i + j) % 5 == 0 else 0.3 - 0.01 * i * j for j in range(6)] for i in range(6)],
+    }, 30.0, ee.rectangulo(0, 0, 6, 6))
+
+
+def test_verificar_paridad_batch_contra_por_feature(ee, capsys):
+    ee.registrar('HS/SM2025Valparaiso_GCOM_mes1', imagen_prueba(ee))
+
+    ok = zonal_stats.verificar_paridad('HS/SM2025Valparaiso_GCOM_mes1', zonas_fraccionarias(),
+                                       tabla_transpuesta(['A', 'B', 'Region']))
+
+    assert ok, capsys.readouterr().out
+
+
+def test_verificar_paridad_detecta_diferencias(ee, monkeypatch):
+    ee.registrar('HS/img', imagen_prueba(ee))
+    original = zonal_stats.promedios_por_feature
+
+    def con_sesgo(*args):
+        return original(*args).map(lambda f: f.set('paridad', f.get('paridad') + 0.01))
+
+    monkeypatch.setattr(zonal_stats, 'promedios_por_feature', con_sesgo)
+    assert not zonal_stats.verificar_paridad('HS/img', zonas_fraccionarias(), tabla_transpuesta(['A', 'B']))
+
+
+@pytest.mark.parametrize('uniforme', [True, False])
+def test_comparar_escalas(ee, uniforme):
+    # 10 m native grid against the fixed 30 m: equal only when values are constant over 3x3 blocks
+    huella = ee.rectangulo(0, 0, 9, 9)
+    valores = [[0.1 * (i // 3) + 0.05 * (j // 3) + (0 if uniforme else 0.01 * (i % 3) * (j % 3))
+                for j in range(9)] for i in range(9)]
+    ee.registrar('HS/img', ee.Image({'b1': valores}, 10.0, huella))
+    subcuencas = ee.FeatureCollection([
+        ee.Feature(ee.rectangulo(0, 0, 9, 3), {'COD_SUBC': 'A'}),
+        ee.Feature(ee.rectangulo(4, 4, 9, 9), {'COD_SUBC': 'B'}),
+    ])
+
+    ok, speedup = zonal_stats.comparar_escalas('HS/img', subcuencas)
+
+    assert ok == uniforme
+    assert speedup > 0